@@ -40,6 +40,28 @@ if __name__ == "__main__":
     
     logger = logging.getLogger(__name__)
     
+    # 命令列模式：離線重新解析頁面快取後結束，不啟動 GUI
+    import argparse
+    parser = argparse.ArgumentParser(description="女優分類系統")
+    parser.add_argument('--reparse-cache', action='store_true', help="以頁面快取離線重新解析並回填資料庫")
+    parser.add_argument('--workers', type=int, default=None, help="重新解析使用的工作行程數")
+    args = parser.parse_args()
+    
+    if args.reparse_cache:
+        import threading
+        from models.config import ConfigManager
+        from services.classifier_core import UnifiedClassifierCore
+        
+        core = UnifiedClassifierCore(ConfigManager())
+        try:
+            result = core.reparse_from_page_cache(
+                threading.Event(), lambda message: print(message, end=''), max_workers=args.workers
+            )
+        finally:
+            core.web_searcher.close()
+        logger.info(f"♻️ 重新解析結果: {result}")
+        sys.exit(0 if result.get('status') == 'success' else 1)
+    
     try:
         logger.info("🚀 啟動女優分類系統 - 完整版 v5.4.3 (智慧分類強化版)...")
         
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+日文網站 BeautifulSoup 建立次數基準測試
+
+比較舊版 create_enhanced_soup（每個較佳的候選編碼都建立一次 soup）與目前版本
+（只比較解碼後的文字，每個回應只建立一次 soup）的解析次數、解碼次數與耗時。
+
+頁面來源：
+    --page-cache data/page_cache.db   頁面快取中的 AV-WIKI 與 chiba-f.net 頁面（預設）
+    --pages-dir saved_pages/          已存檔的 *.html（檔名含 chiba 視為 chiba-f.net，其餘視為 av-wiki.net）
+
+用法：
+    python scripts/benchmark_japanese_soup.py [--page-cache PATH | --pages-dir DIR] [--rounds N]
+"""
+
+import re
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+
+import httpx
+from bs4 import BeautifulSoup
+
+# 將 src 資料夾加入 Python 路徑
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import services.japanese_site_enhancer as enhancer_module
+from scrapers.encoding_memory import EncodingMemory
+from scrapers.page_cache import PageCache
+from services.japanese_site_enhancer import JapaneseSiteEnhancer
+
+
+class Counter:
+    """計數 BeautifulSoup 建立次數與完整解碼次數"""
+    parses = 0
+    decodes = 0
+
+
+class CountingSoup(BeautifulSoup):
+    def __init__(self, *args, **kwargs):
+        Counter.parses += 1
+        super().__init__(*args, **kwargs)
+
+
+class CountingBytes(bytes):
+    def decode(self, *args, **kwargs):
+        Counter.decodes += 1
+        return super().decode(*args, **kwargs)
+
+
+class NoMemory:
+    """停用快速路徑，只測試候選編碼比較迴圈"""
+    def decode(self, *args, **kwargs):
+        return None, None
+
+    def record(self, *args, **kwargs):
+        pass
+
+
+def legacy_create_enhanced_soup(enhancer: JapaneseSiteEnhancer, response: httpx.Response, url: str):
+    """舊版實作：候選編碼較佳時就建立一次 soup，並以 soup.find() 參與評分"""
+    content_bytes = response.content
+    best_soup = None
+    min_replacement_ratio = float('inf')
+    for encoding in enhancer._get_encoding_priority(url):
+        try:
+            decoded = content_bytes.decode(encoding, errors='replace')
+            replacement_ratio = decoded.count('\ufffd') / len(decoded) if decoded else 1.0
+            html_quality = 0
+            if '<html' in decoded.lower() and '</html>' in decoded.lower():
+                html_quality += 1
+            if '<div' in decoded.lower() and '<li' in decoded.lower():
+                html_quality += 1
+            if re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', decoded):
+                html_quality += 2
+            quality_score = html_quality - replacement_ratio
+            current_best_score = (2 if best_soup and best_soup.find() else 0) - min_replacement_ratio
+            if quality_score > current_best_score or replacement_ratio < min_replacement_ratio:
+                min_replacement_ratio = replacement_ratio
+                best_soup = CountingSoup(decoded, "html.parser")
+                if html_quality >= 3 and replacement_ratio < 0.02:
+                    break
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return best_soup if best_soup is not None else CountingSoup(content_bytes, "html.parser")
+
+
+def load_pages(args) -> List[Tuple[str, bytes, str]]:
+    """讀取 (URL, 內容, Content-Type)"""
+    pages = []
+    if args.pages_dir:
+        for path in sorted(Path(args.pages_dir).glob('*.html')):
+            site = 'chiba-f.net' if 'chiba' in path.name.lower() else 'av-wiki.net'
+            pages.append((f"https://{site}/{path.stem}", path.read_bytes(), ''))
+        return pages
+
+    cache = PageCache(args.page_cache)
+    try:
+        for source in ('AV-WIKI', 'chiba-f.net'):
+            for batch in cache.iter_pages(source=source):
+                pages.extend((page.url, page.body, page.content_type or '') for page in batch)
+    finally:
+        cache.close()
+    return pages
+
+
+def run(label: str, pages, rounds: int, func) -> None:
+    Counter.parses = Counter.decodes = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url, body, content_type in pages:
+            response = httpx.Response(200, content=body, headers={'content-type': content_type})
+            response._content = CountingBytes(body)
+            func(response, url)
+    elapsed = time.perf_counter() - start
+    total = len(pages) * rounds
+    print(f"{label:<28} 解析 {Counter.parses:>6} 次 ({Counter.parses / total:.2f}/頁)  "
+          f"完整解碼 {Counter.decodes:>6} 次 ({Counter.decodes / total:.2f}/頁)  "
+          f"耗時 {elapsed:.3f} 秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日文網站 BeautifulSoup 建立次數基準測試")
+    parser.add_argument('--page-cache', default=str(Path(__file__).parent.parent / 'data' / 'page_cache.db'))
+    parser.add_argument('--pages-dir', default=None)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        print("沒有可用的 av-wiki / chiba-f 頁面")
+        return 1
+    print(f"📄 頁面數: {len(pages)}，每組重複 {args.rounds} 次\n")
+
+    enhancer = JapaneseSiteEnhancer()
+    enhancer_module.BeautifulSoup = CountingSoup
+
+    run("舊版 (多次建立 soup)", pages, args.rounds,
+        lambda response, url: legacy_create_enhanced_soup(enhancer, response, url))
+
+    enhancer_module.get_global_encoding_memory = lambda: NoMemory()
+    run("新版 (僅比較迴圈)", pages, args.rounds, enhancer.create_enhanced_soup)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        memory = EncodingMemory(Path(temp_dir) / 'encoding_memory.json')
+        enhancer_module.get_global_encoding_memory = lambda: memory
+        run("新版 (快速路徑 + 網域記憶)", pages, args.rounds, enhancer.create_enhanced_soup)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@
 """
 資料庫管理模組
 """
+import json
 import sqlite3
 import logging
 from datetime import datetime
@@ -69,6 +70,12 @@ class SQLiteDBManager:
                 cursor.execute('ALTER TABLE videos ADD COLUMN release_date TEXT')
                 logger.info("已新增 release_date 欄位至資料庫")
             
+            # 離線重新解析回填的欄位（categories 以 JSON 陣列保存）
+            for column in ('title', 'series', 'categories'):
+                if column not in columns:
+                    cursor.execute(f'ALTER TABLE videos ADD COLUMN {column} TEXT')
+                    logger.info(f"已新增 {column} 欄位至資料庫")
+            
             # 建立索引以提升查詢效能（在欄位確保存在之後）
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_code ON videos(code)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_studio ON videos(studio)')
@@ -170,6 +177,79 @@ class SQLiteDBManager:
             else:
                 logger.debug(f"番號 {code} 未找到片商資訊")
     
+    def bulk_update_video_metadata(self, updates: Dict[str, Dict]) -> int:
+        """
+        批次更新既有影片的中繼資料與女優關聯（單一交易）
+
+        updates 以番號為鍵，值可包含 studio、studio_code、release_date、title、
+        series、categories、search_method、actresses；未提供或為空的欄位保留原值，
+        有提供 actresses 時才重建該影片的女優關聯。不會新增影片。
+
+        Returns:
+            實際更新的影片數
+        """
+        if not updates:
+            return 0
+
+        now = datetime.now()
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            codes = list(updates)
+            video_ids: Dict[str, int] = {}
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                cursor.execute(f"SELECT code, id FROM videos WHERE code IN ({','.join('?' * len(chunk))})", chunk)
+                video_ids.update(cursor.fetchall())
+            if not video_ids:
+                return 0
+
+            rows = []
+            for code, video_id in video_ids.items():
+                info = updates[code]
+                categories = info.get('categories')
+                rows.append((
+                    info.get('studio') or None, info.get('studio_code') or None,
+                    info.get('release_date') or None, info.get('title') or None,
+                    info.get('series') or None,
+                    json.dumps(categories, ensure_ascii=False) if categories else None,
+                    info.get('search_method') or None, now, video_id
+                ))
+            cursor.executemany("""UPDATE videos SET
+                studio = COALESCE(?, studio), studio_code = COALESCE(?, studio_code),
+                release_date = COALESCE(?, release_date), title = COALESCE(?, title),
+                series = COALESCE(?, series), categories = COALESCE(?, categories),
+                search_method = COALESCE(?, search_method), last_updated = ?
+                WHERE id = ?""", rows)
+
+            # 重建女優關聯：第一位為主要女優，其餘為共演
+            actress_updates = {video_ids[code]: updates[code]['actresses']
+                               for code in video_ids if updates[code].get('actresses')}
+            if actress_updates:
+                names = list({name for actresses in actress_updates.values() for name in actresses})
+                cursor.executemany("INSERT OR IGNORE INTO actresses (name) VALUES (?)", [(name,) for name in names])
+                actress_ids: Dict[str, int] = {}
+                for start in range(0, len(names), 500):
+                    chunk = names[start:start + 500]
+                    cursor.execute(f"SELECT name, id FROM actresses WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+                    actress_ids.update(cursor.fetchall())
+
+                cursor.executemany("DELETE FROM video_actress_link WHERE video_id = ?",
+                                   [(video_id,) for video_id in actress_updates])
+                links = []
+                for video_id, actresses in actress_updates.items():
+                    for i, name in enumerate(dict.fromkeys(actresses)):
+                        if name in actress_ids:
+                            links.append((video_id, actress_ids[name],
+                                          'primary' if i == 0 else 'collaboration', now))
+                cursor.executemany("""INSERT OR IGNORE INTO video_actress_link
+                                    (video_id, actress_id, file_association_type, created_date)
+                                    VALUES (?, ?, ?, ?)""", links)
+
+            conn.commit()
+
+        logger.info(f"已批次更新 {len(video_ids)} 部影片的資料")
+        return len(video_ids)
+
     def get_video_info(self, code: str) -> Optional[Dict]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
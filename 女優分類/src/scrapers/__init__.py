@@ -8,14 +8,34 @@ __version__ = "2.0.0"
 __author__ = "女優分類系統開發團隊"
 
 from .encoding_utils import EncodingDetector, safe_decode_content
+from .encoding_memory import EncodingMemory, get_global_encoding_memory
 from .async_scraper import AsyncWebScraper
 from .cache_manager import CacheManager
+from .page_cache import PageCache, CachedPage
 from .rate_limiter import RateLimiter
+from .shared_rate_state import SharedRateState
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .session_manager import SessionManager, get_global_session_manager
+from .loop_runner import BackgroundLoopRunner, get_global_loop_runner
+from .retry_budget import RetryBudget, get_global_retry_budget
 
 __all__ = [
     'EncodingDetector',
     'safe_decode_content', 
+    'EncodingMemory',
+    'get_global_encoding_memory',
     'AsyncWebScraper',
     'CacheManager',
-    'RateLimiter'
+    'PageCache',
+    'CachedPage',
+    'RateLimiter',
+    'SharedRateState',
+    'SingleFlight',
+    'AsyncSingleFlight',
+    'SessionManager',
+    'get_global_session_manager',
+    'BackgroundLoopRunner',
+    'get_global_loop_runner',
+    'RetryBudget',
+    'get_global_retry_budget'
 ]
\ No newline at end of file
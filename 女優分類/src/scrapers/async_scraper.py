@@ -8,7 +8,7 @@ import asyncio
 import aiohttp
 import logging
 import time
-from typing import Dict, List, Optional, Callable, Any, Tuple
+from typing import Dict, List, Optional, Callable, Any, Tuple, Iterable, AsyncIterator
 from dataclasses import dataclass
 from pathlib import Path
 import json
@@ -18,6 +18,9 @@ from urllib.parse import urljoin, urlparse
 from .encoding_utils import EncodingDetector, install_encoding_warning_filter
 from .rate_limiter import RateLimiter
 from .cache_manager import CacheManager
+from .session_manager import SessionManager, get_global_session_manager
+from .loop_runner import get_global_loop_runner
+from .retry_budget import RetryBudget, get_global_retry_budget
 
 logger = logging.getLogger(__name__)
 
@@ -57,9 +60,12 @@ class ScrapingResult:
 class AsyncWebScraper:
     """非同步網路爬蟲類"""
     
-    def __init__(self, config: ScrapingConfig = None, cache_manager: CacheManager = None):
+    def __init__(self, config: ScrapingConfig = None, cache_manager: CacheManager = None,
+                 session_manager: SessionManager = None, retry_budget: RetryBudget = None):
         self.config = config or ScrapingConfig()
         self.encoding_detector = EncodingDetector()
+        self.session_manager = session_manager or get_global_session_manager()
+        self.retry_budget = retry_budget or get_global_retry_budget()
         
         # 初始化限流器和快取管理器
         self.rate_limiter = RateLimiter()
@@ -152,7 +158,9 @@ class AsyncWebScraper:
                 content_bytes = await response.read()
                 
                 # 自動編碼檢測
-                decoded_content, encoding = self.encoding_detector.detect_and_decode(content_bytes)
+                decoded_content, encoding = self.encoding_detector.detect_and_decode(
+                    content_bytes, response.headers.get('Content-Type'), url
+                )
                 
                 # 更新統計
                 response_time = time.time() - start_time
@@ -192,6 +200,8 @@ class AsyncWebScraper:
     async def _make_request_with_retry(self, session: aiohttp.ClientSession, url: str) -> ScrapingResult:
         """帶重試機制的請求"""
         last_result = None
+        budget_key = self.retry_budget.key_for_url(url)
+        self.retry_budget.record_attempt(budget_key)
         
         for attempt in range(self.config.max_retries + 1):
             try:
@@ -202,8 +212,10 @@ class AsyncWebScraper:
                     
                 last_result = result
                 
-                # 如果不是最後一次嘗試，則等待後重試
+                # 如果不是最後一次嘗試，則在重試預算允許時等待後重試
                 if attempt < self.config.max_retries:
+                    if not self.retry_budget.try_acquire_retry(budget_key):
+                        break
                     wait_time = self.config.backoff_factor ** attempt
                     logger.info(f"⏳ 第 {attempt + 1} 次嘗試失敗，等待 {wait_time:.1f} 秒後重試: {url}")
                     await asyncio.sleep(wait_time)
@@ -216,53 +228,91 @@ class AsyncWebScraper:
         logger.error(f"❌ 所有重試都失敗了: {url}")
         return last_result or ScrapingResult(url=url, success=False, error="所有重試都失敗")
     
+    async def iter_scrape(
+        self, 
+        urls: Iterable[str], 
+        max_in_flight: Optional[int] = None
+    ) -> AsyncIterator[ScrapingResult]:
+        """
+        串流爬取多個URL，結果完成即產出
+        
+        進行中的請求數量不超過 max_in_flight，呼叫端可以在其他請求仍在進行時
+        解析或儲存已完成的結果，不需要等待全部 URL 完成。
+        
+        Args:
+            urls: URL 序列（可為產生器，按需取用）
+            max_in_flight: 同時進行的請求上限，None表示使用 config.max_concurrent
+        """
+        indexed_results = self._iter_scrape_indexed(urls, max_in_flight)
+        try:
+            async for _index, result in indexed_results:
+                yield result
+        finally:
+            await indexed_results.aclose()
+    
+    async def _iter_scrape_indexed(
+        self, 
+        urls: Iterable[str], 
+        max_in_flight: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, ScrapingResult]]:
+        """串流爬取並附帶原始序號"""
+        window = max(1, max_in_flight or self.config.max_concurrent)
+        session = await self.session_manager.get_session()
+        url_iter = iter(enumerate(urls))
+        pending: Dict[asyncio.Future, Tuple[int, str]] = {}
+        
+        def fill_window():
+            while len(pending) < window:
+                try:
+                    index, url = next(url_iter)
+                except StopIteration:
+                    return
+                task = asyncio.ensure_future(self._make_request_with_retry(session, url))
+                pending[task] = (index, url)
+        
+        try:
+            fill_window()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                
+                completed = []
+                for task in done:
+                    index, url = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = ScrapingResult(url=url, success=False, error=str(e))
+                    completed.append((index, result))
+                
+                # 先補滿窗口再交出結果，讓網路 I/O 與呼叫端的處理重疊
+                fill_window()
+                for item in completed:
+                    yield item
+        finally:
+            # 呼叫端提前結束迭代時取消剩餘請求
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
     async def scrape_multiple(
         self, 
         urls: List[str], 
         progress_callback: Optional[Callable[[str], None]] = None
     ) -> List[ScrapingResult]:
-        """併發爬取多個URL"""
+        """併發爬取多個URL，結果順序與輸入相同"""
         
         if not urls:
             return []
             
         logger.info(f"🚀 開始併發爬取 {len(urls)} 個URL")
         
-        # 創建信號量控制併發數
-        semaphore = asyncio.Semaphore(self.config.max_concurrent)
-        
-        async def scrape_with_semaphore(session: aiohttp.ClientSession, url: str) -> ScrapingResult:
-            async with semaphore:
-                result = await self._make_request_with_retry(session, url)
-                if progress_callback:
-                    status = "✅ 成功" if result.success else f"❌ 失敗: {result.error}"
-                    progress_callback(f"{url}: {status}")
-                return result
-        
-        # 創建會話並執行所有請求
-        connector = aiohttp.TCPConnector(
-            limit=self.config.max_concurrent * 2,  # 連線池大小
-            limit_per_host=self.config.max_concurrent,
-            ttl_dns_cache=300,  # DNS快取5分鐘
-            use_dns_cache=True
-        )
-        
-        async with aiohttp.ClientSession(connector=connector) as session:
-            tasks = [scrape_with_semaphore(session, url) for url in urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # 處理異常結果
-            processed_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    error_result = ScrapingResult(
-                        url=urls[i], 
-                        success=False, 
-                        error=str(result)
-                    )
-                    processed_results.append(error_result)
-                else:
-                    processed_results.append(result)
+        processed_results: List[Optional[ScrapingResult]] = [None] * len(urls)
+        async for index, result in self._iter_scrape_indexed(urls, self.config.max_concurrent):
+            processed_results[index] = result
+            if progress_callback:
+                status = "✅ 成功" if result.success else f"❌ 失敗: {result.error}"
+                progress_callback(f"{result.url}: {status}")
         
         successful = sum(1 for r in processed_results if r.success)
         logger.info(f"✅ 爬取完成: {successful}/{len(urls)} 成功")
@@ -274,35 +324,8 @@ class AsyncWebScraper:
         urls: List[str], 
         progress_callback: Optional[Callable[[str], None]] = None
     ) -> List[ScrapingResult]:
-        """同步介面的併發爬取"""
-        try:
-            # 嘗試獲取現有的事件循環
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # 如果已經在事件循環中，使用新的事件循環
-                import threading
-                import concurrent.futures
-                
-                def run_in_thread():
-                    new_loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(new_loop)
-                    try:
-                        return new_loop.run_until_complete(
-                            self.scrape_multiple(urls, progress_callback)
-                        )
-                    finally:
-                        new_loop.close()
-                
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(run_in_thread)
-                    return future.result()
-            else:
-                return loop.run_until_complete(
-                    self.scrape_multiple(urls, progress_callback)
-                )
-        except RuntimeError:
-            # 沒有事件循環，創建新的
-            return asyncio.run(self.scrape_multiple(urls, progress_callback))
+        """同步介面的併發爬取 - 在常駐的背景事件迴圈執行，可從任何執行緒呼叫"""
+        return get_global_loop_runner().run(self.scrape_multiple(urls, progress_callback))
     
     def _update_stats(self, domain: str, success: bool, response_time: float, encoding: str = None):
         """更新統計資訊"""
@@ -349,7 +372,8 @@ class AsyncWebScraper:
             'cache_hit_rate': f"{(self.stats['cache_hits'] / total_requests * 100):.1f}%" if total_requests > 0 else "0%",
             'encoding_detector_stats': self.encoding_detector.get_stats(),
             'rate_limiter_stats': self.rate_limiter.get_stats(),
-            'cache_manager_stats': self.cache_manager.get_stats()
+            'cache_manager_stats': self.cache_manager.get_stats(),
+            'session_stats': self.session_manager.get_stats()
         }
     
     def clear_cache(self):
@@ -4,17 +4,23 @@
 """
 
 import asyncio
+import aiohttp
 import logging
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Mapping, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import random
+import threading
 
 from .encoding_utils import EncodingDetector, create_safe_soup
 from .rate_limiter import RateLimiter, get_global_rate_limiter
 from .cache_manager import CacheManager
+from .page_cache import PageCache
+from .single_flight import AsyncSingleFlight
+from .session_manager import SessionManager, get_global_session_manager
+from .retry_budget import RetryBudget, get_global_retry_budget
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +34,17 @@ class ErrorType(Enum):
     RATE_LIMIT_ERROR = "rate_limit_error"
     SERVER_ERROR = "server_error"
     CLIENT_ERROR = "client_error"
+    CIRCUIT_OPEN = "circuit_open"
     UNKNOWN_ERROR = "unknown_error"
 
 
+class CircuitState(Enum):
+    """斷路器狀態枚舉"""
+    CLOSED = "closed"           # 正常放行
+    OPEN = "open"               # 斷路中，請求直接失敗
+    HALF_OPEN = "half_open"     # 允許少量探測請求
+
+
 @dataclass
 class RetryConfig:
     """重試配置"""
@@ -60,6 +74,33 @@ class HealthCheckConfig:
     enable_auto_recovery: bool = True       # 啟用自動恢復
 
 
+@dataclass
+class CircuitBreakerConfig:
+    """斷路器配置"""
+    failure_threshold: int = 5              # 連續失敗次數達此值時斷路
+    open_timeout: float = 60.0              # 斷路後進入半開狀態的等待時間(秒)
+    max_open_timeout: float = 600.0         # 探測失敗時等待時間加倍的上限(秒)
+    half_open_max_calls: int = 1            # 半開狀態同時允許的探測請求數
+    success_threshold: int = 1              # 半開狀態恢復所需的成功次數
+    trip_on_errors: List[ErrorType] = None  # 計入斷路的錯誤類型
+    reset_on_errors: List[ErrorType] = None # 代表網站有回應、視同成功的錯誤類型
+    
+    def __post_init__(self):
+        if self.trip_on_errors is None:
+            self.trip_on_errors = [
+                ErrorType.NETWORK_ERROR,
+                ErrorType.TIMEOUT_ERROR,
+                ErrorType.SERVER_ERROR,
+                ErrorType.RATE_LIMIT_ERROR
+            ]
+        if self.reset_on_errors is None:
+            self.reset_on_errors = [
+                ErrorType.CLIENT_ERROR,
+                ErrorType.PARSING_ERROR,
+                ErrorType.ENCODING_ERROR
+            ]
+
+
 class ScrapingException(Exception):
     """爬蟲專用異常類"""
     
@@ -74,12 +115,14 @@ class ScrapingException(Exception):
 class RetryManager:
     """重試管理器"""
     
-    def __init__(self, config: RetryConfig = None):
+    def __init__(self, config: RetryConfig = None, retry_budget: RetryBudget = None):
         self.config = config or RetryConfig()
+        self.retry_budget = retry_budget or get_global_retry_budget()
         self.stats = {
             'total_attempts': 0,
             'successful_retries': 0,
             'failed_retries': 0,
+            'budget_denied': 0,
             'retry_reasons': {}
         }
     
@@ -106,9 +149,20 @@ class RetryManager:
         
         return max(delay, 0.1)  # 最小延遲0.1秒
     
-    async def retry_async(self, func: Callable, *args, **kwargs) -> Any:
-        """非同步重試執行"""
+    def _acquire_retry(self, budget_key: Optional[str]) -> bool:
+        """向共用的重試預算申請一次重試（未指定鍵值時不受限）"""
+        if budget_key is None:
+            return True
+        if self.retry_budget.try_acquire_retry(budget_key):
+            return True
+        self.stats['budget_denied'] += 1
+        return False
+    
+    async def retry_async(self, func: Callable, *args, budget_key: Optional[str] = None, **kwargs) -> Any:
+        """非同步重試執行，budget_key（通常為域名）用於共用的重試預算"""
         last_exception = None
+        if budget_key is not None:
+            self.retry_budget.record_attempt(budget_key)
         
         for attempt in range(self.config.max_retries + 1):
             self.stats['total_attempts'] += 1
@@ -138,6 +192,9 @@ class RetryManager:
                     break
                 
                 if attempt < self.config.max_retries:
+                    if not self._acquire_retry(budget_key):
+                        self.stats['failed_retries'] += 1
+                        break
                     delay = self.calculate_delay(attempt)
                     logger.warning(f"⚠️ 第 {attempt + 1} 次嘗試失敗: {e}")
                     logger.info(f"⏳ 等待 {delay:.2f} 秒後重試...")
@@ -149,9 +206,11 @@ class RetryManager:
         else:
             raise ScrapingException("所有重試都失敗", ErrorType.UNKNOWN_ERROR)
     
-    def retry_sync(self, func: Callable, *args, **kwargs) -> Any:
-        """同步重試執行"""
+    def retry_sync(self, func: Callable, *args, budget_key: Optional[str] = None, **kwargs) -> Any:
+        """同步重試執行，budget_key（通常為域名）用於共用的重試預算"""
         last_exception = None
+        if budget_key is not None:
+            self.retry_budget.record_attempt(budget_key)
         
         for attempt in range(self.config.max_retries + 1):
             self.stats['total_attempts'] += 1
@@ -181,6 +240,9 @@ class RetryManager:
                     break
                 
                 if attempt < self.config.max_retries:
+                    if not self._acquire_retry(budget_key):
+                        self.stats['failed_retries'] += 1
+                        break
                     delay = self.calculate_delay(attempt)
                     logger.warning(f"⚠️ 第 {attempt + 1} 次嘗試失敗: {e}")
                     logger.info(f"⏳ 等待 {delay:.2f} 秒後重試...")
@@ -208,6 +270,151 @@ class RetryManager:
         }
 
 
+class CircuitBreaker:
+    """
+    域名斷路器
+    
+    連續發生網路、逾時、伺服器或限流錯誤達閾值時斷路，期間對該域名的請求直接以
+    CIRCUIT_OPEN 失敗，讓呼叫端立即改用其他資料源；等待時間過後進入半開狀態，
+    以少量探測請求決定恢復或繼續斷路。404、解析錯誤等代表網站仍可連線，不計入斷路。
+    """
+    
+    def __init__(self, config: CircuitBreakerConfig = None):
+        self.config = config or CircuitBreakerConfig()
+        self.circuits: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'rejected_requests': 0,
+            'trips': 0,
+            'recoveries': 0
+        }
+    
+    def _get_circuit(self, domain: str) -> Dict[str, Any]:
+        circuit = self.circuits.get(domain)
+        if circuit is None:
+            circuit = {
+                'state': CircuitState.CLOSED,
+                'consecutive_failures': 0,
+                'half_open_successes': 0,
+                'half_open_in_flight': 0,
+                'opened_at': 0.0,
+                'open_timeout': self.config.open_timeout,
+                'last_error': None
+            }
+            self.circuits[domain] = circuit
+        return circuit
+    
+    def _trip(self, domain: str, circuit: Dict[str, Any], reason: str):
+        circuit['state'] = CircuitState.OPEN
+        circuit['opened_at'] = time.time()
+        circuit['half_open_in_flight'] = 0
+        circuit['half_open_successes'] = 0
+        self.stats['trips'] += 1
+        logger.warning(f"🔌 域名 {domain} 斷路 {circuit['open_timeout']:.1f} 秒: {reason}")
+    
+    def allow_request(self, domain: str) -> bool:
+        """判斷是否放行對該域名的請求（半開狀態會佔用探測名額）"""
+        with self._lock:
+            circuit = self._get_circuit(domain)
+            
+            if circuit['state'] == CircuitState.OPEN:
+                if time.time() - circuit['opened_at'] < circuit['open_timeout']:
+                    self.stats['rejected_requests'] += 1
+                    return False
+                circuit['state'] = CircuitState.HALF_OPEN
+                logger.info(f"🔌 域名 {domain} 進入半開狀態，開始探測")
+            
+            if circuit['state'] == CircuitState.HALF_OPEN:
+                if circuit['half_open_in_flight'] >= self.config.half_open_max_calls:
+                    self.stats['rejected_requests'] += 1
+                    return False
+                circuit['half_open_in_flight'] += 1
+            
+            return True
+    
+    def before_request(self, domain: str, url: str = None):
+        """請求前檢查，斷路中時拋出 CIRCUIT_OPEN 例外"""
+        if not self.allow_request(domain):
+            raise ScrapingException(f"域名 {domain} 斷路中，暫停請求", ErrorType.CIRCUIT_OPEN, url)
+    
+    def record_success(self, domain: str):
+        """記錄成功（網站可連線）"""
+        with self._lock:
+            circuit = self._get_circuit(domain)
+            circuit['consecutive_failures'] = 0
+            
+            if circuit['state'] == CircuitState.HALF_OPEN:
+                circuit['half_open_in_flight'] = max(0, circuit['half_open_in_flight'] - 1)
+                circuit['half_open_successes'] += 1
+                if circuit['half_open_successes'] >= self.config.success_threshold:
+                    circuit['state'] = CircuitState.CLOSED
+                    circuit['open_timeout'] = self.config.open_timeout
+                    circuit['half_open_in_flight'] = 0
+                    self.stats['recoveries'] += 1
+                    logger.info(f"✅ 域名 {domain} 斷路器已恢復")
+    
+    def record_failure(self, domain: str, error: Exception):
+        """依錯誤類型記錄失敗"""
+        error_type = error.error_type if isinstance(error, ScrapingException) else ErrorType.UNKNOWN_ERROR
+        if error_type == ErrorType.CIRCUIT_OPEN:
+            return
+        if error_type in self.config.reset_on_errors:
+            # 網站有回應（例如 404 或解析錯誤），視為可連線
+            self.record_success(domain)
+            return
+        if error_type not in self.config.trip_on_errors:
+            # 無法判斷網站是否可連線（例如未知錯誤）：不計入也不重置，只釋放探測名額
+            self.release(domain)
+            return
+        
+        with self._lock:
+            circuit = self._get_circuit(domain)
+            circuit['consecutive_failures'] += 1
+            circuit['last_error'] = error_type.value
+            
+            if circuit['state'] == CircuitState.HALF_OPEN:
+                # 探測失敗，延長斷路時間
+                circuit['open_timeout'] = min(circuit['open_timeout'] * 2, self.config.max_open_timeout)
+                self._trip(domain, circuit, f"探測失敗 ({error_type.value})")
+            elif (circuit['state'] == CircuitState.CLOSED and
+                  circuit['consecutive_failures'] >= self.config.failure_threshold):
+                self._trip(domain, circuit, f"連續 {circuit['consecutive_failures']} 次失敗 ({error_type.value})")
+    
+    def release(self, domain: str):
+        """請求被取消時釋放半開探測名額"""
+        with self._lock:
+            circuit = self._get_circuit(domain)
+            if circuit['state'] == CircuitState.HALF_OPEN:
+                circuit['half_open_in_flight'] = max(0, circuit['half_open_in_flight'] - 1)
+    
+    def get_state(self, domain: str) -> CircuitState:
+        """獲取域名的斷路器狀態"""
+        with self._lock:
+            circuit = self.circuits.get(domain)
+            return circuit['state'] if circuit else CircuitState.CLOSED
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取斷路器統計"""
+        with self._lock:
+            now = time.time()
+            domains = {}
+            for domain, circuit in self.circuits.items():
+                info = {
+                    'state': circuit['state'].value,
+                    'consecutive_failures': circuit['consecutive_failures'],
+                    'last_error': circuit['last_error']
+                }
+                if circuit['state'] == CircuitState.OPEN:
+                    info['retry_in'] = f"{max(0.0, circuit['open_timeout'] - (now - circuit['opened_at'])):.1f}s"
+                domains[domain] = info
+            
+            return {
+                **self.stats,
+                'open_domains': [d for d, c in self.circuits.items() if c['state'] == CircuitState.OPEN],
+                'domains': domains
+            }
+
+
 class HealthChecker:
     """健康檢查器"""
     
@@ -330,13 +537,20 @@ class BaseScraper(ABC):
                  rate_limiter: RateLimiter = None,
                  cache_manager: CacheManager = None,
                  retry_manager: RetryManager = None,
-                 health_checker: HealthChecker = None):
+                 health_checker: HealthChecker = None,
+                 session_manager: SessionManager = None,
+                 circuit_breaker: CircuitBreaker = None,
+                 page_cache: PageCache = None):
         
         self.encoding_detector = encoding_detector or EncodingDetector()
         self.rate_limiter = rate_limiter or get_global_rate_limiter()
         self.cache_manager = cache_manager or CacheManager()
         self.retry_manager = retry_manager or RetryManager()
         self.health_checker = health_checker or HealthChecker()
+        self.session_manager = session_manager or get_global_session_manager()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # 原始頁面快取（None 表示不保存原始頁面）
+        self.page_cache = page_cache
         
         self.stats = {
             'total_requests': 0,
@@ -345,10 +559,13 @@ class BaseScraper(ABC):
             'cache_hits': 0,
             'retry_attempts': 0
         }
+        
+        # 相同 URL 的並行爬取共用同一個進行中的請求
+        self._scrape_flight = AsyncSingleFlight('scrape-url')
     
     @abstractmethod
-    async def scrape_url(self, url: str) -> Dict[str, Any]:
-        """抽象方法：爬取單個URL"""
+    async def scrape_url(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
+        """抽象方法：爬取單個URL（code 為對應的番號，用於頁面快取的離線重新解析）"""
         pass
     
     @abstractmethod
@@ -356,17 +573,27 @@ class BaseScraper(ABC):
         """抽象方法：解析內容"""
         pass
     
-    async def safe_scrape(self, url: str) -> Dict[str, Any]:
-        """安全爬取（包含所有保護機制）"""
+    async def safe_scrape(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
+        """安全爬取（包含所有保護機制），相同 URL 的並行呼叫會合併為一次請求"""
+        return await self._scrape_flight.do(url, self._safe_scrape_uncached, url, code)
+    
+    async def _safe_scrape_uncached(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
+        """實際執行安全爬取"""
+        # 離線模式：只從頁面快取重新解析，不經過健康檢查、限流與解析結果快取
+        if self.page_cache is not None and self.page_cache.offline:
+            return await self.scrape_url(url, code)
+        
         domain = url.split('//')[-1].split('/')[0]
         
         # 檢查域名健康狀態
         if not self.health_checker.is_domain_healthy(domain):
             raise ScrapingException(f"域名 {domain} 當前不健康", ErrorType.SERVER_ERROR, url)
         
-        # 使用重試管理器
+        # 使用重試管理器（每次嘗試都經過斷路器，斷路後剩餘重試立即失敗）
         try:
-            result = await self.retry_manager.retry_async(self._scrape_with_protection, url)
+            result = await self.retry_manager.retry_async(
+                self._scrape_with_circuit_breaker, url, domain, code, budget_key=domain
+            )
             
             # 更新健康狀態
             await self.health_checker.update_domain_health(domain, True)
@@ -374,11 +601,26 @@ class BaseScraper(ABC):
             return result
             
         except Exception as e:
-            # 更新健康狀態
-            await self.health_checker.update_domain_health(domain, False)
+            # 更新健康狀態（斷路器拒絕的請求並未實際連線，不計入）
+            if not (isinstance(e, ScrapingException) and e.error_type == ErrorType.CIRCUIT_OPEN):
+                await self.health_checker.update_domain_health(domain, False)
             raise e
     
-    async def _scrape_with_protection(self, url: str) -> Dict[str, Any]:
+    async def _scrape_with_circuit_breaker(self, url: str, domain: str, code: Optional[str] = None) -> Dict[str, Any]:
+        """經過斷路器的單次爬取嘗試"""
+        self.circuit_breaker.before_request(domain, url)
+        try:
+            result = await self._scrape_with_protection(url, code)
+        except asyncio.CancelledError:
+            self.circuit_breaker.release(domain)
+            raise
+        except Exception as e:
+            self.circuit_breaker.record_failure(domain, e)
+            raise
+        self.circuit_breaker.record_success(domain)
+        return result
+    
+    async def _scrape_with_protection(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
         """帶保護機制的爬取"""
         # 頻率控制
         await self.rate_limiter.wait_if_needed_async(url)
@@ -393,7 +635,7 @@ class BaseScraper(ABC):
         self.stats['total_requests'] += 1
         
         try:
-            result = await self.scrape_url(url)
+            result = await self.scrape_url(url, code)
             
             # 記錄成功
             self.rate_limiter.record_request(url, True, 0.0)
@@ -410,6 +652,45 @@ class BaseScraper(ABC):
             self.stats['failed_requests'] += 1
             raise e
     
+    async def _fetch_page(self, url: str, headers: Dict[str, str], source: Optional[str] = None,
+                          code: Optional[str] = None) -> bytes:
+        """下載頁面原始內容；啟用頁面快取時優先使用快取（以番號與來源標記），過期則送出條件式請求"""
+        if self.page_cache is None:
+            _, _, body = await self._request_page(url, headers)
+            return body
+        
+        page = await self.page_cache.fetch_async(
+            url,
+            lambda conditional_headers: self._request_page(url, {**headers, **conditional_headers}),
+            code=code, source=source
+        )
+        if page is None:
+            raise ScrapingException("頁面快取中沒有可用的頁面（離線模式）", ErrorType.CLIENT_ERROR, url)
+        return page.body
+    
+    async def _request_page(self, url: str, headers: Dict[str, str]) -> Tuple[int, Mapping[str, str], bytes]:
+        """送出 HTTP 請求，回傳 (狀態碼, 標頭, 內容)；304 時內容為空"""
+        timeout = aiohttp.ClientTimeout(total=30)
+        session = await self.session_manager.get_session()
+        
+        try:
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                
+                if response.status == 304:
+                    return response.status, response.headers, b''
+                elif response.status == 404:
+                    raise ScrapingException(f"頁面不存在", ErrorType.CLIENT_ERROR, url, 404)
+                elif response.status >= 500:
+                    raise ScrapingException(f"伺服器錯誤", ErrorType.SERVER_ERROR, url, response.status)
+                elif response.status == 429:
+                    raise ScrapingException(f"請求過於頻繁", ErrorType.RATE_LIMIT_ERROR, url, 429)
+                
+                response.raise_for_status()
+                return response.status, response.headers, await response.read()
+        except asyncio.TimeoutError:
+            # aiohttp 的 ClientTimeout 逾時拋出的不是 ClientError
+            raise ScrapingException(f"請求逾時", ErrorType.TIMEOUT_ERROR, url)
+    
     def get_comprehensive_stats(self) -> Dict[str, Any]:
         """獲取綜合統計資訊"""
         return {
@@ -418,5 +699,7 @@ class BaseScraper(ABC):
             'rate_limiter_stats': self.rate_limiter.get_stats(),
             'cache_stats': self.cache_manager.get_stats(),
             'retry_stats': self.retry_manager.get_stats(),
-            'health_stats': self.health_checker.get_health_report()
+            'health_stats': self.health_checker.get_health_report(),
+            'single_flight_stats': self._scrape_flight.get_stats(),
+            'circuit_breaker_stats': self.circuit_breaker.get_stats()
         }
\ No newline at end of file
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+區段式二進位儲存模組
+將快取值依序附加到少數幾個區段檔，以記憶體內的位移索引與 mmap 讀取，取代「每筆一個檔案」
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+# 記錄標頭: 魔術字 | 旗標 | 鍵長度 | 值長度 | 建立時間 | TTL(秒) | 值的CRC32
+_HEADER = struct.Struct('<4sBHIdqI')
+_MAGIC = b'BLB1'
+_FLAG_COMPRESSED = 0x01
+_FLAG_TOMBSTONE = 0x02
+_CODEC_SHIFT = 2        # 旗標高位保存編解碼器編號（0 表示舊格式）
+
+
+@dataclass
+class BlobLocation:
+    """值在區段檔中的位置與中繼資料"""
+    segment_id: int
+    offset: int          # 值的起始位移（標頭與鍵之後）
+    length: int
+    created_at: float
+    ttl_seconds: int
+    compressed: bool
+    record_size: int     # 整筆記錄大小，用於計算可回收空間
+    codec_id: int = 0    # 編解碼器編號
+
+
+class SegmentBlobStore:
+    """
+    區段式快取值儲存
+
+    - 寫入：附加到目前的區段檔，超過大小上限時換新區段
+    - 讀取：記憶體索引查詢 + mmap 切片，不需要開檔或查詢 SQLite
+    - 刪除：附加刪除標記（tombstone），空間在壓實時回收
+    - 啟動：依序掃描區段檔重建索引，截斷尾端不完整的記錄
+    """
+
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIX = '.blob'
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 compaction_ratio: float = 0.5, grace_seconds: float = 0.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.compaction_ratio = compaction_ratio
+        # 過期後仍保留的時間（供 stale-while-revalidate 使用）
+        self.grace_seconds = grace_seconds
+
+        self._lock = threading.RLock()
+        self._index: Dict[str, BlobLocation] = {}
+        self._segment_sizes: Dict[int, int] = {}
+        self._maps: Dict[int, Tuple[mmap.mmap, int]] = {}
+        self._readers: Dict[int, Any] = {}
+        self._writer = None
+        self._active_id = 0
+        self._dead_bytes = 0
+
+        self.stats = {
+            'puts': 0,
+            'gets': 0,
+            'deletes': 0,
+            'compactions': 0,
+            'recovered_truncations': 0
+        }
+
+        self._load()
+        logger.info(f"📦 區段式快取儲存已載入 - {len(self._index)} 筆, {len(self._segment_sizes)} 個區段")
+
+    # ----- 區段檔管理 -----
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.directory / f"{self.SEGMENT_PREFIX}{segment_id:06d}{self.SEGMENT_SUFFIX}"
+
+    def _list_segments(self) -> List[int]:
+        ids = []
+        for path in self.directory.glob(f"{self.SEGMENT_PREFIX}*{self.SEGMENT_SUFFIX}"):
+            try:
+                ids.append(int(path.stem[len(self.SEGMENT_PREFIX):]))
+            except ValueError:
+                continue
+        return sorted(ids)
+
+    def _open_writer(self, segment_id: int):
+        """開啟（或建立）可附加寫入的區段檔"""
+        if self._writer is not None:
+            self._writer.close()
+        self._active_id = segment_id
+        self._writer = open(self._segment_path(segment_id), 'ab')
+        self._segment_sizes.setdefault(segment_id, self._writer.tell())
+
+    def _close_map(self, segment_id: int):
+        entry = self._maps.pop(segment_id, None)
+        if entry:
+            entry[0].close()
+        reader = self._readers.pop(segment_id, None)
+        if reader:
+            reader.close()
+
+    def _get_map(self, segment_id: int, end: int) -> mmap.mmap:
+        """取得涵蓋到 end 位移的 mmap，區段成長後重新映射"""
+        entry = self._maps.get(segment_id)
+        if entry is not None and entry[1] >= end:
+            return entry[0]
+
+        self._close_map(segment_id)
+        reader = open(self._segment_path(segment_id), 'rb')
+        size = os.fstat(reader.fileno()).st_size
+        mapped = mmap.mmap(reader.fileno(), size, access=mmap.ACCESS_READ)
+        self._readers[segment_id] = reader
+        self._maps[segment_id] = (mapped, size)
+        return mapped
+
+    # ----- 載入與復原 -----
+
+    def _load(self):
+        """掃描所有區段檔重建索引"""
+        segment_ids = self._list_segments()
+        for segment_id in segment_ids:
+            self._scan_segment(segment_id)
+
+        self._open_writer(segment_ids[-1] if segment_ids else 1)
+
+    def _scan_segment(self, segment_id: int):
+        path = self._segment_path(segment_id)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        position = 0
+        total = len(data)
+        while position + _HEADER.size <= total:
+            magic, flags, key_len, value_len, created_at, ttl_seconds, crc = _HEADER.unpack_from(data, position)
+            record_size = _HEADER.size + key_len + value_len
+            if magic != _MAGIC or position + record_size > total:
+                break
+            key_start = position + _HEADER.size
+            value_start = key_start + key_len
+            value_end = value_start + value_len
+            if zlib.crc32(data[value_start:value_end]) != crc:
+                break
+
+            key = data[key_start:value_start].decode('ascii')
+            self._discard(key)
+            if flags & _FLAG_TOMBSTONE:
+                self._dead_bytes += record_size
+            else:
+                self._index[key] = BlobLocation(
+                    segment_id=segment_id,
+                    offset=value_start,
+                    length=value_len,
+                    created_at=created_at,
+                    ttl_seconds=ttl_seconds,
+                    compressed=bool(flags & _FLAG_COMPRESSED),
+                    record_size=record_size,
+                    codec_id=flags >> _CODEC_SHIFT
+                )
+            position += record_size
+
+        if position < total:
+            # 上次寫入中斷留下的不完整記錄
+            with open(path, 'r+b') as f:
+                f.truncate(position)
+            self.stats['recovered_truncations'] += 1
+            logger.warning(f"📦 區段 {path.name} 尾端有不完整記錄，已截斷 {total - position} bytes")
+
+        self._segment_sizes[segment_id] = position
+
+    def _discard(self, key: str):
+        """移除舊版本索引並計入可回收空間"""
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._dead_bytes += old.record_size
+
+    # ----- 讀寫 -----
+
+    def _append(self, key: str, value: bytes, flags: int, created_at: float, ttl_seconds: int) -> BlobLocation:
+        key_bytes = key.encode('ascii')
+        header = _HEADER.pack(_MAGIC, flags, len(key_bytes), len(value), created_at, ttl_seconds, zlib.crc32(value))
+        record_size = len(header) + len(key_bytes) + len(value)
+
+        size = self._segment_sizes.get(self._active_id, 0)
+        if size and size + record_size > self.max_segment_bytes:
+            self._open_writer(self._active_id + 1)
+            size = 0
+
+        self._writer.write(header + key_bytes + value)
+        self._writer.flush()
+        self._segment_sizes[self._active_id] = size + record_size
+
+        return BlobLocation(
+            segment_id=self._active_id,
+            offset=size + len(header) + len(key_bytes),
+            length=len(value),
+            created_at=created_at,
+            ttl_seconds=ttl_seconds,
+            compressed=bool(flags & _FLAG_COMPRESSED),
+            record_size=record_size,
+            codec_id=flags >> _CODEC_SHIFT
+        )
+
+    def put(self, key: str, value: bytes, created_at: float, ttl_seconds: int,
+            compressed: bool = False, codec_id: int = 0):
+        """寫入值（覆蓋同鍵的舊值）"""
+        flags = (_FLAG_COMPRESSED if compressed else 0) | (codec_id << _CODEC_SHIFT)
+        with self._lock:
+            location = self._append(key, value, flags, created_at, ttl_seconds)
+            self._discard(key)
+            self._index[key] = location
+            self.stats['puts'] += 1
+
+    def get(self, key: str) -> Optional[Tuple[bytes, BlobLocation]]:
+        """讀取值與中繼資料，不存在時回傳 None"""
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return None
+            mapped = self._get_map(location.segment_id, location.offset + location.length)
+            self.stats['gets'] += 1
+            return mapped[location.offset:location.offset + location.length], location
+
+    def get_location(self, key: str) -> Optional[BlobLocation]:
+        """只查詢中繼資料"""
+        with self._lock:
+            return self._index.get(key)
+
+    def delete(self, key: str) -> bool:
+        """刪除值（附加刪除標記）"""
+        with self._lock:
+            if key not in self._index:
+                return False
+            self._append(key, b'', _FLAG_TOMBSTONE, time.time(), 0)
+            self._discard(key)
+            self._dead_bytes += _HEADER.size + len(key)
+            self.stats['deletes'] += 1
+            return True
+
+    def delete_expired(self, now: Optional[float] = None) -> int:
+        """刪除所有超過寬限期的值，回傳刪除數量"""
+        now = now or time.time()
+        with self._lock:
+            expired = [
+                key for key, location in self._index.items()
+                if now - location.created_at > location.ttl_seconds + self.grace_seconds
+            ]
+            for key in expired:
+                self.delete(key)
+            return len(expired)
+
+    # ----- 壓實 -----
+
+    def needs_compaction(self) -> bool:
+        """可回收空間比例超過門檻時需要壓實"""
+        with self._lock:
+            total = sum(self._segment_sizes.values())
+            return total > 0 and self._dead_bytes / total >= self.compaction_ratio
+
+    def compact(self, force: bool = False) -> bool:
+        """
+        壓實：將仍有效且未超過寬限期的值改寫到新區段，再刪除舊區段
+
+        Returns:
+            是否執行了壓實
+        """
+        with self._lock:
+            if not force and not self.needs_compaction():
+                return False
+
+            start_time = time.time()
+            old_segments = sorted(self._segment_sizes)
+            live = sorted(self._index.items(), key=lambda item: (item[1].segment_id, item[1].offset))
+
+            # 先讀出所有有效值，再切換到新區段寫入
+            new_id = (old_segments[-1] if old_segments else 0) + 1
+            self._writer.close()
+            self._writer = None
+            self._active_id = new_id
+            self._writer = open(self._segment_path(new_id), 'ab')
+            self._segment_sizes[new_id] = 0
+
+            new_index: Dict[str, BlobLocation] = {}
+            now = time.time()
+            for key, location in live:
+                if now - location.created_at > location.ttl_seconds + self.grace_seconds:
+                    continue
+                mapped = self._get_map(location.segment_id, location.offset + location.length)
+                value = mapped[location.offset:location.offset + location.length]
+                flags = (_FLAG_COMPRESSED if location.compressed else 0) | (location.codec_id << _CODEC_SHIFT)
+                new_index[key] = self._append(key, value, flags, location.created_at, location.ttl_seconds)
+
+            self._index = new_index
+            self._dead_bytes = 0
+            for segment_id in old_segments:
+                self._close_map(segment_id)
+                self._segment_sizes.pop(segment_id, None)
+                try:
+                    self._segment_path(segment_id).unlink()
+                except OSError as e:
+                    logger.warning(f"刪除舊區段失敗: {e}")
+
+            self.stats['compactions'] += 1
+            logger.info(f"🗜️ 區段壓實完成 - 保留 {len(new_index)} 筆, 耗時 {time.time() - start_time:.2f}秒")
+            return True
+
+    # ----- 其他 -----
+
+    def clear(self):
+        """清空所有資料"""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for segment_id in list(self._segment_sizes):
+                self._close_map(segment_id)
+                try:
+                    self._segment_path(segment_id).unlink()
+                except OSError:
+                    pass
+            self._index.clear()
+            self._segment_sizes.clear()
+            self._dead_bytes = 0
+            self._open_writer(1)
+
+    def close(self):
+        """關閉所有檔案與映射"""
+        with self._lock:
+            for segment_id in list(self._maps):
+                self._close_map(segment_id)
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def live_bytes(self) -> int:
+        """有效值的總大小"""
+        with self._lock:
+            return sum(location.length for location in self._index.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            total = sum(self._segment_sizes.values())
+            return {
+                **self.stats,
+                'entries': len(self._index),
+                'segments': len(self._segment_sizes),
+                'segment_bytes': total,
+                'dead_bytes': self._dead_bytes,
+                'dead_ratio': f"{(self._dead_bytes / total * 100) if total else 0:.1f}%"
+            }
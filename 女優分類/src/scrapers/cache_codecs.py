@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+快取編解碼模組
+依值的型別選擇序列化方式與壓縮方式，並記錄各編解碼器的耗時與壓縮率
+"""
+
+import gzip
+import marshal
+import pickle
+import time
+import zlib
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+# 序列化器與壓縮器的編號，組合後存入區段檔記錄旗標（0 保留給舊格式）
+SERIALIZER_IDS = {'pickle': 1, 'marshal': 2, 'msgpack': 3, 'text': 4, 'bytes': 5}
+COMPRESSOR_IDS = {'': 0, 'zlib': 1, 'zdict': 2, 'gzip': 3}
+
+# HTML 共用壓縮字典：目標網站常見的標記片段，讓小頁面也能有效壓縮
+HTML_DICTIONARY = (
+    b'<!DOCTYPE html><html lang="ja"><head><meta charset="UTF-8">'
+    b'<meta name="viewport" content="width=device-width, initial-scale=1">'
+    b'<meta property="og:title" content="<meta property="og:image" content="'
+    b'<link rel="stylesheet" href="<script type="text/javascript" src="'
+    b'</script></head><body class="<div class="container"><div class="row">'
+    b'<div class="col-<div class="item"><div class="video-meta-panel">'
+    b'<div class="movie-list"><div class="panel-block"><strong>'
+    b'</strong><span class="value"><a href="/actors/<a href="/video_codes/'
+    b'<a href="/makers/<a href="/series/<a href="/tags?'
+    b'<table class="<tr><th></th><td></td></tr></table>'
+    b'<ul class="<li class="<img src="https://" alt="" class="'
+    b'<span class="<p class="</p></span></a></li></ul></div></div></div>'
+    b'\xe5\x87\xba\xe6\xbc\x94\xe8\x80\x85'          # 出演者
+    b'\xe3\x83\xa1\xe3\x83\xbc\xe3\x82\xab\xe3\x83\xbc'  # メーカー
+    b'\xe3\x83\xac\xe3\x83\xbc\xe3\x83\x99\xe3\x83\xab'  # レーベル
+    b'\xe7\x99\xba\xe5\xa3\xb2\xe6\x97\xa5'          # 発売日
+    b'\xe5\x93\x81\xe7\x95\xaa'                      # 品番
+    b'</body></html>'
+)
+
+
+def codec_to_id(codec: str) -> int:
+    """編解碼器名稱轉為編號"""
+    serializer, _, compressor = codec.partition('+')
+    return SERIALIZER_IDS[serializer] * 4 + COMPRESSOR_IDS[compressor]
+
+
+def id_to_codec(codec_id: int) -> str:
+    """編號轉為編解碼器名稱"""
+    serializer_id, compressor_id = divmod(codec_id, 4)
+    serializer = next(name for name, value in SERIALIZER_IDS.items() if value == serializer_id)
+    compressor = next(name for name, value in COMPRESSOR_IDS.items() if value == compressor_id)
+    return f"{serializer}+{compressor}" if compressor else serializer
+
+
+def legacy_codec(compressed: bool) -> str:
+    """舊版快取（無編解碼器欄位）的格式：pickle，超過 1KB 時 gzip"""
+    return 'pickle+gzip' if compressed else 'pickle'
+
+
+class CacheCodec:
+    """
+    快取編解碼器
+
+    序列化：
+    - str（HTML 頁面）→ UTF-8，bytes 原樣保存
+    - 其他 → pickle（或設定為 msgpack，無法編碼時改用 pickle）
+    - marshal 格式不保證跨 Python 版本相容，只保留解碼以讀取舊的快取項目，不再寫入
+
+    壓縮：超過 min_compress_bytes 才壓縮，HTML 使用共用字典的 zlib，
+    其餘使用指定等級的 zlib；壓縮後未省下 10% 以上則保留原始資料。
+    """
+
+    def __init__(self, preferred: str = "auto", compression: bool = True,
+                 level: int = 6, min_compress_bytes: int = 1024):
+        if preferred == "msgpack" and msgpack is None:
+            logger.warning("未安裝 msgpack，改用 pickle 編碼快取")
+            preferred = "pickle"
+        self.preferred = preferred
+        self.compression = compression
+        self.level = level
+        self.min_compress_bytes = min_compress_bytes
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    # ----- 序列化 -----
+
+    def _serialize(self, value: Any) -> Tuple[bytes, str]:
+        if isinstance(value, str):
+            return value.encode('utf-8'), 'text'
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value), 'bytes'
+        if self.preferred == "msgpack":
+            try:
+                return msgpack.packb(value, use_bin_type=True), 'msgpack'
+            except (TypeError, ValueError):
+                pass
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 'pickle'
+
+    @staticmethod
+    def _deserialize(data: bytes, serializer: str) -> Any:
+        if serializer == 'text':
+            return data.decode('utf-8')
+        if serializer == 'bytes':
+            return data
+        if serializer == 'marshal':
+            return marshal.loads(data)
+        if serializer == 'msgpack':
+            if msgpack is None:
+                raise ValueError("快取以 msgpack 編碼，但未安裝 msgpack")
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return pickle.loads(data)
+
+    # ----- 壓縮 -----
+
+    def _compress(self, data: bytes, serializer: str) -> Tuple[bytes, str]:
+        if not self.compression or len(data) <= self.min_compress_bytes:
+            return data, ''
+
+        if serializer == 'text':
+            compressor = zlib.compressobj(self.level, zdict=HTML_DICTIONARY)
+            compressed = compressor.compress(data) + compressor.flush()
+            name = 'zdict'
+        else:
+            compressed = zlib.compress(data, self.level)
+            name = 'zlib'
+
+        if len(compressed) < len(data) * 0.9:
+            return compressed, name
+        return data, ''
+
+    @staticmethod
+    def _decompress(data: bytes, compressor: str) -> bytes:
+        if compressor == 'zlib':
+            return zlib.decompress(data)
+        if compressor == 'zdict':
+            decompressor = zlib.decompressobj(zdict=HTML_DICTIONARY)
+            return decompressor.decompress(data) + decompressor.flush()
+        if compressor == 'gzip':
+            return gzip.decompress(data)
+        return data
+
+    # ----- 介面 -----
+
+    def encode(self, value: Any) -> Tuple[bytes, str]:
+        """編碼值，回傳 (資料, 編解碼器名稱)"""
+        start = time.perf_counter()
+        raw, serializer = self._serialize(value)
+        data, compressor = self._compress(raw, serializer)
+        codec = f"{serializer}+{compressor}" if compressor else serializer
+        self._record(codec, 'encode', time.perf_counter() - start, len(raw), len(data))
+        return data, codec
+
+    def decode(self, data: bytes, codec: str) -> Any:
+        """依編解碼器名稱解碼"""
+        start = time.perf_counter()
+        serializer, _, compressor = codec.partition('+')
+        value = self._deserialize(self._decompress(data, compressor), serializer)
+        self._record(codec, 'decode', time.perf_counter() - start)
+        return value
+
+    def _record(self, codec: str, operation: str, elapsed: float, raw_bytes: int = 0, stored_bytes: int = 0):
+        with self._lock:
+            stats = self._stats.setdefault(codec, {
+                'encodes': 0, 'decodes': 0,
+                'encode_time': 0.0, 'decode_time': 0.0,
+                'raw_bytes': 0, 'stored_bytes': 0
+            })
+            stats[f'{operation}s'] += 1
+            stats[f'{operation}_time'] += elapsed
+            stats['raw_bytes'] += raw_bytes
+            stats['stored_bytes'] += stored_bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各編解碼器的次數、平均耗時與壓縮率"""
+        with self._lock:
+            result = {}
+            for codec, stats in self._stats.items():
+                result[codec] = {
+                    'encodes': stats['encodes'],
+                    'decodes': stats['decodes'],
+                    'avg_encode_ms': f"{stats['encode_time'] / stats['encodes'] * 1000:.3f}" if stats['encodes'] else "0",
+                    'avg_decode_ms': f"{stats['decode_time'] / stats['decodes'] * 1000:.3f}" if stats['decodes'] else "0",
+                    'ratio': f"{stats['stored_bytes'] / stats['raw_bytes']:.2f}" if stats['raw_bytes'] else "-"
+                }
+            return result
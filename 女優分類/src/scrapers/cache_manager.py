@@ -12,11 +12,15 @@ import time
 import logging
 import threading
 from datetime import datetime, timedelta
-from typing import Any, Optional, Dict, List
+from typing import Any, Callable, Optional, Dict, List, Tuple
 from pathlib import Path
 from dataclasses import dataclass, asdict
-import pickle
-import gzip
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .blob_store import SegmentBlobStore
+from .memory_cache import MemoryLRUCache
+from .cache_codecs import CacheCodec, codec_to_id, id_to_codec, legacy_codec
 
 logger = logging.getLogger(__name__)
 
@@ -28,11 +32,25 @@ class CacheConfig:
     db_file: str = "cache_index.db"             # SQLite索引檔案
     default_ttl_hours: int = 24                 # 預設TTL(小時)
     max_memory_entries: int = 1000              # 記憶體快取最大條目數
+    max_memory_mb: int = 64                     # 記憶體快取大小上限(MB，以序列化大小估算，0表示不限)
+    enable_admission: bool = False              # 啟用 TinyLFU 准入策略
     enable_compression: bool = True             # 啟用壓縮
+    codec: str = "auto"                         # 序列化方式: "auto"/"pickle"(pickle)、"msgpack"
+    compression_level: int = 6                  # zlib 壓縮等級
+    min_compress_bytes: int = 1024              # 超過此大小才壓縮
     enable_memory_cache: bool = True            # 啟用記憶體快取
     enable_disk_cache: bool = True              # 啟用磁碟快取
     cleanup_interval_hours: int = 6             # 清理間隔(小時)
     max_file_size_mb: int = 10                  # 單檔最大大小(MB)
+    disk_backend: str = "files"                 # 磁碟儲存方式: "files"(每筆一檔) 或 "segments"(區段檔)
+    max_segment_mb: int = 64                    # 區段檔大小上限(MB)
+    compaction_ratio: float = 0.5               # 可回收空間比例超過此值時壓實區段
+    stale_grace_hours: int = 168                # 過期後仍可作為舊值提供的寬限期(小時，0表示停用)
+    io_workers: int = 4                         # 快取 I/O 專用執行緒數
+    io_max_pending: int = 64                    # 每個事件迴圈同時排隊的快取 I/O 上限
+    io_timeout_seconds: float = 5.0             # 非同步快取操作逾時(秒)，逾時視為未命中
+    access_flush_batch: int = 200               # 累積多少筆訪問統計後寫回索引
+    access_flush_interval_seconds: float = 30.0 # 訪問統計最長寫回間隔(秒)
 
 
 @dataclass
@@ -46,24 +64,60 @@ class CacheEntry:
     last_accessed: float = 0.0
     compressed: bool = False
     size_bytes: int = 0
+    codec: str = 'pickle'
 
 
 class CacheManager:
     """多層級智慧快取管理器"""
     
+    # get_with_status 回傳的新鮮度
+    FRESH = 'fresh'
+    STALE = 'stale'
+    MISS = 'miss'
+    
     def __init__(self, config: CacheConfig = None):
         self.config = config or CacheConfig()
         self.cache_dir = Path(self.config.cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # 記憶體快取
-        self.memory_cache: Dict[str, CacheEntry] = {}
+        self.memory_cache = MemoryLRUCache(
+            max_entries=self.config.max_memory_entries,
+            max_bytes=self.config.max_memory_mb * 1024 * 1024,
+            admission=self.config.enable_admission
+        )
         self.memory_lock = threading.RLock()
         
-        # 資料庫連線
+        # 編解碼器
+        self.codec = CacheCodec(
+            preferred=self.config.codec,
+            compression=self.config.enable_compression,
+            level=self.config.compression_level,
+            min_compress_bytes=self.config.min_compress_bytes
+        )
+        
+        # 資料庫連線（長期連線，以鎖序列化存取）
         self.db_path = self.cache_dir / self.config.db_file
+        self._db_lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
         self._init_database()
         
+        # 緩衝的訪問統計 {cache_key: (累計次數, 最後訪問時間)}，定期批次寫回
+        self._pending_access: Dict[str, Tuple[int, float]] = {}
+        self._access_lock = threading.Lock()
+        self._last_access_flush = time.time()
+        self._closed = threading.Event()
+        
+        # 區段式儲存：值與索引都在區段檔中，命中時不需查詢 SQLite
+        self.blob_store: Optional[SegmentBlobStore] = None
+        if self.config.enable_disk_cache and self.config.disk_backend == "segments":
+            self.blob_store = SegmentBlobStore(
+                self.cache_dir / "segments",
+                max_segment_bytes=self.config.max_segment_mb * 1024 * 1024,
+                compaction_ratio=self.config.compaction_ratio,
+                grace_seconds=self.config.stale_grace_hours * 3600
+            )
+        
         # 統計資訊
         self.stats = {
             'memory_hits': 0,
@@ -72,9 +126,19 @@ class CacheManager:
             'sets': 0,
             'deletes': 0,
             'cleanups': 0,
+            'stale_hits': 0,
+            'access_flushes': 0,
+            'io_timeouts': 0,
             'total_size_mb': 0.0
         }
         
+        # 快取 I/O 專用執行緒池，與 HTTP 解析等其他工作隔離
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=self.config.io_workers, thread_name_prefix='cache-io'
+        )
+        self._io_semaphores: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+        self._io_lock = threading.Lock()
+        
         # 啟動背景清理任務
         self._start_cleanup_task()
         
@@ -83,7 +147,11 @@ class CacheManager:
     def _init_database(self):
         """初始化SQLite索引資料庫"""
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            
+            with self._connection() as conn:
                 conn.execute('''
                     CREATE TABLE IF NOT EXISTS cache_index (
                         key TEXT PRIMARY KEY,
@@ -101,12 +169,57 @@ class CacheManager:
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON cache_index(created_at)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_last_accessed ON cache_index(last_accessed)')
                 
-                conn.commit()
+                # 遷移：新增編解碼器欄位（舊資料為 NULL，依 compressed 判斷格式）
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(cache_index)')]
+                if 'codec' not in columns:
+                    conn.execute('ALTER TABLE cache_index ADD COLUMN codec TEXT')
+                
                 logger.debug("📊 快取索引資料庫已初始化")
                 
         except Exception as e:
             logger.error(f"初始化快取資料庫失敗: {e}")
     
+    @contextmanager
+    def _connection(self):
+        """取得長期連線並開啟交易（離開時自動提交或回滾）"""
+        with self._db_lock:
+            with self._conn:
+                yield self._conn
+    
+    def _record_access(self, cache_key: str, access_time: float):
+        """緩衝一次磁碟命中的訪問統計，達到批次大小或間隔時寫回"""
+        with self._access_lock:
+            count, _ = self._pending_access.get(cache_key, (0, 0.0))
+            self._pending_access[cache_key] = (count + 1, access_time)
+            should_flush = (
+                len(self._pending_access) >= self.config.access_flush_batch or
+                access_time - self._last_access_flush >= self.config.access_flush_interval_seconds
+            )
+        if should_flush:
+            self.flush_access_stats()
+    
+    def flush_access_stats(self):
+        """將緩衝的訪問統計以單一交易寫回索引"""
+        with self._access_lock:
+            if not self._pending_access:
+                self._last_access_flush = time.time()
+                return
+            pending = self._pending_access
+            self._pending_access = {}
+            self._last_access_flush = time.time()
+        
+        try:
+            with self._connection() as conn:
+                conn.executemany('''
+                    UPDATE cache_index
+                    SET access_count = access_count + ?, last_accessed = MAX(COALESCE(last_accessed, 0), ?)
+                    WHERE key = ?
+                ''', [(count, accessed, cache_key) for cache_key, (count, accessed) in pending.items()])
+            self.stats['access_flushes'] += 1
+            logger.debug(f"📊 已寫回 {len(pending)} 筆訪問統計")
+        except Exception as e:
+            logger.error(f"寫回訪問統計失敗: {e}")
+    
     def _generate_cache_key(self, key: str) -> str:
         """生成快取鍵值"""
         return hashlib.sha256(key.encode('utf-8')).hexdigest()
@@ -120,36 +233,18 @@ class CacheManager:
         cache_file_dir.mkdir(parents=True, exist_ok=True)
         return cache_file_dir / f"{cache_key}.cache"
     
-    def _serialize_value(self, value: Any) -> Tuple[bytes, bool]:
-        """序列化值並選擇性壓縮"""
+    def _serialize_value(self, value: Any) -> Tuple[bytes, str]:
+        """序列化值並選擇性壓縮，回傳 (資料, 編解碼器名稱)"""
         try:
-            # 序列化
-            serialized = pickle.dumps(value)
-            
-            # 決定是否壓縮
-            should_compress = (
-                self.config.enable_compression and 
-                len(serialized) > 1024  # 超過1KB才壓縮
-            )
-            
-            if should_compress:
-                compressed_data = gzip.compress(serialized)
-                # 只有在壓縮有效果時才使用
-                if len(compressed_data) < len(serialized) * 0.9:
-                    return compressed_data, True
-            
-            return serialized, False
-            
+            return self.codec.encode(value)
         except Exception as e:
             logger.error(f"序列化值失敗: {e}")
-            return b'', False
+            return b'', 'pickle'
     
-    def _deserialize_value(self, data: bytes, compressed: bool) -> Any:
-        """反序列化值"""
+    def _deserialize_value(self, data: bytes, compressed: bool, codec: Optional[str] = None) -> Any:
+        """反序列化值（codec 為空時視為舊版 pickle/gzip 格式）"""
         try:
-            if compressed:
-                data = gzip.decompress(data)
-            return pickle.loads(data)
+            return self.codec.decode(data, codec or legacy_codec(compressed))
         except Exception as e:
             logger.error(f"反序列化值失敗: {e}")
             return None
@@ -158,6 +253,10 @@ class CacheManager:
         """檢查是否過期"""
         return time.time() - created_at > ttl_seconds
     
+    def _is_beyond_grace(self, created_at: float, ttl_seconds: int) -> bool:
+        """檢查是否已超過過期寬限期（不能再作為舊值提供）"""
+        return time.time() - created_at > ttl_seconds + self.config.stale_grace_hours * 3600
+    
     def set(self, key: str, value: Any, ttl_hours: Optional[int] = None) -> bool:
         """設置快取值"""
         ttl_seconds = (ttl_hours or self.config.default_ttl_hours) * 3600
@@ -166,7 +265,8 @@ class CacheManager:
         
         try:
             # 序列化和壓縮
-            serialized_data, compressed = self._serialize_value(value)
+            serialized_data, codec = self._serialize_value(value)
+            compressed = '+' in codec
             size_bytes = len(serialized_data)
             
             # 檢查檔案大小限制
@@ -183,17 +283,20 @@ class CacheManager:
                 ttl_seconds=ttl_seconds,
                 last_accessed=current_time,
                 compressed=compressed,
-                size_bytes=size_bytes
+                size_bytes=size_bytes,
+                codec=codec
             )
             
             # 設置記憶體快取
             if self.config.enable_memory_cache:
                 with self.memory_lock:
-                    self.memory_cache[cache_key] = entry
-                    self._cleanup_memory_cache()
+                    self.memory_cache.put(cache_key, entry, size_bytes)
             
             # 設置磁碟快取
-            if self.config.enable_disk_cache:
+            if self.blob_store is not None:
+                self.blob_store.put(cache_key, serialized_data, current_time, ttl_seconds,
+                                    compressed, codec_to_id(codec))
+            elif self.config.enable_disk_cache:
                 file_path = self._get_file_path(cache_key)
                 
                 # 寫入檔案
@@ -201,16 +304,15 @@ class CacheManager:
                     f.write(serialized_data)
                 
                 # 更新索引
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with self._connection() as conn:
                     conn.execute('''
                         INSERT OR REPLACE INTO cache_index 
-                        (key, file_path, created_at, ttl_seconds, last_accessed, compressed, size_bytes)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        (key, file_path, created_at, ttl_seconds, last_accessed, compressed, size_bytes, codec)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (
                         cache_key, str(file_path), current_time, ttl_seconds,
-                        current_time, compressed, size_bytes
+                        current_time, compressed, size_bytes, codec
                     ))
-                    conn.commit()
             
             self.stats['sets'] += 1
             logger.debug(f"💾 已快取: {key} ({size_bytes} bytes)")
@@ -221,89 +323,325 @@ class CacheManager:
             return False
     
     def get(self, key: str) -> Optional[Any]:
-        """獲取快取值"""
+        """獲取快取值（只回傳未過期的值）"""
+        value, status = self.get_with_status(key, allow_stale=False)
+        return value if status == self.FRESH else None
+    
+    def get_with_status(self, key: str, allow_stale: bool = True) -> Tuple[Optional[Any], str]:
+        """
+        獲取快取值與新鮮度
+        
+        過期但仍在寬限期內的值會以 STALE 回傳，呼叫端可先使用舊值再於背景更新。
+        
+        Returns:
+            Tuple[值, 狀態]: 狀態為 FRESH / STALE / MISS
+        """
         cache_key = self._generate_cache_key(key)
         current_time = time.time()
         
         # 嘗試記憶體快取
         if self.config.enable_memory_cache:
             with self.memory_lock:
-                if cache_key in self.memory_cache:
-                    entry = self.memory_cache[cache_key]
-                    
+                entry = self.memory_cache.get(cache_key)
+                if entry is not None:
                     # 檢查是否過期
                     if not self._is_expired(entry.created_at, entry.ttl_seconds):
                         entry.access_count += 1
                         entry.last_accessed = current_time
                         self.stats['memory_hits'] += 1
                         logger.debug(f"📋 記憶體快取命中: {key}")
-                        return entry.value
+                        return entry.value, self.FRESH
+                    elif not self._is_beyond_grace(entry.created_at, entry.ttl_seconds):
+                        if allow_stale:
+                            self.stats['stale_hits'] += 1
+                            logger.debug(f"🕰️ 記憶體快取命中過期值: {key}")
+                            return entry.value, self.STALE
                     else:
-                        # 過期，從記憶體移除
-                        del self.memory_cache[cache_key]
+                        # 超過寬限期，從記憶體移除
+                        self.memory_cache.pop(cache_key)
+        
+        # 嘗試區段式磁碟快取
+        if self.blob_store is not None:
+            value, status = self._get_from_blob_store(key, cache_key, current_time, allow_stale)
+            if value is not None:
+                return value, status
         
         # 嘗試磁碟快取
-        if self.config.enable_disk_cache:
+        elif self.config.enable_disk_cache:
             try:
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with self._connection() as conn:
                     cursor = conn.execute('''
-                        SELECT file_path, created_at, ttl_seconds, compressed, access_count
+                        SELECT file_path, created_at, ttl_seconds, compressed, access_count, codec
                         FROM cache_index WHERE key = ?
                     ''', (cache_key,))
-                    
                     result = cursor.fetchone()
-                    if result:
-                        file_path, created_at, ttl_seconds, compressed, access_count = result
+                
+                if result:
+                    file_path, created_at, ttl_seconds, compressed, access_count, codec = result
+                    
+                    # 檢查是否過期
+                    fresh = not self._is_expired(created_at, ttl_seconds)
+                    if fresh or (allow_stale and not self._is_beyond_grace(created_at, ttl_seconds)):
+                        file_path_obj = Path(file_path)
                         
-                        # 檢查是否過期
-                        if not self._is_expired(created_at, ttl_seconds):
-                            file_path_obj = Path(file_path)
+                        if file_path_obj.exists():
+                            # 讀取檔案（不持有資料庫鎖）
+                            with open(file_path_obj, 'rb') as f:
+                                data = f.read()
+                            
+                            # 反序列化
+                            value = self._deserialize_value(data, compressed, codec)
                             
-                            if file_path_obj.exists():
-                                # 讀取檔案
-                                with open(file_path_obj, 'rb') as f:
-                                    data = f.read()
+                            if value is not None:
+                                # 訪問統計先緩衝在記憶體，批次寫回
+                                self._record_access(cache_key, current_time)
                                 
-                                # 反序列化
-                                value = self._deserialize_value(data, compressed)
+                                # 載入到記憶體快取
+                                if self.config.enable_memory_cache:
+                                    with self.memory_lock:
+                                        entry = CacheEntry(
+                                            key=cache_key,
+                                            value=value,
+                                            created_at=created_at,
+                                            ttl_seconds=ttl_seconds,
+                                            access_count=access_count + 1,
+                                            last_accessed=current_time,
+                                            compressed=compressed,
+                                            size_bytes=len(data),
+                                            codec=codec or legacy_codec(compressed)
+                                        )
+                                        self.memory_cache.put(cache_key, entry, len(data))
                                 
-                                if value is not None:
-                                    # 更新訪問統計
-                                    conn.execute('''
-                                        UPDATE cache_index 
-                                        SET access_count = access_count + 1, last_accessed = ?
-                                        WHERE key = ?
-                                    ''', (current_time, cache_key))
-                                    conn.commit()
-                                    
-                                    # 載入到記憶體快取
-                                    if self.config.enable_memory_cache:
-                                        with self.memory_lock:
-                                            entry = CacheEntry(
-                                                key=cache_key,
-                                                value=value,
-                                                created_at=created_at,
-                                                ttl_seconds=ttl_seconds,
-                                                access_count=access_count + 1,
-                                                last_accessed=current_time,
-                                                compressed=compressed,
-                                                size_bytes=len(data)
-                                            )
-                                            self.memory_cache[cache_key] = entry
-                                    
+                                if fresh:
                                     self.stats['disk_hits'] += 1
                                     logger.debug(f"💿 磁碟快取命中: {key}")
-                                    return value
-                        else:
-                            # 過期，清理
-                            self._delete_cache_entry(cache_key, file_path)
-                            
+                                    return value, self.FRESH
+                                self.stats['stale_hits'] += 1
+                                logger.debug(f"🕰️ 磁碟快取命中過期值: {key}")
+                                return value, self.STALE
+                    elif self._is_beyond_grace(created_at, ttl_seconds):
+                        # 超過寬限期，清理
+                        self._delete_cache_entry(cache_key, file_path)
+                        
             except Exception as e:
                 logger.error(f"讀取磁碟快取失敗: {e}")
         
         self.stats['misses'] += 1
         logger.debug(f"❌ 快取未命中: {key}")
-        return None
+        return None, self.MISS
+    
+    def _get_from_blob_store(self, key: str, cache_key: str, current_time: float,
+                             allow_stale: bool = False) -> Tuple[Optional[Any], str]:
+        """從區段式儲存讀取（記憶體索引查詢 + mmap 切片）"""
+        try:
+            found = self.blob_store.get(cache_key)
+            if found is None:
+                return None, self.MISS
+            
+            data, location = found
+            fresh = not self._is_expired(location.created_at, location.ttl_seconds)
+            if not fresh:
+                if self._is_beyond_grace(location.created_at, location.ttl_seconds):
+                    self.blob_store.delete(cache_key)
+                    return None, self.MISS
+                if not allow_stale:
+                    return None, self.MISS
+            
+            codec = id_to_codec(location.codec_id) if location.codec_id else None
+            value = self._deserialize_value(data, location.compressed, codec)
+            if value is None:
+                return None, self.MISS
+            
+            # 載入到記憶體快取
+            if self.config.enable_memory_cache:
+                with self.memory_lock:
+                    self.memory_cache.put(cache_key, CacheEntry(
+                        key=cache_key,
+                        value=value,
+                        created_at=location.created_at,
+                        ttl_seconds=location.ttl_seconds,
+                        access_count=1,
+                        last_accessed=current_time,
+                        compressed=location.compressed,
+                        size_bytes=location.length,
+                        codec=codec or legacy_codec(location.compressed)
+                    ), location.length)
+            
+            if fresh:
+                self.stats['disk_hits'] += 1
+                logger.debug(f"💿 區段快取命中: {key}")
+                return value, self.FRESH
+            self.stats['stale_hits'] += 1
+            logger.debug(f"🕰️ 區段快取命中過期值: {key}")
+            return value, self.STALE
+            
+        except Exception as e:
+            logger.error(f"讀取區段快取失敗: {e}")
+            return None, self.MISS
+    
+    # SQLite 單一查詢可綁定的參數數量有限，IN 查詢分段執行
+    BATCH_QUERY_SIZE = 500
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        批次獲取快取值
+        
+        先查記憶體快取，未命中的鍵再以分段 IN 查詢一次取回索引。
+        
+        Returns:
+            {鍵: 值}，只包含命中的鍵
+        """
+        current_time = time.time()
+        results: Dict[str, Any] = {}
+        missing: Dict[str, str] = {}
+        
+        # 記憶體快取
+        with self.memory_lock:
+            for key in keys:
+                cache_key = self._generate_cache_key(key)
+                if self.config.enable_memory_cache:
+                    entry = self.memory_cache.get(cache_key)
+                    if entry is not None:
+                        if not self._is_expired(entry.created_at, entry.ttl_seconds):
+                            entry.access_count += 1
+                            entry.last_accessed = current_time
+                            results[key] = entry.value
+                            self.stats['memory_hits'] += 1
+                            continue
+                        if self._is_beyond_grace(entry.created_at, entry.ttl_seconds):
+                            self.memory_cache.pop(cache_key)
+                missing[cache_key] = key
+        
+        # 區段式磁碟快取：每個鍵只是記憶體索引查詢
+        if missing and self.blob_store is not None:
+            for cache_key, key in list(missing.items()):
+                value, _status = self._get_from_blob_store(key, cache_key, current_time)
+                if value is not None:
+                    results[key] = value
+                    del missing[cache_key]
+        
+        # 檔案式磁碟快取：分段 IN 查詢
+        elif missing and self.config.enable_disk_cache:
+            try:
+                rows = []
+                cache_keys = list(missing)
+                with self._connection() as conn:
+                    for i in range(0, len(cache_keys), self.BATCH_QUERY_SIZE):
+                        chunk = cache_keys[i:i + self.BATCH_QUERY_SIZE]
+                        placeholders = ','.join('?' * len(chunk))
+                        rows.extend(conn.execute(f'''
+                            SELECT key, file_path, created_at, ttl_seconds, compressed, access_count, codec
+                            FROM cache_index WHERE key IN ({placeholders})
+                        ''', chunk).fetchall())
+                
+                expired = []
+                for cache_key, file_path, created_at, ttl_seconds, compressed, access_count, codec in rows:
+                    if self._is_expired(created_at, ttl_seconds):
+                        if self._is_beyond_grace(created_at, ttl_seconds):
+                            expired.append((cache_key, file_path))
+                        continue
+                    
+                    file_path_obj = Path(file_path)
+                    if not file_path_obj.exists():
+                        continue
+                    with open(file_path_obj, 'rb') as f:
+                        data = f.read()
+                    
+                    value = self._deserialize_value(data, compressed, codec)
+                    if value is None:
+                        continue
+                    
+                    self._record_access(cache_key, current_time)
+                    if self.config.enable_memory_cache:
+                        with self.memory_lock:
+                            self.memory_cache.put(cache_key, CacheEntry(
+                                key=cache_key,
+                                value=value,
+                                created_at=created_at,
+                                ttl_seconds=ttl_seconds,
+                                access_count=access_count + 1,
+                                last_accessed=current_time,
+                                compressed=compressed,
+                                size_bytes=len(data),
+                                codec=codec or legacy_codec(compressed)
+                            ), len(data))
+                    
+                    results[missing.pop(cache_key)] = value
+                    self.stats['disk_hits'] += 1
+                
+                if expired:
+                    self._delete_cache_entries(expired)
+                    
+            except Exception as e:
+                logger.error(f"批次讀取磁碟快取失敗: {e}")
+        
+        self.stats['misses'] += len(missing)
+        logger.debug(f"📋 批次快取查詢: {len(results)}/{len(keys)} 命中")
+        return results
+    
+    def set_many(self, items: Dict[str, Any], ttl_hours: Optional[int] = None) -> int:
+        """
+        批次設置快取值，索引以單一交易寫入
+        
+        Returns:
+            成功快取的數量
+        """
+        ttl_seconds = (ttl_hours or self.config.default_ttl_hours) * 3600
+        current_time = time.time()
+        max_size_bytes = self.config.max_file_size_mb * 1024 * 1024
+        index_rows = []
+        stored = 0
+        
+        try:
+            for key, value in items.items():
+                cache_key = self._generate_cache_key(key)
+                serialized_data, codec = self._serialize_value(value)
+                compressed = '+' in codec
+                size_bytes = len(serialized_data)
+                if size_bytes > max_size_bytes:
+                    logger.warning(f"快取值過大 ({size_bytes/1024/1024:.1f}MB)，跳過快取: {key}")
+                    continue
+                
+                if self.config.enable_memory_cache:
+                    with self.memory_lock:
+                        self.memory_cache.put(cache_key, CacheEntry(
+                            key=cache_key,
+                            value=value,
+                            created_at=current_time,
+                            ttl_seconds=ttl_seconds,
+                            last_accessed=current_time,
+                            compressed=compressed,
+                            size_bytes=size_bytes,
+                            codec=codec
+                        ), size_bytes)
+                
+                if self.blob_store is not None:
+                    self.blob_store.put(cache_key, serialized_data, current_time, ttl_seconds,
+                                        compressed, codec_to_id(codec))
+                elif self.config.enable_disk_cache:
+                    file_path = self._get_file_path(cache_key)
+                    with open(file_path, 'wb') as f:
+                        f.write(serialized_data)
+                    index_rows.append((
+                        cache_key, str(file_path), current_time, ttl_seconds,
+                        current_time, compressed, size_bytes, codec
+                    ))
+                stored += 1
+            
+            if index_rows:
+                with self._connection() as conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO cache_index 
+                        (key, file_path, created_at, ttl_seconds, last_accessed, compressed, size_bytes, codec)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', index_rows)
+            
+        except Exception as e:
+            logger.error(f"批次設置快取失敗: {e}")
+        
+        self.stats['sets'] += stored
+        logger.debug(f"💾 批次快取: {stored}/{len(items)} 筆")
+        return stored
     
     def delete(self, key: str) -> bool:
         """刪除快取條目"""
@@ -316,8 +654,10 @@ class CacheManager:
                     self.memory_cache.pop(cache_key, None)
             
             # 從磁碟移除
-            if self.config.enable_disk_cache:
-                with sqlite3.connect(str(self.db_path)) as conn:
+            if self.blob_store is not None:
+                self.blob_store.delete(cache_key)
+            elif self.config.enable_disk_cache:
+                with self._connection() as conn:
                     cursor = conn.execute('SELECT file_path FROM cache_index WHERE key = ?', (cache_key,))
                     result = cursor.fetchone()
                     
@@ -342,31 +682,28 @@ class CacheManager:
                 file_path_obj.unlink()
             
             # 從索引移除
-            with sqlite3.connect(str(self.db_path)) as conn:
+            with self._connection() as conn:
                 conn.execute('DELETE FROM cache_index WHERE key = ?', (cache_key,))
-                conn.commit()
                 
         except Exception as e:
             logger.error(f"刪除快取條目失敗: {e}")
     
-    def _cleanup_memory_cache(self):
-        """清理記憶體快取（LRU策略）"""
-        if len(self.memory_cache) <= self.config.max_memory_entries:
-            return
-        
-        # 按最後訪問時間排序，移除最舊的條目
-        sorted_entries = sorted(
-            self.memory_cache.items(),
-            key=lambda x: x[1].last_accessed
-        )
-        
-        # 移除超出限制的條目
-        remove_count = len(self.memory_cache) - self.config.max_memory_entries
-        for i in range(remove_count):
-            cache_key, _ = sorted_entries[i]
-            del self.memory_cache[cache_key]
+    def _delete_cache_entries(self, entries: List[Tuple[str, str]]):
+        """批次刪除快取條目（檔案和索引），索引以單一交易刪除"""
+        for _cache_key, file_path in entries:
+            try:
+                Path(file_path).unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"刪除快取檔案失敗: {e}")
         
-        logger.debug(f"🧹 記憶體快取清理: 移除 {remove_count} 個條目")
+        try:
+            with self._connection() as conn:
+                conn.executemany('DELETE FROM cache_index WHERE key = ?',
+                                 [(cache_key,) for cache_key, _file_path in entries])
+        except Exception as e:
+            logger.error(f"刪除快取條目失敗: {e}")
     
     def _cleanup_expired_cache(self):
         """清理過期快取"""
@@ -378,23 +715,30 @@ class CacheManager:
                 with self.memory_lock:
                     expired_keys = [
                         key for key, entry in self.memory_cache.items()
-                        if self._is_expired(entry.created_at, entry.ttl_seconds)
+                        if self._is_beyond_grace(entry.created_at, entry.ttl_seconds)
                     ]
                     
                     for key in expired_keys:
-                        del self.memory_cache[key]
+                        self.memory_cache.pop(key)
                     
                     if expired_keys:
                         logger.info(f"🧹 記憶體快取清理: {len(expired_keys)} 個過期條目")
             
+            # 清理區段式磁碟快取
+            if self.blob_store is not None:
+                expired_count = self.blob_store.delete_expired(current_time)
+                if expired_count:
+                    logger.info(f"🧹 區段快取清理: {expired_count} 個過期條目")
+                self.blob_store.compact()
+            
             # 清理磁碟快取
-            if self.config.enable_disk_cache:
-                with sqlite3.connect(str(self.db_path)) as conn:
-                    # 查找過期條目
+            elif self.config.enable_disk_cache:
+                with self._connection() as conn:
+                    # 查找超過寬限期的過期條目
                     cursor = conn.execute('''
                         SELECT key, file_path FROM cache_index 
-                        WHERE ? - created_at > ttl_seconds
-                    ''', (current_time,))
+                        WHERE ? - created_at > ttl_seconds + ?
+                    ''', (current_time, self.config.stale_grace_hours * 3600))
                     
                     expired_entries = cursor.fetchall()
                     
@@ -413,10 +757,15 @@ class CacheManager:
     def _start_cleanup_task(self):
         """啟動背景清理任務"""
         def cleanup_worker():
-            while True:
+            interval = self.config.cleanup_interval_hours * 3600
+            next_cleanup = time.time() + interval
+            # 同時負責定期寫回訪問統計，閒置時也不會遺失
+            while not self._closed.wait(self.config.access_flush_interval_seconds):
                 try:
-                    time.sleep(self.config.cleanup_interval_hours * 3600)
-                    self._cleanup_expired_cache()
+                    self.flush_access_stats()
+                    if time.time() >= next_cleanup:
+                        next_cleanup = time.time() + interval
+                        self._cleanup_expired_cache()
                 except Exception as e:
                     logger.error(f"背景清理任務失敗: {e}")
         
@@ -433,7 +782,9 @@ class CacheManager:
                     self.memory_cache.clear()
             
             # 清空磁碟快取
-            if self.config.enable_disk_cache:
+            if self.blob_store is not None:
+                self.blob_store.clear()
+            elif self.config.enable_disk_cache:
                 # 刪除所有快取檔案
                 for cache_file in self.cache_dir.rglob("*.cache"):
                     try:
@@ -442,9 +793,8 @@ class CacheManager:
                         pass
                 
                 # 清空索引
-                with sqlite3.connect(str(self.db_path)) as conn:
+                with self._connection() as conn:
                     conn.execute('DELETE FROM cache_index')
-                    conn.commit()
             
             logger.info("🧹 已清空所有快取")
             
@@ -456,15 +806,17 @@ class CacheManager:
         try:
             # 計算總大小
             total_size_bytes = 0
-            if self.config.enable_disk_cache:
-                with sqlite3.connect(str(self.db_path)) as conn:
+            if self.blob_store is not None:
+                total_size_bytes = self.blob_store.live_bytes()
+            elif self.config.enable_disk_cache:
+                with self._connection() as conn:
                     cursor = conn.execute('SELECT SUM(size_bytes) FROM cache_index')
                     result = cursor.fetchone()
                     if result and result[0]:
                         total_size_bytes = result[0]
             
             # 記憶體快取大小
-            memory_size_bytes = sum(entry.size_bytes for entry in self.memory_cache.values())
+            memory_size_bytes = self.memory_cache.total_bytes
             
             total_requests = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
             hit_rate = (
@@ -477,9 +829,17 @@ class CacheManager:
                 'total_size_mb': total_size_bytes / (1024 * 1024),
                 'memory_cache_entries': len(self.memory_cache),
                 'memory_cache_size_mb': memory_size_bytes / (1024 * 1024),
+                'memory_tier': self.memory_cache.get_stats(),
+                'codecs': self.codec.get_stats(),
+                'io': {
+                    'workers': self.config.io_workers,
+                    'max_pending': self.config.io_max_pending,
+                    'timeout_seconds': self.config.io_timeout_seconds
+                },
                 'hit_rate': f"{hit_rate:.1f}%",
                 'memory_hit_rate': f"{(self.stats['memory_hits'] / total_requests * 100):.1f}%" if total_requests > 0 else "0%",
                 'disk_hit_rate': f"{(self.stats['disk_hits'] / total_requests * 100):.1f}%" if total_requests > 0 else "0%",
+                'blob_store': self.blob_store.get_stats() if self.blob_store else None,
                 'config': asdict(self.config)
             }
             
@@ -487,18 +847,99 @@ class CacheManager:
             logger.error(f"獲取快取統計失敗: {e}")
             return self.stats
     
+    def close(self):
+        """寫回緩衝的訪問統計並關閉資料庫連線與區段檔"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        # 等待排隊中的寫入完成後再關閉連線
+        self._io_executor.shutdown(wait=True)
+        self.flush_access_stats()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        if self.blob_store is not None:
+            self.blob_store.close()
+        logger.info("💾 快取管理器已關閉")
+    
     # 非同步介面
+    def _get_io_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        """取得事件迴圈專屬的 I/O 排隊上限（Semaphore 綁定建立時的迴圈）"""
+        with self._io_lock:
+            entry = self._io_semaphores.get(id(loop))
+            if entry is None or entry[0] is not loop:
+                for loop_id, (other_loop, _semaphore) in list(self._io_semaphores.items()):
+                    if other_loop.is_closed():
+                        del self._io_semaphores[loop_id]
+                entry = (loop, asyncio.Semaphore(self.config.io_max_pending))
+                self._io_semaphores[id(loop)] = entry
+            return entry[1]
+    
+    @staticmethod
+    def _release_io_slot(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore):
+        """執行緒完成（或在開始前取消）後釋放排隊名額"""
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            # 事件迴圈已關閉
+            pass
+    
+    async def _submit_io(self, loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore,
+                         func: Callable, *args) -> Any:
+        await semaphore.acquire()
+        try:
+            future = self._io_executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+        # 名額在執行緒真正結束時才釋放，逾時或取消不會讓排隊數失真
+        future.add_done_callback(lambda _future: self._release_io_slot(loop, semaphore))
+        # 呼叫端取消時，尚未開始的工作會一併取消
+        return await asyncio.wrap_future(future, loop=loop)
+    
+    async def _run_io(self, func: Callable, *args, default: Any = None) -> Any:
+        """在專用執行緒池執行快取 I/O，含排隊上限與逾時；關閉後一律回傳 default"""
+        if self._closed.is_set():
+            return default
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_io_semaphore(loop)
+        try:
+            return await asyncio.wait_for(
+                self._submit_io(loop, semaphore, func, *args),
+                timeout=self.config.io_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            self.stats['io_timeouts'] += 1
+            logger.warning(f"⏰ 快取操作 {func.__name__} 逾時 ({self.config.io_timeout_seconds}秒)，略過快取")
+            return default
+        except RuntimeError:
+            # 等待名額期間 close() 已關閉執行緒池，submit 會拋出 RuntimeError
+            if not self._closed.is_set():
+                raise
+            logger.debug(f"快取管理器已關閉，略過快取操作 {func.__name__}")
+            return default
+    
     async def set_async(self, key: str, value: Any, ttl_hours: Optional[int] = None) -> bool:
         """非同步設置快取值"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.set, key, value, ttl_hours)
+        return await self._run_io(self.set, key, value, ttl_hours, default=False)
     
     async def get_async(self, key: str) -> Optional[Any]:
         """非同步獲取快取值"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.get, key)
+        return await self._run_io(self.get, key)
+    
+    async def get_with_status_async(self, key: str, allow_stale: bool = True) -> Tuple[Optional[Any], str]:
+        """非同步獲取快取值與新鮮度"""
+        return await self._run_io(self.get_with_status, key, allow_stale, default=(None, self.MISS))
+    
+    async def get_many_async(self, keys: List[str]) -> Dict[str, Any]:
+        """非同步批次獲取快取值"""
+        return await self._run_io(self.get_many, keys, default={})
+    
+    async def set_many_async(self, items: Dict[str, Any], ttl_hours: Optional[int] = None) -> int:
+        """非同步批次設置快取值"""
+        return await self._run_io(self.set_many, items, ttl_hours, default=0)
     
     async def delete_async(self, key: str) -> bool:
         """非同步刪除快取值"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.delete, key)
\ No newline at end of file
+        return await self._run_io(self.delete, key, default=False)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+網域編碼記憶模組
+記住每個網域最近勝出的編碼與連續勝出次數，信心足夠時直接以該編碼解碼，並跨執行保存
+"""
+
+import os
+import json
+import codecs
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+from .encoding_utils import (
+    declared_encoding, normalize_encoding, resolve_encoding, sample_content, score_encoding
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingMemory:
+    """
+    網域編碼記憶
+
+    - 每次判斷出編碼後記錄；與記憶相同則信心 +1（達到 min_wins 後不再累加），不同則改記新的編碼並從 1 開始
+    - 記憶開始或停止生效時立即保存，其餘變更累積 SAVE_EVERY 筆後才保存
+    - 信心達到 min_wins 後，沒有 BOM 或字元集宣告的回應直接以記憶的編碼解碼，略過候選評分；
+      有宣告時一律以宣告為準
+    - 樣本的替換字元比例超過 spike_ratio，或非 UTF-8 記憶遇到合法 UTF-8 樣本時，
+      視為網站換了編碼：信心歸零並重新判斷
+    """
+
+    # 未影響記憶是否生效的變更，每累積多少筆才寫回檔案
+    SAVE_EVERY = 20
+
+    def __init__(self, memory_file: str, min_wins: int = 3, spike_ratio: float = 0.02):
+        self.memory_file = Path(memory_file)
+        self.min_wins = min_wins
+        self.spike_ratio = spike_ratio
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty_count = 0
+
+        # 結構: {domain: {'encoding': str, 'wins': int, 'updated_at': float}}
+        self.domains: Dict[str, Dict[str, Any]] = {}
+        self.stats = {
+            'memory_hits': 0,
+            'fallbacks': 0,
+            'resolved': 0
+        }
+        self._load()
+
+    @staticmethod
+    def domain_of(url: str) -> str:
+        """取得網域（忽略 www. 前綴與埠號）"""
+        host = (urlparse(url).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+
+    def _load(self):
+        """載入記憶"""
+        if not self.memory_file.exists():
+            return
+        try:
+            with open(self.memory_file, 'r', encoding='utf-8') as f:
+                self.domains = json.load(f).get('domains', {})
+            # 舊紀錄可能存有 shift_jis，統一改為 cp932
+            for entry in self.domains.values():
+                entry['encoding'] = normalize_encoding(entry['encoding']) or entry['encoding']
+        except Exception as e:
+            logger.warning(f"載入編碼記憶失敗: {e}")
+            self.domains = {}
+
+    def save(self):
+        """儲存記憶（在鎖內序列化快照，寫入暫存檔後原子替換）"""
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps({'domains': self.domains, 'updated_at': time.time()},
+                                     ensure_ascii=False, indent=2)
+                self._dirty_count = 0
+            temp_file = self.memory_file.with_name(self.memory_file.name + '.tmp')
+            try:
+                self.memory_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(temp_file, self.memory_file)
+            except Exception as e:
+                logger.warning(f"儲存編碼記憶失敗: {e}")
+
+    def preferred(self, url: str) -> Optional[str]:
+        """信心足夠時回傳記憶的編碼"""
+        with self._lock:
+            entry = self.domains.get(self.domain_of(url))
+        if entry and entry['wins'] >= self.min_wins:
+            return entry['encoding']
+        return None
+
+    def record(self, url: str, encoding: str):
+        """記錄一次勝出的編碼"""
+        domain = self.domain_of(url)
+        if not domain or not encoding:
+            return
+        encoding = normalize_encoding(encoding) or encoding
+        with self._lock:
+            entry = self.domains.get(domain)
+            was_trusted = bool(entry) and entry['wins'] >= self.min_wins
+            if entry and entry['encoding'] == encoding:
+                if was_trusted:
+                    return
+                entry['wins'] += 1
+            else:
+                if entry:
+                    logger.info(f"🔤 {domain} 的編碼由 {entry['encoding']} 變為 {encoding}")
+                entry = {'encoding': encoding, 'wins': 1}
+                self.domains[domain] = entry
+            entry['updated_at'] = time.time()
+            self._dirty_count += 1
+            # 記憶開始或停止生效時立即保存，其餘變更定期保存
+            trusted = entry['wins'] >= self.min_wins
+            should_save = trusted != was_trusted or self._dirty_count >= self.SAVE_EVERY
+        if should_save:
+            self.save()
+
+    def forget(self, url: str):
+        """記憶的編碼失效：信心歸零"""
+        domain = self.domain_of(url)
+        with self._lock:
+            entry = self.domains.get(domain)
+            if not entry:
+                return
+            entry['wins'] = 0
+            self.stats['fallbacks'] += 1
+            encoding = entry['encoding']
+        logger.warning(f"⚠️ {domain} 記憶的編碼 {encoding} 與內容不符，重新判斷編碼")
+        self.save()
+
+    def decode(self, content_bytes: bytes, url: str, candidates: Iterable[str],
+               content_type: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        解碼內容：沒有宣告的編碼且信心足夠時使用記憶的編碼，否則以 resolve_encoding 判斷並記錄
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (解碼後的字串, 編碼)；無法判斷時皆為 None
+        """
+        declared, _ = declared_encoding(content_bytes, content_type)
+        remembered = None if declared else self.preferred(url)
+        if remembered:
+            if self._sample_matches(content_bytes, remembered):
+                with self._lock:
+                    self.stats['memory_hits'] += 1
+                self.record(url, remembered)
+                return content_bytes.decode(remembered, errors='replace'), remembered
+            self.forget(url)
+
+        encoding, method = resolve_encoding(content_bytes, candidates, content_type)
+        if not encoding:
+            return None, None
+        with self._lock:
+            self.stats['resolved'] += 1
+        self.record(url, encoding)
+        return content_bytes.decode(encoding, errors='replace'), encoding
+
+    def _sample_matches(self, content_bytes: bytes, encoding: str) -> bool:
+        """以評分樣本驗證記憶的編碼；UTF-8 日文多半也能解成合法的 cp932，需另外排除"""
+        sample = sample_content(content_bytes)
+        if not sample:
+            return True
+        if encoding != 'utf-8':
+            try:
+                codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+                return False
+            except UnicodeDecodeError:
+                pass
+        score = score_encoding(sample, encoding)
+        return score is not None and score[0] <= self.spike_ratio
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            return {
+                **self.stats,
+                'domains': {domain: f"{entry['encoding']} ({entry['wins']})"
+                            for domain, entry in self.domains.items()}
+            }
+
+
+# 全局編碼記憶實例
+_global_encoding_memory = None
+_global_encoding_memory_lock = threading.Lock()
+
+def get_global_encoding_memory() -> EncodingMemory:
+    """獲取全局編碼記憶實例（保存於 data/encoding_memory.json）"""
+    global _global_encoding_memory
+    if _global_encoding_memory is None:
+        with _global_encoding_memory_lock:
+            if _global_encoding_memory is None:
+                _global_encoding_memory = EncodingMemory(
+                    Path(__file__).parent.parent.parent / 'data' / 'encoding_memory.json'
+                )
+    return _global_encoding_memory
@@ -4,13 +4,180 @@
 解決日文網站內容編碼問題
 """
 
+import re
+import codecs
 import logging
 import chardet
-from typing import Optional, Tuple, List
+from typing import Iterable, Optional, Tuple, List
 from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
 
+# 只在文件開頭尋找 <meta charset>（規範要求宣告出現在前 1024 位元組內，保留餘裕）
+META_SNIFF_BYTES = 4096
+# 候選編碼評分時使用的樣本大小
+SAMPLE_BYTES = 8192
+# 樣本替換字元比例低於此值才視為可用的編碼
+MAX_SAMPLE_REPLACEMENT_RATIO = 0.01
+
+_CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_META_CHARSET = re.compile(
+    rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE
+)
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+_JAPANESE_CHARS = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# WHATWG 編碼標準將 Shift_JIS 系列標籤都視為 Windows-31J：宣告 Shift_JIS 的網頁
+# 常含 ①、㈱ 等 CP932 擴充字元，以 Python 的 shift_jis 解碼會變成替換字元
+_SHIFT_JIS_LABELS = {
+    'csshiftjis', 'ms932', 'ms_kanji', 'shift-jis', 'shift_jis', 'sjis', 'windows-31j', 'x-sjis'
+}
+
+
+def normalize_encoding(name: Optional[str]) -> Optional[str]:
+    """編碼名稱正規化為 Python 編解碼器名稱（Shift_JIS 一律改為 cp932），無效時回傳 None"""
+    if not name:
+        return None
+    label = name.strip().strip('"\'').lower()
+    if label in _SHIFT_JIS_LABELS:
+        return 'cp932'
+    try:
+        encoding = codecs.lookup(label).name
+    except LookupError:
+        return None
+    return 'cp932' if encoding == 'shift_jis' else encoding
+
+
+def declared_encoding(content_bytes: bytes, content_type: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """
+    取得宣告的編碼：BOM > HTTP Content-Type > 文件開頭的 <meta charset>
+
+    Returns:
+        Tuple[Optional[str], str]: (編碼, 來源 'bom' / 'header' / 'meta' / 'none')
+    """
+    for bom, encoding in _BOMS:
+        if content_bytes.startswith(bom):
+            return encoding, 'bom'
+    if content_type:
+        match = _CONTENT_TYPE_CHARSET.search(content_type)
+        encoding = normalize_encoding(match.group(1)) if match else None
+        if encoding:
+            return encoding, 'header'
+    match = _META_CHARSET.search(content_bytes[:META_SNIFF_BYTES])
+    if match:
+        encoding = normalize_encoding(match.group(1).decode('ascii', 'ignore'))
+        if encoding:
+            return encoding, 'meta'
+    return None, 'none'
+
+
+def _find_non_ascii(content_bytes: bytes, start: int = 0) -> int:
+    """第一個非 ASCII 位元組的位置，沒有時回傳 -1"""
+    match = _NON_ASCII.search(content_bytes, start)
+    return match.start() if match else -1
+
+
+def _is_boundary(byte: int) -> bool:
+    """小於 0x40 的位元組不會是 Shift_JIS / EUC-JP / UTF-8 多位元組字元的一部分"""
+    return byte < 0x40
+
+
+def sample_content(content_bytes: bytes, sample_size: int = SAMPLE_BYTES) -> bytes:
+    """
+    取出評分用的樣本：從第一個非 ASCII 位元組開始的一段，加上文件中段的一段
+
+    兩段的接合處都對齊到字元邊界位元組，避免從多位元組字元中間切開。
+    """
+    first = _find_non_ascii(content_bytes)
+    if first < 0:
+        return b''
+    half = sample_size // 2
+    head_end = min(first + half, len(content_bytes))
+    if head_end == len(content_bytes):
+        return content_bytes[first:]
+    while head_end > first and not _is_boundary(content_bytes[head_end - 1]):
+        head_end -= 1
+    middle_start = max(head_end, len(content_bytes) // 2)
+    while middle_start < len(content_bytes) and not _is_boundary(content_bytes[middle_start]):
+        middle_start += 1
+    return content_bytes[first:head_end] + content_bytes[middle_start:middle_start + half]
+
+
+def score_encoding(sample: bytes, encoding: str) -> Optional[Tuple[float, int]]:
+    """
+    以樣本評估編碼，回傳 (替換字元比例, 日文字元數)；編碼無效時回傳 None
+
+    樣本結尾可能切斷多位元組字元，使用增量解碼器且不結束串流，避免誤判。
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        return None
+    text = decoder.decode(sample, final=False)
+    if not text:
+        return 1.0, 0
+    return text.count('\ufffd') / len(text), len(_JAPANESE_CHARS.findall(text))
+
+
+def resolve_encoding(content_bytes: bytes, candidates: Iterable[str],
+                     content_type: Optional[str] = None,
+                     sample_size: int = SAMPLE_BYTES) -> Tuple[Optional[str], str]:
+    """
+    快速決定整份文件的編碼，不解碼整份內容
+
+    1. 宣告的編碼（BOM / Content-Type / <meta charset>）在樣本上驗證通過即採用
+    2. 沒有非 ASCII 位元組時直接使用第一個候選（ISO-2022-JP 以跳脫序列辨識）
+    3. 樣本是合法 UTF-8 時採用 UTF-8（其他編碼的日文幾乎不可能剛好是合法 UTF-8）
+    4. 其餘候選在樣本上評分：替換字元比例最低者，同分時日文字元較多、順序較前者優先
+
+    Returns:
+        Tuple[Optional[str], str]: (編碼, 決定方式)；無法可靠判斷時編碼為 None
+    """
+    candidates = list(dict.fromkeys(
+        encoding for encoding in (normalize_encoding(c) for c in candidates) if encoding
+    ))
+    sample = sample_content(content_bytes, sample_size)
+
+    encoding, method = declared_encoding(content_bytes, content_type)
+    if encoding:
+        if method == 'bom' or not sample:
+            return encoding, method
+        score = score_encoding(sample, encoding)
+        if score is not None and score[0] < MAX_SAMPLE_REPLACEMENT_RATIO:
+            return encoding, method
+        logger.debug(f"宣告的編碼 {encoding} ({method}) 與內容不符，改以樣本評分")
+
+    if not sample:
+        if b'\x1b$' in content_bytes or b'\x1b(' in content_bytes:
+            return 'iso2022_jp', 'escape'
+        return (candidates[0] if candidates else 'utf-8'), 'ascii'
+
+    if 'utf-8' in candidates:
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8', 'sample'
+        except UnicodeDecodeError:
+            pass
+
+    best = None
+    for index, encoding in enumerate(candidates):
+        if encoding == 'utf-8':
+            continue
+        score = score_encoding(sample, encoding)
+        if score is None:
+            continue
+        key = (score[0], -score[1], index)
+        if best is None or key < best[0]:
+            best = (key, encoding)
+
+    if best is not None and best[0][0] < MAX_SAMPLE_REPLACEMENT_RATIO:
+        return best[1], 'sample'
+    return None, 'undetermined'
+
 
 class EncodingDetector:
     """多編碼自動檢測器"""
@@ -18,9 +185,9 @@ class EncodingDetector:
     # 針對日本AV網站優化的編碼優先級序列
     ENCODING_PRIORITIES = [
         'utf-8',
+        'cp932',          # Windows日文編碼 (Shift-JIS擴展，需排在 shift_jis 之前)
         'shift_jis',      # 日文常用編碼
         'euc-jp',         # 日文EUC編碼
-        'cp932',          # Windows日文編碼 (Shift-JIS擴展)
         'iso-2022-jp',    # JIS編碼
         'euc-jisx0213',   # 擴展EUC-JP
         'utf-16',         # Unicode 16位
@@ -29,18 +196,28 @@ class EncodingDetector:
         'latin1'          # 西歐編碼 (最後備用)
     ]
     
+    # 樣本評分的候選（utf-16 / latin1 幾乎能解碼任何位元組，不參與評分）
+    SAMPLE_CANDIDATES = [e for e in ENCODING_PRIORITIES if e not in ('utf-16', 'latin1')]
+    
     def __init__(self):
         self.detection_stats = {
             'total_attempts': 0,
             'successful_detections': 0,
             'encoding_usage': {},
-            'chardet_usage': 0
+            'chardet_usage': 0,
+            'fast_path': 0
         }
         
-    def detect_and_decode(self, content_bytes: bytes) -> Tuple[str, str]:
+    def detect_and_decode(self, content_bytes: bytes, content_type: Optional[str] = None,
+                          url: Optional[str] = None) -> Tuple[str, str]:
         """
         檢測並解碼內容
         
+        Args:
+            content_bytes: 原始位元組內容
+            content_type: HTTP Content-Type 標頭（可選，用於取得宣告的字元集）
+            url: 來源 URL（可選，提供時使用並更新網域編碼記憶）
+        
         Returns:
             Tuple[str, str]: (decoded_content, detected_encoding)
         """
@@ -48,12 +225,33 @@ class EncodingDetector:
         
         if not content_bytes:
             return "", "unknown"
+        
+        # 快速路徑: 網域編碼記憶、宣告的編碼或樣本評分，整份內容只解碼一次
+        memory = None
+        if url:
+            from .encoding_memory import get_global_encoding_memory
+            memory = get_global_encoding_memory()
+            decoded_content, encoding = memory.decode(content_bytes, url, self.SAMPLE_CANDIDATES, content_type)
+            if encoding:
+                self.detection_stats['fast_path'] += 1
+                self._update_stats(encoding, True)
+                logger.debug(f"✅ 使用編碼 {encoding} 解碼內容 (網域記憶/快速判斷)")
+                return decoded_content, encoding
+        else:
+            encoding, method = resolve_encoding(content_bytes, self.SAMPLE_CANDIDATES, content_type)
+            if encoding:
+                self.detection_stats['fast_path'] += 1
+                self._update_stats(encoding, True)
+                logger.debug(f"✅ 使用編碼 {encoding} 解碼內容 ({method})")
+                return content_bytes.decode(encoding, errors='replace'), encoding
             
         # 方法1: 嘗試預定義的編碼優先級序列
         for encoding in self.ENCODING_PRIORITIES:
             try:
                 decoded_content = content_bytes.decode(encoding)
                 self._update_stats(encoding, True)
+                if memory is not None:
+                    memory.record(url, encoding)
                 logger.debug(f"✅ 成功使用編碼 {encoding} 解碼內容")
                 return decoded_content, encoding
                 
@@ -75,6 +273,8 @@ class EncodingDetector:
                         decoded_content = content_bytes.decode(detected_encoding)
                         self._update_stats(detected_encoding, True)
                         self.detection_stats['chardet_usage'] += 1
+                        if memory is not None:
+                            memory.record(url, detected_encoding)
                         logger.info(f"✅ chardet 成功解碼，編碼: {detected_encoding}")
                         return decoded_content, detected_encoding
                     except (UnicodeDecodeError, UnicodeError):
@@ -119,31 +319,24 @@ class EncodingDetector:
             )[0] if self.detection_stats['encoding_usage'] else 'none'
         }
     
-    def create_soup_with_encoding(self, content_bytes: bytes, parser: str = 'html.parser') -> Tuple[BeautifulSoup, str]:
+    def create_soup_with_encoding(self, content_bytes: bytes, parser: str = 'html.parser',
+                                  url: Optional[str] = None) -> Tuple[BeautifulSoup, str]:
         """
         創建 BeautifulSoup 物件並自動處理編碼
         
         Args:
             content_bytes: 原始網頁位元組
             parser: HTML解析器類型
+            url: 來源 URL（可選，用於網域編碼記憶）
             
         Returns:
             Tuple[BeautifulSoup, str]: (soup物件, 使用的編碼)
         """
-        decoded_content, encoding = self.detect_and_decode(content_bytes)
+        decoded_content, encoding = self.detect_and_decode(content_bytes, url=url)
         
         try:
-            # 使用檢測到的編碼明確指定給BeautifulSoup
-            if encoding != 'failed':
-                soup = BeautifulSoup(
-                    content_bytes, 
-                    parser,
-                    from_encoding=encoding if encoding != 'utf-8-ignore' else 'utf-8'
-                )
-            else:
-                # 備用方案：直接使用字符串
-                soup = BeautifulSoup(decoded_content, parser)
-                
+            # 直接使用已解碼的字串，避免 BeautifulSoup 再次檢測與解碼
+            soup = BeautifulSoup(decoded_content, parser)
             logger.debug(f"🍲 已創建 BeautifulSoup 物件，編碼: {encoding}")
             return soup, encoding
             
@@ -169,19 +362,21 @@ def safe_decode_content(content_bytes: bytes) -> Tuple[str, str]:
     return detector.detect_and_decode(content_bytes)
 
 
-def create_safe_soup(content_bytes: bytes, parser: str = 'html.parser') -> Tuple[BeautifulSoup, str]:
+def create_safe_soup(content_bytes: bytes, parser: str = 'html.parser',
+                     url: Optional[str] = None) -> Tuple[BeautifulSoup, str]:
     """
     創建安全的 BeautifulSoup 物件的便利函數
     
     Args:
         content_bytes: 原始位元組內容
         parser: HTML解析器類型
+        url: 來源 URL（可選，用於網域編碼記憶）
         
     Returns:
         Tuple[BeautifulSoup, str]: (BeautifulSoup物件, 使用的編碼)
     """
     detector = EncodingDetector()
-    return detector.create_soup_with_encoding(content_bytes, parser)
+    return detector.create_soup_with_encoding(content_bytes, parser, url)
 
 
 def validate_japanese_content(text: str) -> dict:
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+背景事件迴圈模組
+提供常駐的 asyncio 事件迴圈，讓同步程式碼（GUI、執行緒搜尋器）呼叫非同步爬蟲
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoopRunner:
+    """
+    背景事件迴圈執行器
+
+    第一次提交協程時啟動一個常駐的 daemon 執行緒執行事件迴圈，
+    之後所有呼叫共用同一個迴圈，連線會話與限流狀態都得以保留。
+    """
+
+    def __init__(self, name: str = "async-loop-runner"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'started': 0
+        }
+
+    def _ensure_running(self) -> asyncio.AbstractEventLoop:
+        """確保背景事件迴圈正在執行"""
+        with self._lock:
+            if self._loop is not None and self._thread.is_alive():
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            thread.start()
+            started.wait()
+
+            self._loop = loop
+            self._thread = thread
+            self.stats['started'] += 1
+            logger.debug(f"🔄 背景事件迴圈已啟動: {self.name}")
+            return loop
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """背景事件迴圈（必要時啟動）"""
+        return self._ensure_running()
+
+    def in_runner_thread(self) -> bool:
+        """目前是否在背景事件迴圈的執行緒中"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """提交協程到背景事件迴圈，回傳可在任何執行緒等待的 Future"""
+        loop = self._ensure_running()
+        self.stats['submitted'] += 1
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """提交協程並等待結果"""
+        if self.in_runner_thread():
+            coro.close()
+            raise RuntimeError("不能在背景事件迴圈執行緒中同步等待協程，請改用 await")
+        return self.submit(coro).result(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """取消剩餘任務並停止背景事件迴圈"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+
+        async def cancel_remaining():
+            current = asyncio.current_task()
+            remaining = [task for task in asyncio.all_tasks() if task is not current]
+            for task in remaining:
+                task.cancel()
+            await asyncio.gather(*remaining, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_remaining(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"停止背景事件迴圈時發生錯誤: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+        logger.debug(f"🔄 背景事件迴圈已停止: {self.name}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        return {
+            **self.stats,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+# 全局背景事件迴圈實例
+_global_loop_runner = None
+
+def get_global_loop_runner() -> BackgroundLoopRunner:
+    """獲取全局背景事件迴圈實例"""
+    global _global_loop_runner
+    if _global_loop_runner is None:
+        _global_loop_runner = BackgroundLoopRunner()
+    return _global_loop_runner
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+記憶體快取層模組
+以 OrderedDict 實作 O(1) LRU，同時限制條目數與總大小，並可選用 TinyLFU 准入策略
+"""
+
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FrequencySketch:
+    """
+    Count-Min Sketch 頻率估計器（TinyLFU 使用）
+
+    每個計數器上限 15，累計取樣次數達到 sample_size 時全部減半，
+    讓過去的熱門條目逐漸老化。
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+    _SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, capacity: int):
+        width = 1
+        while width < max(capacity, 16) * 4:
+            width <<= 1
+        self._mask = width - 1
+        self._tables = [array('B', bytes(width)) for _ in range(self.DEPTH)]
+        self.sample_size = width * 10
+        self._additions = 0
+
+    def _indexes(self, key: Hashable):
+        h = hash(key)
+        for seed in self._SEEDS:
+            yield ((h ^ seed) * 0x01000193 >> 7) & self._mask
+
+    def increment(self, key: Hashable):
+        """記錄一次訪問"""
+        for table, index in zip(self._tables, self._indexes(key)):
+            if table[index] < self.MAX_COUNT:
+                table[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        """估計訪問頻率"""
+        return min(table[index] for table, index in zip(self._tables, self._indexes(key)))
+
+    def _age(self):
+        """所有計數器減半"""
+        for table in self._tables:
+            for i in range(len(table)):
+                table[i] >>= 1
+        self._additions //= 2
+
+
+class MemoryLRUCache:
+    """
+    O(1) LRU 記憶體快取
+
+    - 以 OrderedDict 維護訪問順序，命中時移到尾端，淘汰時從頭端移除
+    - 同時以條目數與總位元組數限制容量（max_bytes 為 0 表示不限）
+    - 啟用准入策略時，快取已滿的新條目必須比將被淘汰的條目更常被訪問才會寫入，
+      避免只看一次的頁面把常用的女優、片商資料擠出快取
+
+    本類別不自行加鎖，由呼叫端（CacheManager.memory_lock）負責同步。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, admission: bool = False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self.total_bytes = 0
+        self.sketch = FrequencySketch(max_entries) if admission else None
+        self.stats = {
+            'evictions': 0,
+            'admission_rejections': 0
+        }
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """取得值並標記為最近使用"""
+        if self.sketch is not None:
+            self.sketch.increment(key)
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> bool:
+        """
+        寫入值，必要時淘汰最久未使用的條目
+
+        Returns:
+            是否寫入（准入策略可能拒絕新條目）
+        """
+        if key in self._data:
+            self._remove(key)
+        elif self.sketch is not None and self._data and self._would_overflow(size):
+            victim = next(iter(self._data))
+            if self.sketch.estimate(key) <= self.sketch.estimate(victim):
+                self.stats['admission_rejections'] += 1
+                return False
+
+        if self.max_bytes and size > self.max_bytes:
+            return False
+
+        self._data[key] = value
+        self._sizes[key] = size
+        self.total_bytes += size
+        self._evict()
+        return True
+
+    def _would_overflow(self, size: int) -> bool:
+        return (len(self._data) >= self.max_entries or
+                bool(self.max_bytes) and self.total_bytes + size > self.max_bytes)
+
+    def _evict(self):
+        """淘汰頭端條目直到符合容量限制"""
+        while self._data and (len(self._data) > self.max_entries or
+                              self.max_bytes and self.total_bytes > self.max_bytes):
+            key, _ = self._data.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(key, 0)
+            self.stats['evictions'] += 1
+
+    def _remove(self, key: Hashable):
+        del self._data[key]
+        self.total_bytes -= self._sizes.pop(key, 0)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除並回傳值"""
+        if key not in self._data:
+            return default
+        value = self._data[key]
+        self._remove(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def __delitem__(self, key: Hashable):
+        self._remove(key)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """目前所有條目（快照，可在迭代時刪除）"""
+        return list(self._data.items())
+
+    def values(self) -> List[Any]:
+        return list(self._data.values())
+
+    def clear(self):
+        self._data.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        return {
+            **self.stats,
+            'entries': len(self._data),
+            'total_bytes': self.total_bytes,
+            'admission': self.sketch is not None
+        }
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+原始頁面快取模組
+以 URL 為鍵保存壓縮後的 HTML 原始內容、驗證標頭與抓取時間，
+過期後以 If-None-Match / If-Modified-Since 送出條件式請求，並支援完全不連網的離線模式
+"""
+
+import re
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .cache_codecs import CacheCodec
+from .encoding_utils import resolve_encoding
+
+logger = logging.getLogger(__name__)
+
+# 請求函式的回傳值：(HTTP 狀態碼, 回應標頭, 原始內容)；304 時內容為空
+PageResponse = Tuple[int, Mapping[str, str], bytes]
+
+_CHARSET_PATTERN = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+@dataclass
+class CachedPage:
+    """快取中的原始頁面"""
+    url: str
+    body: bytes
+    status: int = 200
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_type: Optional[str] = None
+    fetched_at: float = 0.0       # 內容實際下載的時間
+    validated_at: float = 0.0     # 最後一次確認內容仍有效的時間（下載或 304）
+    code: Optional[str] = None
+    source: Optional[str] = None
+
+    # 未宣告字元集時的候選編碼
+    CANDIDATE_ENCODINGS = ('utf-8', 'cp932', 'euc-jp')
+
+    @property
+    def charset(self) -> Optional[str]:
+        """Content-Type 標頭宣告的字元集"""
+        if not self.content_type:
+            return None
+        match = _CHARSET_PATTERN.search(self.content_type)
+        return match.group(1) if match else None
+
+    def text(self) -> str:
+        """以宣告的字元集（標頭或 <meta charset>）解碼內容，未宣告時以樣本判斷，無法判斷時使用 UTF-8"""
+        encoding, _ = resolve_encoding(self.body, self.CANDIDATE_ENCODINGS, self.content_type)
+        return self.body.decode(encoding or 'utf-8', errors='replace')
+
+
+class PageCache:
+    """
+    原始頁面快取
+
+    - 內容以 CacheCodec 壓縮後存入 SQLite（WAL），解析器修改後可直接重新解析而不必重新爬取
+    - 頁面在 ttl_seconds 內視為新鮮，直接回傳；過期後帶上 ETag / Last-Modified
+      送出條件式請求，伺服器回應 304 時只更新驗證時間
+    - 離線模式下只讀取快取，任何頁面都不會發出網路請求
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 7 * 86400, offline: bool = False,
+                 compression_level: int = 6):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.offline = offline
+        self.codec = CacheCodec(compression=True, level=compression_level, min_compress_bytes=256)
+
+        # 單一長期連線，以鎖序列化同一行程內的存取
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'conditional_requests': 0,
+            'not_modified': 0,
+            'stores': 0,
+            'offline_hits': 0,
+            'offline_misses': 0,
+            'raw_bytes': 0,
+            'stored_bytes': 0
+        }
+
+        logger.info(f"🗄️ 頁面快取已啟用 - 檔案: {self.db_path}, 有效期: {ttl_seconds}秒"
+                    f"{' (離線模式)' if offline else ''}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                code TEXT,
+                source TEXT,
+                status INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                fetched_at REAL NOT NULL,
+                validated_at REAL NOT NULL,
+                codec TEXT NOT NULL,
+                body_size INTEGER NOT NULL,
+                body BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_code ON pages(code)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_source ON pages(source)")
+        conn.commit()
+        return conn
+
+    # ----- 讀寫 -----
+
+    _PAGE_COLUMNS = """url, status, etag, last_modified, content_type, fetched_at, validated_at,
+                       code, source, codec, body"""
+
+    def _row_to_page(self, row: Tuple) -> Optional[CachedPage]:
+        """資料列轉為 CachedPage，內容無法解碼時回傳 None"""
+        url, status, etag, last_modified, content_type, fetched_at, validated_at, code, source, codec, data = row
+        try:
+            body = self.codec.decode(data, codec)
+        except Exception as e:
+            logger.warning(f"頁面快取內容損毀: {url} ({e})")
+            return None
+        return CachedPage(url, body, status, etag, last_modified, content_type,
+                          fetched_at, validated_at, code, source)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """讀取快取頁面（不論是否過期）"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._PAGE_COLUMNS} FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        page = self._row_to_page(row)
+        if page is None:
+            self.delete(url)
+        return page
+
+    def iter_pages(self, batch_size: int = 100, source: Optional[str] = None) -> Iterator[List[CachedPage]]:
+        """
+        分批讀取所有頁面（依 rowid 分頁，不會一次把整個快取載入記憶體）
+
+        無法解碼的頁面會被略過；迭代期間寫入的新頁面不保證會被讀到。
+        """
+        last_rowid = 0
+        while True:
+            query = f"SELECT rowid, {self._PAGE_COLUMNS} FROM pages WHERE rowid > ?"
+            params: Tuple[Any, ...] = (last_rowid,)
+            if source is not None:
+                query += " AND source = ?"
+                params += (source,)
+            query += " ORDER BY rowid LIMIT ?"
+            with self._lock:
+                rows = self._conn.execute(query, params + (batch_size,)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            pages = [page for page in (self._row_to_page(row[1:]) for row in rows) if page is not None]
+            if pages:
+                yield pages
+
+    def count(self, source: Optional[str] = None) -> int:
+        """快取中的頁面數"""
+        with self._lock:
+            if source is None:
+                return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM pages WHERE source = ?", (source,)).fetchone()[0]
+
+    def store(self, url: str, body: bytes, headers: Optional[Mapping[str, str]] = None,
+              status: int = 200, code: Optional[str] = None, source: Optional[str] = None) -> CachedPage:
+        """保存下載的頁面與驗證標頭"""
+        headers = headers or {}
+        now = time.time()
+        page = CachedPage(
+            url, body, status,
+            etag=headers.get('ETag') or headers.get('etag'),
+            last_modified=headers.get('Last-Modified') or headers.get('last-modified'),
+            content_type=headers.get('Content-Type') or headers.get('content-type'),
+            fetched_at=now, validated_at=now, code=code, source=source
+        )
+        data, codec = self.codec.encode(bytes(body))
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute("""
+                        INSERT OR REPLACE INTO pages
+                        (url, code, source, status, etag, last_modified, content_type,
+                         fetched_at, validated_at, codec, body_size, body)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (url, code, source, status, page.etag, page.last_modified, page.content_type,
+                          now, now, codec, len(body), sqlite3.Binary(data)))
+            except sqlite3.Error as e:
+                logger.warning(f"寫入頁面快取失敗: {url} ({e})")
+                return page
+            self.stats['stores'] += 1
+            self.stats['raw_bytes'] += len(body)
+            self.stats['stored_bytes'] += len(data)
+        return page
+
+    def _mark_validated(self, page: CachedPage, headers: Mapping[str, str]) -> CachedPage:
+        """伺服器回應 304：內容不變，更新驗證時間與新的驗證標頭"""
+        page.validated_at = time.time()
+        page.etag = headers.get('ETag') or headers.get('etag') or page.etag
+        page.last_modified = headers.get('Last-Modified') or headers.get('last-modified') or page.last_modified
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE pages SET validated_at = ?, etag = ?, last_modified = ? WHERE url = ?",
+                        (page.validated_at, page.etag, page.last_modified, page.url)
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"更新頁面快取驗證時間失敗: {page.url} ({e})")
+            self.stats['not_modified'] += 1
+        return page
+
+    def delete(self, url: str):
+        """移除指定頁面"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def clear(self):
+        """清除所有頁面"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM pages")
+        logger.info("🧹 已清除頁面快取")
+
+    def codes(self, source: Optional[str] = None) -> List[str]:
+        """快取中有頁面的番號"""
+        query = "SELECT DISTINCT code FROM pages WHERE code IS NOT NULL"
+        params: Tuple[Any, ...] = ()
+        if source is not None:
+            query += " AND source = ?"
+            params = (source,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params).fetchall()]
+
+    def urls(self, source: Optional[str] = None) -> List[str]:
+        """快取中的所有頁面 URL"""
+        with self._lock:
+            if source is None:
+                rows = self._conn.execute("SELECT url FROM pages").fetchall()
+            else:
+                rows = self._conn.execute("SELECT url FROM pages WHERE source = ?", (source,)).fetchall()
+        return [row[0] for row in rows]
+
+    # ----- 條件式請求 -----
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        """頁面是否仍在有效期內"""
+        return time.time() - page.validated_at < self.ttl_seconds
+
+    @staticmethod
+    def conditional_headers(page: Optional[CachedPage]) -> Dict[str, str]:
+        """依快取頁面產生條件式請求標頭"""
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers['If-None-Match'] = page.etag
+            if page.last_modified:
+                headers['If-Modified-Since'] = page.last_modified
+        return headers
+
+    def _prepare(self, url: str) -> Tuple[Optional[CachedPage], bool]:
+        """回傳 (快取頁面, 是否可直接使用)"""
+        page = self.get(url)
+        with self._lock:
+            if self.offline:
+                self.stats['offline_hits' if page is not None else 'offline_misses'] += 1
+                return page, True
+            if page is not None and self.is_fresh(page):
+                self.stats['hits'] += 1
+                return page, True
+            self.stats['misses'] += 1
+            if page is not None and (page.etag or page.last_modified):
+                self.stats['conditional_requests'] += 1
+        return page, False
+
+    def _complete(self, url: str, cached: Optional[CachedPage], response: Optional[PageResponse],
+                  code: Optional[str], source: Optional[str]) -> Optional[CachedPage]:
+        """處理請求結果：304 沿用快取內容，其餘成功回應寫入快取"""
+        if response is None:
+            return None
+        status, headers, body = response
+        if status == 304:
+            if cached is None:
+                logger.warning(f"收到 304 但快取中沒有頁面: {url}")
+                return None
+            return self._mark_validated(cached, headers)
+        return self.store(url, body, headers, status, code=code or (cached.code if cached else None),
+                          source=source or (cached.source if cached else None))
+
+    def fetch(self, url: str, request_func: Callable[[Dict[str, str]], Optional[PageResponse]],
+              code: Optional[str] = None, source: Optional[str] = None) -> Optional[CachedPage]:
+        """
+        取得頁面：新鮮時直接回傳快取，否則以 request_func(條件式標頭) 送出請求
+
+        request_func 回傳 (狀態碼, 標頭, 內容)，失敗時回傳 None 或拋出例外。
+        離線模式下不會呼叫 request_func。
+        """
+        cached, usable = self._prepare(url)
+        if usable:
+            return cached
+        return self._complete(url, cached, request_func(self.conditional_headers(cached)), code, source)
+
+    async def fetch_async(self, url: str,
+                          request_func: Callable[[Dict[str, str]], Awaitable[Optional[PageResponse]]],
+                          code: Optional[str] = None, source: Optional[str] = None) -> Optional[CachedPage]:
+        """fetch 的非同步版本，資料庫存取與解壓縮在執行緒池中進行"""
+        loop = asyncio.get_running_loop()
+        cached, usable = await loop.run_in_executor(None, self._prepare, url)
+        if usable:
+            return cached
+        response = await request_func(self.conditional_headers(cached))
+        return await loop.run_in_executor(None, self._complete, url, cached, response, code, source)
+
+    # ----- 管理 -----
+
+    def close(self):
+        """關閉資料庫連線"""
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            pages, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(body_size), 0) FROM pages"
+            ).fetchone()
+            stats = dict(self.stats)
+        ratio = stats['stored_bytes'] / stats['raw_bytes'] if stats['raw_bytes'] else 0.0
+        lookups = stats['hits'] + stats['misses']
+        return {
+            **stats,
+            'pages': pages,
+            'total_body_bytes': total_bytes,
+            'hit_rate': f"{stats['hits'] / lookups * 100:.1f}%" if lookups else "0.0%",
+            'compression_ratio': f"{ratio:.2f}",
+            'offline': self.offline,
+            'codec_stats': self.codec.get_stats()
+        }
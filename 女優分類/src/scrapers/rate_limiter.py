@@ -8,12 +8,14 @@ import asyncio
 import time
 import logging
 import threading
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass, field
 from collections import defaultdict, deque
 from urllib.parse import urlparse
 import random
 
+from .shared_rate_state import SharedRateState
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,26 +32,170 @@ class DomainConfig:
     adaptive_delay: bool = True             # 自適應延遲
 
 
-@dataclass 
-class RequestRecord:
-    """請求記錄"""
-    timestamp: float
-    success: bool
-    response_time: float
-    status_code: Optional[int] = None
+class RollingWindow:
+    """
+    固定大小的環形緩衝區，維護累計和
+
+    新增與查詢平均值皆為 O(1) 且不配置新物件；
+    每寫滿一輪重新加總一次，避免浮點累計誤差。
+    """
+    
+    __slots__ = ('capacity', '_values', '_index', 'count', 'total', '_writes')
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._values = [0.0] * capacity
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+        self._writes = 0
+    
+    def add(self, value: float):
+        """加入新值，緩衝區已滿時覆蓋最舊的值"""
+        self.total += value - self._values[self._index]
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        
+        self._writes += 1
+        if self._writes >= self.capacity:
+            self._writes = 0
+            self.total = sum(self._values)
+    
+    def mean(self) -> float:
+        """目前視窗內的平均值"""
+        return self.total / self.count if self.count else 0.0
+
+
+class AsyncSlotScheduler:
+    """
+    單域名的非同步時段排程器
+
+    每個等待者在呼叫當下依序預約未來的請求時段（FIFO），只在自己的時段醒來，
+    避免所有協程同時醒來重新競爭；預約同時計入分鐘/小時視窗，
+    因此吞吐量可精確達到設定的每分鐘請求數。
+    """
+    
+    def __init__(self, limiter: 'DomainLimiter'):
+        self.limiter = limiter
+        self._slots: deque = deque()   # 已預約的時段（含未來），依時間排序
+        self._last_slot = 0.0
+        self.pending = 0
+        self.stats = {
+            'scheduled': 0,
+            'rescheduled': 0,
+            'cancelled': 0,
+            'rolled_back': 0,
+            'max_pending': 0
+        }
+    
+    def reserve(self) -> Tuple[float, float]:
+        """
+        預約下一個可用時段（呼叫端需持有 limiter.lock）
+        
+        Returns:
+            Tuple[float, float]: (時段時間, 預約前的最後時段)
+        """
+        limiter = self.limiter
+        config = limiter.config
+        current_time = time.time()
+        
+        while self._slots and current_time - self._slots[0] > 3600:
+            self._slots.popleft()
+        
+        slot = max(
+            current_time,
+            self._last_slot + limiter._calculate_adaptive_delay(),
+            limiter.retry_after_until
+        )
+        if len(self._slots) >= config.requests_per_minute:
+            slot = max(slot, self._slots[-config.requests_per_minute] + 60)
+        if len(self._slots) >= config.requests_per_hour:
+            slot = max(slot, self._slots[-config.requests_per_hour] + 3600)
+        
+        previous_last = self._last_slot
+        self._slots.append(slot)
+        self._last_slot = slot
+        self.stats['scheduled'] += 1
+        return slot, previous_last
+    
+    def release(self, slot: float, previous_last: float):
+        """釋放未使用的時段；若為最後一個預約則回捲，讓後續請求不必多等（呼叫端需持有 limiter.lock）"""
+        if self._slots and self._slots[-1] == slot:
+            self._slots.pop()
+            self._last_slot = self._slots[-1] if self._slots else previous_last
+            self.stats['rolled_back'] += 1
+        else:
+            try:
+                self._slots.remove(slot)
+            except ValueError:
+                pass
+    
+    async def wait(self) -> float:
+        """等待到自己的時段，回傳實際等待時間"""
+        limiter = self.limiter
+        start_time = time.time()
+        
+        with limiter.lock:
+            self.pending += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'], self.pending)
+        try:
+            while True:
+                with limiter.lock:
+                    slot, previous_last = self.reserve()
+                
+                delay = slot - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.sleep(delay)
+                    except asyncio.CancelledError:
+                        with limiter.lock:
+                            self.release(slot, previous_last)
+                            self.stats['cancelled'] += 1
+                        raise
+                
+                # 等待期間收到 Retry-After 時依醒來順序重新預約，維持先後順序
+                with limiter.lock:
+                    if time.time() < limiter.retry_after_until:
+                        self.release(slot, previous_last)
+                        self.stats['rescheduled'] += 1
+                        continue
+                return time.time() - start_time
+        finally:
+            with limiter.lock:
+                self.pending -= 1
+    
+    def get_stats(self) -> Dict:
+        """獲取統計資訊"""
+        return {
+            **self.stats,
+            'pending': self.pending,
+            'next_slot_in': max(0.0, self._last_slot - time.time())
+        }
 
 
 class DomainLimiter:
     """單域名限流器"""
     
-    def __init__(self, domain: str, config: DomainConfig):
+    # 自適應延遲參考的最近請求數
+    RECENT_WINDOW = 10
+    # 統計平均響應時間保留的請求數
+    HISTORY_WINDOW = 1000
+    
+    def __init__(self, domain: str, config: DomainConfig, shared_state: Optional[SharedRateState] = None):
         self.domain = domain
         self.config = config
+        self.shared_state = shared_state
         
         # 請求記錄
         self.minute_requests: deque = deque()  # 最近一分鐘的請求
         self.hour_requests: deque = deque()    # 最近一小時的請求
-        self.request_history: List[RequestRecord] = []
+        
+        # 請求結果的滑動視窗統計
+        self.recent_failures = RollingWindow(self.RECENT_WINDOW)
+        self.recent_response_times = RollingWindow(self.RECENT_WINDOW)
+        self.history_response_times = RollingWindow(self.HISTORY_WINDOW)
         
         # 狀態追蹤
         self.last_request_time = 0.0
@@ -60,6 +206,9 @@ class DomainLimiter:
         # 鎖
         self.lock = threading.RLock()
         
+        # 非同步時段排程器
+        self.scheduler = AsyncSlotScheduler(self)
+        
         # 統計
         self.stats = {
             'total_requests': 0,
@@ -79,20 +228,15 @@ class DomainLimiter:
         # 清理一小時外的記錄
         while self.hour_requests and current_time - self.hour_requests[0] > 3600:
             self.hour_requests.popleft()
-        
-        # 保留最近的請求歷史（最多1000條）
-        if len(self.request_history) > 1000:
-            self.request_history = self.request_history[-1000:]
     
     def _calculate_adaptive_delay(self) -> float:
         """計算自適應延遲"""
-        if not self.config.adaptive_delay or len(self.request_history) < 5:
+        if not self.config.adaptive_delay or self.recent_failures.count < 5:
             return self.current_delay
         
         # 分析最近的請求模式
-        recent_requests = self.request_history[-10:]
-        failure_rate = sum(1 for r in recent_requests if not r.success) / len(recent_requests)
-        avg_response_time = sum(r.response_time for r in recent_requests) / len(recent_requests)
+        failure_rate = self.recent_failures.mean()
+        avg_response_time = self.recent_response_times.mean()
         
         # 根據失敗率和響應時間調整延遲
         if failure_rate > 0.3:  # 30%以上失敗率
@@ -142,6 +286,52 @@ class DomainLimiter:
             
             return True, 0.0
     
+    async def wait_for_slot(self) -> float:
+        """
+        非同步等待請求時段
+        
+        未使用共用狀態時由本機排程器依 FIFO 預約時段；
+        使用共用狀態時需與其他行程協調，改為反覆預約直到成功。
+        """
+        if self.shared_state is None:
+            wait_time = await self.scheduler.wait()
+        else:
+            wait_time = 0.0
+            while True:
+                can_request, delay = self.acquire()
+                if can_request:
+                    break
+                await asyncio.sleep(delay)
+                wait_time += delay
+        
+        if wait_time > 0:
+            with self.lock:
+                self.stats['total_wait_time'] += wait_time
+        return wait_time
+    
+    def acquire(self) -> Tuple[bool, float]:
+        """
+        取得請求時段
+
+        使用共用狀態時以跨行程的原子預約取代本機的分鐘/小時計數；
+        否則與 can_make_request 相同。
+        """
+        if self.shared_state is None:
+            return self.can_make_request()
+        
+        with self.lock:
+            current_time = time.time()
+            if current_time < self.retry_after_until:
+                return False, self.retry_after_until - current_time
+            adaptive_delay = self._calculate_adaptive_delay()
+        
+        return self.shared_state.try_reserve(
+            self.domain,
+            self.config.requests_per_minute,
+            self.config.requests_per_hour,
+            adaptive_delay
+        )
+    
     def record_request(self, success: bool, response_time: float, status_code: Optional[int] = None, retry_after: Optional[int] = None):
         """記錄請求結果"""
         with self.lock:
@@ -152,14 +342,10 @@ class DomainLimiter:
             self.hour_requests.append(current_time)
             self.last_request_time = current_time
             
-            # 記錄詳細信息
-            record = RequestRecord(
-                timestamp=current_time,
-                success=success,
-                response_time=response_time,
-                status_code=status_code
-            )
-            self.request_history.append(record)
+            # 更新滑動視窗統計
+            self.recent_failures.add(0.0 if success else 1.0)
+            self.recent_response_times.add(response_time)
+            self.history_response_times.add(response_time)
             
             # 更新統計
             self.stats['total_requests'] += 1
@@ -173,6 +359,8 @@ class DomainLimiter:
             # 處理 Retry-After
             if retry_after and self.config.respect_retry_after:
                 self.retry_after_until = current_time + retry_after
+                if self.shared_state is not None:
+                    self.shared_state.set_retry_after(self.domain, self.retry_after_until)
                 logger.info(f"🚫 {self.domain} 設置 Retry-After: {retry_after}秒")
             
             # 根據連續失敗調整策略
@@ -193,10 +381,7 @@ class DomainLimiter:
             success_rate = (self.stats['successful_requests'] / total_requests * 100) if total_requests > 0 else 0
             
             # 計算平均響應時間
-            if self.request_history:
-                avg_response_time = sum(r.response_time for r in self.request_history) / len(self.request_history)
-            else:
-                avg_response_time = 0.0
+            avg_response_time = self.history_response_times.mean()
             
             return {
                 **self.stats,
@@ -207,18 +392,22 @@ class DomainLimiter:
                 'minute_requests_count': len(self.minute_requests),
                 'hour_requests_count': len(self.hour_requests),
                 'is_retry_after_active': current_time < self.retry_after_until,
-                'retry_after_remaining': max(0, self.retry_after_until - current_time)
+                'retry_after_remaining': max(0, self.retry_after_until - current_time),
+                'scheduler': self.scheduler.get_stats()
             }
 
 
 class RateLimiter:
     """多域名頻率限制器"""
     
-    def __init__(self):
+    def __init__(self, shared_state: Optional[SharedRateState] = None):
         self.domain_limiters: Dict[str, DomainLimiter] = {}
         self.default_config = DomainConfig()
         self.lock = threading.RLock()
         
+        # 跨行程共用的限流狀態（選用）
+        self.shared_state = shared_state
+        
         # 預設域名配置
         self.domain_configs = {
             'av-wiki.net': DomainConfig(
@@ -251,7 +440,7 @@ class RateLimiter:
         with self.lock:
             if domain not in self.domain_limiters:
                 config = self.domain_configs.get(domain, self.default_config)
-                self.domain_limiters[domain] = DomainLimiter(domain, config)
+                self.domain_limiters[domain] = DomainLimiter(domain, config, self.shared_state)
                 logger.debug(f"📋 為域名 {domain} 創建限流器")
             return self.domain_limiters[domain]
     
@@ -270,27 +459,35 @@ class RateLimiter:
     
     def wait_if_needed(self, url: str) -> float:
         """如需要則等待（同步版本）"""
-        can_request, wait_time = self.can_make_request(url)
+        domain = self._extract_domain(url)
+        limiter = self._get_domain_limiter(domain)
+        can_request, wait_time = limiter.acquire()
         
         if not can_request and wait_time > 0:
-            domain = self._extract_domain(url)
             logger.info(f"⏱️ 域名 {domain} 需要等待 {wait_time:.2f} 秒")
             time.sleep(wait_time)
-            return wait_time
+            total_wait = wait_time
+            
+            # 共用狀態下其他行程可能先取得時段，需重新預約直到成功
+            while limiter.shared_state is not None:
+                can_request, wait_time = limiter.acquire()
+                if can_request:
+                    break
+                time.sleep(wait_time)
+                total_wait += wait_time
+            return total_wait
         
         return 0.0
     
     async def wait_if_needed_async(self, url: str) -> float:
-        """如需要則等待（非同步版本）"""
-        can_request, wait_time = self.can_make_request(url)
-        
-        if not can_request and wait_time > 0:
-            domain = self._extract_domain(url)
-            logger.info(f"⏱️ 域名 {domain} 需要等待 {wait_time:.2f} 秒")
-            await asyncio.sleep(wait_time)
-            return wait_time
+        """如需要則等待（非同步版本，依預約時段精確喚醒）"""
+        domain = self._extract_domain(url)
+        limiter = self._get_domain_limiter(domain)
+        wait_time = await limiter.wait_for_slot()
         
-        return 0.0
+        if wait_time > 0:
+            logger.debug(f"⏱️ 域名 {domain} 等待 {wait_time:.2f} 秒後取得請求時段")
+        return wait_time
     
     def record_request(self, url: str, success: bool, response_time: float, status_code: Optional[int] = None, retry_after: Optional[int] = None):
         """記錄請求結果"""
@@ -347,7 +544,8 @@ class RateLimiter:
                 },
                 'domain_stats': domain_stats,
                 'active_domains': list(self.domain_limiters.keys()),
-                'configured_domains': list(self.domain_configs.keys())
+                'configured_domains': list(self.domain_configs.keys()),
+                'shared_state': self.shared_state.get_stats() if self.shared_state else None
             }
     
     def reset_domain(self, domain: str):
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+重試預算模組
+各層重試機制共用的每域名重試額度，避免網站降級時重試層層放大請求量
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Deque
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetryBudgetConfig:
+    """重試預算配置"""
+    ratio: float = 0.2                  # 重試次數上限為近期首次請求數的比例
+    min_retries: int = 3                # 流量很低時仍保留的最少重試次數
+    window_seconds: float = 60.0        # 統計視窗(秒)
+
+
+class RetryBudget:
+    """
+    每域名重試預算
+
+    在統計視窗內，重試次數不得超過 max(min_retries, ratio × 首次請求數)。
+    預算用盡時呼叫端應放棄重試並直接回報失敗，讓整體負載維持在首次請求量的固定倍數內。
+    """
+
+    def __init__(self, config: RetryBudgetConfig = None):
+        self.config = config or RetryBudgetConfig()
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._retries: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'first_attempts': 0,
+            'retries_granted': 0,
+            'retries_denied': 0
+        }
+
+    @staticmethod
+    def key_for_url(url: str) -> str:
+        """從 URL 取得預算鍵值（域名）"""
+        return urlparse(url).netloc or url
+
+    def _prune(self, records: Deque[float], now: float):
+        cutoff = now - self.config.window_seconds
+        while records and records[0] < cutoff:
+            records.popleft()
+
+    def record_attempt(self, key: str):
+        """記錄一次首次請求（非重試）"""
+        now = time.time()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            attempts.append(now)
+            self._prune(attempts, now)
+            self.stats['first_attempts'] += 1
+
+    def try_acquire_retry(self, key: str) -> bool:
+        """嘗試取得一次重試額度，成功時立即計入"""
+        now = time.time()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            retries = self._retries.setdefault(key, deque())
+            self._prune(attempts, now)
+            self._prune(retries, now)
+
+            allowed = max(self.config.min_retries, int(len(attempts) * self.config.ratio))
+            if len(retries) >= allowed:
+                self.stats['retries_denied'] += 1
+                logger.warning(f"🪫 {key} 重試預算已用盡 ({len(retries)}/{allowed})，放棄重試")
+                return False
+
+            retries.append(now)
+            self.stats['retries_granted'] += 1
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        now = time.time()
+        with self._lock:
+            domains = {}
+            for key, attempts in self._attempts.items():
+                retries = self._retries.get(key, deque())
+                self._prune(attempts, now)
+                self._prune(retries, now)
+                domains[key] = {
+                    'recent_attempts': len(attempts),
+                    'recent_retries': len(retries),
+                    'retry_allowance': max(self.config.min_retries, int(len(attempts) * self.config.ratio))
+                }
+            return {
+                **self.stats,
+                'ratio': self.config.ratio,
+                'window_seconds': self.config.window_seconds,
+                'domains': domains
+            }
+
+
+# 全局重試預算實例
+_global_retry_budget = None
+
+def get_global_retry_budget() -> RetryBudget:
+    """獲取全局重試預算實例"""
+    global _global_retry_budget
+    if _global_retry_budget is None:
+        _global_retry_budget = RetryBudget()
+    return _global_retry_budget
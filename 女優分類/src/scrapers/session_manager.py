@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+連線會話管理模組
+每個事件迴圈共用一個長期存在的 TCPConnector 與 ClientSession，保留連線池與 DNS 快取
+"""
+
+import asyncio
+import aiohttp
+import logging
+import threading
+from typing import Dict, Any, Tuple
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionConfig:
+    """連線會話配置"""
+    limit: int = 100                    # 連線池總上限
+    limit_per_host: int = 4             # 每個主機的連線上限
+    keepalive_timeout: float = 30.0     # 閒置連線保留時間(秒)
+    ttl_dns_cache: int = 300            # DNS快取時間(秒)
+    enable_cleanup_closed: bool = True  # 清理異常關閉的 SSL 連線
+
+
+class SessionManager:
+    """
+    連線會話管理器
+
+    aiohttp 的 ClientSession 綁定建立時的事件迴圈，因此以事件迴圈為單位管理，
+    同一個迴圈內所有爬蟲共用同一個連線池。
+    """
+
+    def __init__(self, config: SessionConfig = None):
+        self.config = config or SessionConfig()
+        self._sessions: Dict[int, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'sessions_created': 0,
+            'sessions_closed': 0
+        }
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """取得目前事件迴圈的共用會話，不存在或已關閉時建立新的"""
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            self._prune_closed_loops()
+            entry = self._sessions.get(id(loop))
+            if entry and entry[0] is loop and not entry[1].closed:
+                return entry[1]
+
+            connector = aiohttp.TCPConnector(
+                limit=self.config.limit,
+                limit_per_host=self.config.limit_per_host,
+                keepalive_timeout=self.config.keepalive_timeout,
+                ttl_dns_cache=self.config.ttl_dns_cache,
+                use_dns_cache=True,
+                enable_cleanup_closed=self.config.enable_cleanup_closed
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[id(loop)] = (loop, session)
+            self.stats['sessions_created'] += 1
+
+        logger.debug(f"🔌 已為事件迴圈建立共用連線會話 (每主機上限: {self.config.limit_per_host})")
+        return session
+
+    def _prune_closed_loops(self):
+        """移除已關閉事件迴圈的會話紀錄"""
+        for loop_id, (loop, _session) in list(self._sessions.items()):
+            if loop.is_closed():
+                del self._sessions[loop_id]
+
+    async def close(self):
+        """關閉目前事件迴圈的共用會話"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._sessions.pop(id(loop), None)
+
+        if entry and not entry[1].closed:
+            await entry[1].close()
+            self.stats['sessions_closed'] += 1
+            logger.debug("🔌 已關閉共用連線會話")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            active = sum(1 for _loop, session in self._sessions.values() if not session.closed)
+        return {
+            **self.stats,
+            'active_sessions': active,
+            'limit_per_host': self.config.limit_per_host
+        }
+
+
+# 全局會話管理器實例
+_global_session_manager = None
+_global_session_manager_lock = threading.Lock()
+
+def get_global_session_manager() -> SessionManager:
+    """獲取全局會話管理器實例"""
+    global _global_session_manager
+    if _global_session_manager is None:
+        with _global_session_manager_lock:
+            if _global_session_manager is None:
+                _global_session_manager = SessionManager()
+    return _global_session_manager
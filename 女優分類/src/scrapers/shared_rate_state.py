@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+跨行程共用限流狀態模組
+以 SQLite (WAL) 檔案保存各域名的請求時段，讓同一台機器上的多個行程（GUI、命令列批次）共用配額
+"""
+
+import sqlite3
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRateState:
+    """
+    跨行程共用的限流狀態
+
+    每次檢查都在 BEGIN IMMEDIATE 交易內完成「清理過期時段 → 檢查配額 → 預約時段」，
+    因此多個行程同時檢查時不會超出配額。WAL 模式搭配 synchronous=NORMAL，
+    提交時不做 fsync，單次預約通常在 1 毫秒內完成。
+    """
+
+    HOUR_WINDOW = 3600.0
+    MINUTE_WINDOW = 60.0
+
+    def __init__(self, db_path: str, busy_timeout: float = 2.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+
+        # 單一長期連線，以鎖序列化同一行程內的存取
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+        self.stats = {
+            'reservations': 0,
+            'rejections': 0,
+            'errors': 0,
+            'total_reserve_time': 0.0
+        }
+
+        logger.info(f"🤝 共用限流狀態已啟用 - 檔案: {self.db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_slots (
+                domain TEXT NOT NULL,
+                ts REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_slots_domain_ts ON rate_slots(domain, ts)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS domain_state (
+                domain TEXT PRIMARY KEY,
+                last_request REAL NOT NULL DEFAULT 0,
+                retry_after_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        return conn
+
+    def try_reserve(self, domain: str, requests_per_minute: int, requests_per_hour: int,
+                    min_interval: float) -> Tuple[bool, float]:
+        """
+        嘗試為域名預約一個請求時段
+
+        Returns:
+            Tuple[bool, float]: (是否已預約, 需要等待的時間)；發生錯誤時回傳 (True, 0.0) 交由本機限流決定
+        """
+        start = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._conn
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "DELETE FROM rate_slots WHERE domain = ? AND ts <= ?",
+                        (domain, now - self.HOUR_WINDOW)
+                    )
+                    allowed, wait_time = self._check(conn, domain, now, requests_per_minute,
+                                                     requests_per_hour, min_interval)
+                    if allowed:
+                        conn.execute("INSERT INTO rate_slots (domain, ts) VALUES (?, ?)", (domain, now))
+                        conn.execute("""
+                            INSERT INTO domain_state (domain, last_request) VALUES (?, ?)
+                            ON CONFLICT(domain) DO UPDATE SET last_request = excluded.last_request
+                        """, (domain, now))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                self.stats['errors'] += 1
+                logger.warning(f"共用限流狀態存取失敗，改用本機限流: {e}")
+                return True, 0.0
+
+            self.stats['total_reserve_time'] += time.perf_counter() - start
+            if allowed:
+                self.stats['reservations'] += 1
+            else:
+                self.stats['rejections'] += 1
+            return allowed, wait_time
+
+    def _check(self, conn: sqlite3.Connection, domain: str, now: float, requests_per_minute: int,
+               requests_per_hour: int, min_interval: float) -> Tuple[bool, float]:
+        """在交易內檢查配額（不修改資料）"""
+        row = conn.execute(
+            "SELECT last_request, retry_after_until FROM domain_state WHERE domain = ?", (domain,)
+        ).fetchone()
+        last_request, retry_after_until = row if row else (0.0, 0.0)
+
+        if now < retry_after_until:
+            return False, retry_after_until - now
+
+        minute_count, minute_oldest = conn.execute(
+            "SELECT COUNT(*), MIN(ts) FROM rate_slots WHERE domain = ? AND ts > ?",
+            (domain, now - self.MINUTE_WINDOW)
+        ).fetchone()
+        if minute_count >= requests_per_minute:
+            return False, max(self.MINUTE_WINDOW - (now - minute_oldest), 0.0)
+
+        hour_count, hour_oldest = conn.execute(
+            "SELECT COUNT(*), MIN(ts) FROM rate_slots WHERE domain = ?", (domain,)
+        ).fetchone()
+        if hour_count >= requests_per_hour:
+            return False, max(self.HOUR_WINDOW - (now - hour_oldest), 0.0)
+
+        since_last = now - last_request
+        if since_last < min_interval:
+            return False, min_interval - since_last
+
+        return True, 0.0
+
+    def set_retry_after(self, domain: str, until: float):
+        """記錄伺服器要求的 Retry-After，所有行程都會遵守"""
+        with self._lock:
+            try:
+                self._conn.execute("""
+                    INSERT INTO domain_state (domain, retry_after_until) VALUES (?, ?)
+                    ON CONFLICT(domain) DO UPDATE SET
+                        retry_after_until = MAX(domain_state.retry_after_until, excluded.retry_after_until)
+                """, (domain, until))
+            except sqlite3.Error as e:
+                self.stats['errors'] += 1
+                logger.warning(f"寫入共用 Retry-After 失敗: {e}")
+
+    def reset(self, domain: Optional[str] = None):
+        """清除共用狀態（指定域名或全部）"""
+        with self._lock:
+            try:
+                if domain is None:
+                    self._conn.execute("DELETE FROM rate_slots")
+                    self._conn.execute("DELETE FROM domain_state")
+                else:
+                    self._conn.execute("DELETE FROM rate_slots WHERE domain = ?", (domain,))
+                    self._conn.execute("DELETE FROM domain_state WHERE domain = ?", (domain,))
+            except sqlite3.Error as e:
+                self.stats['errors'] += 1
+                logger.warning(f"重置共用限流狀態失敗: {e}")
+
+    def close(self):
+        """關閉資料庫連線"""
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            checks = self.stats['reservations'] + self.stats['rejections']
+            avg_ms = self.stats['total_reserve_time'] / checks * 1000 if checks else 0.0
+            return {
+                'db_path': str(self.db_path),
+                'reservations': self.stats['reservations'],
+                'rejections': self.stats['rejections'],
+                'errors': self.stats['errors'],
+                'average_reserve_time': f"{avg_ms:.3f}ms"
+            }
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+請求合併模組 (single-flight)
+同一鍵值的並行請求只執行一次，其他呼叫者共用進行中的請求結果
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_code(code: str) -> str:
+    """正規化番號作為合併鍵值"""
+    return (code or '').strip().upper()
+
+
+class _Call:
+    """進行中的同步呼叫"""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """執行緒版本的請求合併器"""
+
+    # 等待者檢查 stop_event 的間隔(秒)
+    STOP_POLL_INTERVAL = 0.1
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {
+            'executed': 0,
+            'shared': 0,
+            'abandoned': 0
+        }
+
+    def do(self, key: Hashable, func: Callable, *args,
+           stop_event: Optional[threading.Event] = None, **kwargs) -> Any:
+        """
+        執行函數，若相同鍵值已有進行中的呼叫則等待並共用其結果
+
+        Args:
+            key: 合併鍵值
+            func: 實際執行的函數
+            stop_event: 等待者自己的中止訊號（不會傳給 func）；設定後立即放棄等待並回傳 None，
+                進行中的呼叫不受影響
+
+        Returns:
+            函數結果；執行失敗時所有等待者都會收到相同的例外
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['shared'] += 1
+                is_leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats['executed'] += 1
+                is_leader = True
+
+        if not is_leader:
+            logger.debug(f"🔗 [{self.name}] 共用進行中的請求: {key}")
+            timeout = self.STOP_POLL_INTERVAL if stop_event is not None else None
+            while not call.event.wait(timeout):
+                if stop_event.is_set():
+                    with self._lock:
+                        call.waiters -= 1
+                        self.stats['abandoned'] += 1
+                    logger.debug(f"🛑 [{self.name}] 已中止，不再等待進行中的請求: {key}")
+                    return None
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        """進行中的請求數量"""
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        with self._lock:
+            return {
+                **self.stats,
+                'in_flight': len(self._calls)
+            }
+
+
+class _AsyncCall:
+    """進行中的非同步呼叫"""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """asyncio 版本的請求合併器"""
+
+    def __init__(self, name: str = "async-single-flight"):
+        self.name = name
+        # 鍵值包含事件迴圈，避免不同迴圈之間共用 Task
+        self._calls: Dict[Tuple[int, Hashable], _AsyncCall] = {}
+        self.stats = {
+            'executed': 0,
+            'shared': 0,
+            'cancelled': 0
+        }
+
+    async def do(self, key: Hashable, coro_func: Callable, *args, **kwargs) -> Any:
+        """
+        執行協程函數，若相同鍵值已有進行中的呼叫則共用其結果
+
+        個別呼叫者被取消時不會影響其他等待者；所有等待者都取消時才取消底層請求。
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+
+        call = self._calls.get(call_key)
+        if call is None or call.task.done():
+            task = loop.create_task(coro_func(*args, **kwargs))
+            call = _AsyncCall(task)
+            self._calls[call_key] = call
+            task.add_done_callback(lambda _task: self._forget(call_key, call))
+            self.stats['executed'] += 1
+        else:
+            self.stats['shared'] += 1
+            logger.debug(f"🔗 [{self.name}] 共用進行中的請求: {key}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+                self.stats['cancelled'] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, call_key: Tuple[int, Hashable], call: _AsyncCall):
+        """請求完成後移除紀錄"""
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+
+    def in_flight(self) -> int:
+        """進行中的請求數量"""
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取統計資訊"""
+        return {
+            **self.stats,
+            'in_flight': len(self._calls)
+        }
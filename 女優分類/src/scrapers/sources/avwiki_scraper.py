@@ -4,6 +4,7 @@ AV-WIKI 專用爬蟲
 針對 av-wiki.net 優化的爬蟲實作
 """
 
+import asyncio
 import aiohttp
 import logging
 import re
@@ -36,41 +37,26 @@ class AVWikiScraper(BaseScraper):
         
         logger.info("📚 AV-WIKI 爬蟲已初始化")
     
-    async def scrape_url(self, url: str) -> Dict[str, Any]:
+    async def scrape_url(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
         """爬取 AV-WIKI URL"""
         try:
-            timeout = aiohttp.ClientTimeout(total=30)
+            # 讀取內容並進行編碼檢測
+            content_bytes = await self._fetch_page(url, self.headers, source='AV-WIKI', code=code)
+            soup, encoding = create_safe_soup(content_bytes, url=url)
+            
+            logger.debug(f"✅ AV-WIKI 頁面載入成功，編碼: {encoding}")
+            
+            # 解析內容
+            parsed_data = self.parse_content(str(soup), url)
+            parsed_data['source'] = 'AV-WIKI'
+            parsed_data['encoding'] = encoding
+            
+            return parsed_data
             
-            async with aiohttp.ClientSession(
-                headers=self.headers, 
-                timeout=timeout
-            ) as session:
-                async with session.get(url) as response:
-                    
-                    if response.status == 404:
-                        raise ScrapingException(f"頁面不存在", ErrorType.CLIENT_ERROR, url, 404)
-                    elif response.status >= 500:
-                        raise ScrapingException(f"伺服器錯誤", ErrorType.SERVER_ERROR, url, response.status)
-                    elif response.status == 429:
-                        raise ScrapingException(f"請求過於頻繁", ErrorType.RATE_LIMIT_ERROR, url, 429)
-                    
-                    response.raise_for_status()
-                    
-                    # 讀取內容並進行編碼檢測
-                    content_bytes = await response.read()
-                    soup, encoding = create_safe_soup(content_bytes)
-                    
-                    logger.debug(f"✅ AV-WIKI 頁面載入成功，編碼: {encoding}")
-                    
-                    # 解析內容
-                    parsed_data = self.parse_content(str(soup), url)
-                    parsed_data['source'] = 'AV-WIKI'
-                    parsed_data['encoding'] = encoding
-                    
-                    return parsed_data
-                    
         except aiohttp.ClientError as e:
             raise ScrapingException(f"網路連線錯誤: {e}", ErrorType.NETWORK_ERROR, url)
+        except asyncio.TimeoutError:
+            raise ScrapingException(f"請求逾時", ErrorType.TIMEOUT_ERROR, url)
         except Exception as e:
             if isinstance(e, ScrapingException):
                 raise
@@ -301,7 +287,7 @@ class AVWikiScraper(BaseScraper):
         
         try:
             # 執行安全爬取
-            result = await self.safe_scrape(search_url)
+            result = await self.safe_scrape(search_url, code=video_code)
             
             # 處理搜尋結果
             if 'unique_actresses' in result and result['unique_actresses']:
@@ -4,6 +4,7 @@ JAVDB 專用爬蟲
 針對 JAVDB.com 優化的爬蟲實作
 """
 
+import asyncio
 import aiohttp
 import logging
 import re
@@ -39,42 +40,26 @@ class JAVDBScraper(BaseScraper):
         
         logger.info("🎬 JAVDB 爬蟲已初始化")
     
-    async def scrape_url(self, url: str) -> Dict[str, Any]:
+    async def scrape_url(self, url: str, code: Optional[str] = None) -> Dict[str, Any]:
         """爬取 JAVDB URL"""
         try:
-            timeout = aiohttp.ClientTimeout(total=30)
+            # 讀取內容並進行編碼檢測
+            content_bytes = await self._fetch_page(url, self.headers, source='JAVDB', code=code)
+            soup, encoding = create_safe_soup(content_bytes, url=url)
+            
+            logger.debug(f"✅ JAVDB 頁面載入成功，編碼: {encoding}")
+            
+            # 解析內容
+            parsed_data = self.parse_content(str(soup), url)
+            parsed_data['source'] = 'JAVDB'
+            parsed_data['encoding'] = encoding
+            
+            return parsed_data
             
-            async with aiohttp.ClientSession(
-                headers=self.headers, 
-                timeout=timeout
-            ) as session:
-                async with session.get(url) as response:
-                    
-                    if response.status == 404:
-                        raise ScrapingException(f"頁面不存在", ErrorType.CLIENT_ERROR, url, 404)
-                    elif response.status >= 500:
-                        raise ScrapingException(f"伺服器錯誤", ErrorType.SERVER_ERROR, url, response.status)
-                    elif response.status == 429:
-                        retry_after = response.headers.get('Retry-After')
-                        raise ScrapingException(f"請求過於頻繁", ErrorType.RATE_LIMIT_ERROR, url, 429)
-                    
-                    response.raise_for_status()
-                    
-                    # 讀取內容並進行編碼檢測
-                    content_bytes = await response.read()
-                    soup, encoding = create_safe_soup(content_bytes)
-                    
-                    logger.debug(f"✅ JAVDB 頁面載入成功，編碼: {encoding}")
-                    
-                    # 解析內容
-                    parsed_data = self.parse_content(str(soup), url)
-                    parsed_data['source'] = 'JAVDB'
-                    parsed_data['encoding'] = encoding
-                    
-                    return parsed_data
-                    
         except aiohttp.ClientError as e:
             raise ScrapingException(f"網路連線錯誤: {e}", ErrorType.NETWORK_ERROR, url)
+        except asyncio.TimeoutError:
+            raise ScrapingException(f"請求逾時", ErrorType.TIMEOUT_ERROR, url)
         except Exception as e:
             if isinstance(e, ScrapingException):
                 raise
@@ -308,7 +293,7 @@ class JAVDBScraper(BaseScraper):
         
         try:
             # 執行安全爬取
-            result = await self.safe_scrape(search_url)
+            result = await self.safe_scrape(search_url, code=video_code)
             
             # 如果有搜尋結果，取第一個結果的詳情
             if 'search_results' in result and result['search_results']:
@@ -316,7 +301,7 @@ class JAVDBScraper(BaseScraper):
                 
                 # 如果有詳情頁面URL，進一步獲取詳細資訊
                 if 'detail_url' in first_result:
-                    detail_result = await self.safe_scrape(first_result['detail_url'])
+                    detail_result = await self.safe_scrape(first_result['detail_url'], code=video_code)
                     
                     # 合併搜尋結果和詳情
                     detail_result.update({
@@ -13,8 +13,11 @@ from enum import Enum
 from .sources import JAVDBScraper, AVWikiScraper, ChibaFScraper
 from .cache_manager import CacheManager, CacheConfig
 from .rate_limiter import RateLimiter, DomainConfig
+from .shared_rate_state import SharedRateState
+from .page_cache import PageCache
 from .encoding_utils import install_encoding_warning_filter
-from .base_scraper import RetryConfig, HealthCheckConfig
+from .base_scraper import RetryConfig, HealthCheckConfig, CircuitBreaker, CircuitBreakerConfig
+from .single_flight import AsyncSingleFlight, normalize_code
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +41,8 @@ class UnifiedScraperConfig:
     # 併發設定
     max_concurrent_sources: int = 2
     source_timeout: float = 30.0
+    batch_concurrency: int = 10         # 批次搜尋同時處理的番號數
+    revalidate_concurrency: int = 1     # 背景更新過期快取的並行數（低優先）
     
     # 重試設定
     retry_config: RetryConfig = None
@@ -48,6 +53,17 @@ class UnifiedScraperConfig:
     # 健康檢查設定
     health_config: HealthCheckConfig = None
     
+    # 斷路器設定
+    circuit_breaker_config: CircuitBreakerConfig = None
+    
+    # 跨行程共用限流狀態的 SQLite 檔案路徑（None 表示只在本行程內限流）
+    shared_rate_limit_db: Optional[str] = None
+    
+    # 原始頁面快取的 SQLite 檔案路徑（None 表示不保存原始頁面）
+    page_cache_db: Optional[str] = None
+    page_cache_ttl_seconds: int = 7 * 86400
+    offline: bool = False               # 只從頁面快取重新解析，不連網
+    
     # 結果合併設定
     merge_results: bool = True
     require_consensus: bool = False  # 是否需要多個源的共識
@@ -65,6 +81,9 @@ class UnifiedScraperConfig:
         
         if self.health_config is None:
             self.health_config = HealthCheckConfig()
+        
+        if self.circuit_breaker_config is None:
+            self.circuit_breaker_config = CircuitBreakerConfig()
 
 
 class UnifiedWebScraper:
@@ -75,7 +94,19 @@ class UnifiedWebScraper:
         
         # 初始化快取和限流器
         self.cache_manager = CacheManager(self.config.cache_config)
-        self.rate_limiter = RateLimiter()
+        shared_state = (
+            SharedRateState(self.config.shared_rate_limit_db)
+            if self.config.shared_rate_limit_db else None
+        )
+        self.rate_limiter = RateLimiter(shared_state=shared_state)
+        self.page_cache = (
+            PageCache(self.config.page_cache_db, self.config.page_cache_ttl_seconds,
+                      offline=self.config.offline)
+            if self.config.page_cache_db else None
+        )
+        
+        # 各資料源共用的斷路器，斷路的來源會立即失敗並改用其他來源
+        self.circuit_breaker = CircuitBreaker(self.config.circuit_breaker_config)
         
         # 配置各域名的限流規則
         self._configure_domain_limits()
@@ -84,15 +115,21 @@ class UnifiedWebScraper:
         self.scrapers = {
             DataSource.JAVDB: JAVDBScraper(
                 cache_manager=self.cache_manager,
-                rate_limiter=self.rate_limiter
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                page_cache=self.page_cache
             ),
             DataSource.AVWIKI: AVWikiScraper(
                 cache_manager=self.cache_manager,
-                rate_limiter=self.rate_limiter
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                page_cache=self.page_cache
             ),
             DataSource.CHIBAF: ChibaFScraper(
                 cache_manager=self.cache_manager,
-                rate_limiter=self.rate_limiter
+                rate_limiter=self.rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                page_cache=self.page_cache
             )
         }
         
@@ -107,6 +144,15 @@ class UnifiedWebScraper:
             'merged_results': 0
         }
         
+        # 請求合併：同一番號的並行搜尋共用同一個進行中的查詢
+        self._search_flight = AsyncSingleFlight('search-video')
+        
+        # 過期快取的背景更新（stale-while-revalidate）
+        self._revalidate_semaphore = asyncio.Semaphore(max(1, self.config.revalidate_concurrency))
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self.stats['stale_served'] = 0
+        self.stats['revalidations'] = 0
+        
         logger.info("🚀 統一爬蟲管理器已初始化")
     
     def _configure_domain_limits(self):
@@ -138,6 +184,11 @@ class UnifiedWebScraper:
         for domain, config in domain_configs.items():
             self.rate_limiter.add_domain_config(domain, config)
     
+    @property
+    def offline(self) -> bool:
+        """是否為離線重新解析模式"""
+        return self.page_cache is not None and self.page_cache.offline
+    
     async def search_video_info(self, video_code: str, sources: List[DataSource] = None) -> Dict[str, Any]:
         """
         從多個資料源搜尋影片資訊
@@ -154,13 +205,21 @@ class UnifiedWebScraper:
         if sources is None:
             sources = self.config.source_priority
         
-        # 檢查快取
-        cache_key = f"video:{video_code}"
-        cached_result = await self.cache_manager.get_async(cache_key)
+        flight_key = (normalize_code(video_code), tuple(source.value for source in sources))
+        return await self._search_flight.do(flight_key, self._search_video_info_uncached, video_code, sources)
+    
+    async def _search_video_info_uncached(self, video_code: str, sources: List[DataSource]) -> Dict[str, Any]:
+        """檢查快取後執行影片資訊搜尋"""
+        cached_result = await self._get_cached_video(
+            video_code, self._fetch_video_info, video_code, sources
+        )
         if cached_result:
-            self.stats['cache_hits'] += 1
-            logger.info(f"📋 從快取獲取影片資訊: {video_code}")
             return cached_result
+        return await self._fetch_video_info(video_code, sources)
+    
+    async def _fetch_video_info(self, video_code: str, sources: List[DataSource]) -> Dict[str, Any]:
+        """從網路並行搜尋影片資訊並寫入快取"""
+        cache_key = f"video:{video_code}"
         
         # 並行搜尋
         logger.info(f"🔍 開始搜尋影片 {video_code}，使用資料源: {[s.value for s in sources]}")
@@ -187,6 +246,114 @@ class UnifiedWebScraper:
         logger.info(f"✅ 影片搜尋完成: {video_code}")
         return merged_result
     
+    async def search_video_fallback(self, video_code: str, sources: List[DataSource] = None) -> Dict[str, Any]:
+        """
+        依優先順序逐一搜尋資料源，第一個找到女優資料的來源即為結果
+        
+        與 search_video_info 的並行合併不同，此方法每個番號通常只需一個來源的請求。
+        
+        Args:
+            video_code: 影片番號
+            sources: 指定的資料源順序，None表示使用配置的優先順序
+            
+        Returns:
+            第一個有女優資料的來源結果
+        """
+        self.stats['total_searches'] += 1
+        
+        if sources is None:
+            sources = self.config.source_priority
+        
+        flight_key = ('fallback', normalize_code(video_code), tuple(source.value for source in sources))
+        return await self._search_flight.do(flight_key, self._search_video_fallback_uncached, video_code, sources)
+    
+    async def _search_video_fallback_uncached(self, video_code: str, sources: List[DataSource]) -> Dict[str, Any]:
+        """檢查快取後逐一來源搜尋"""
+        cached_result = await self._get_cached_video(
+            video_code, self._fetch_video_fallback, video_code, sources
+        )
+        if cached_result:
+            return cached_result
+        return await self._fetch_video_fallback(video_code, sources)
+    
+    async def _fetch_video_fallback(self, video_code: str, sources: List[DataSource]) -> Dict[str, Any]:
+        """從網路逐一來源搜尋並寫入快取"""
+        cache_key = f"video:{video_code}"
+        
+        for source in sources:
+            try:
+                result = await asyncio.wait_for(
+                    self.scrapers[source].search_video(video_code),
+                    timeout=self.config.source_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"⏰ {source.value} 搜尋超時: {video_code}")
+                continue
+            except Exception as e:
+                logger.warning(f"❌ {source.value} 搜尋失敗: {video_code} - {e}")
+                continue
+            
+            self.stats['source_usage'][source] += 1
+            if result and result.get('actresses'):
+                result['primary_source'] = source.value
+                await self.cache_manager.set_async(cache_key, result, ttl_hours=24)
+                self.stats['successful_searches'] += 1
+                logger.info(f"✅ {source.value} 找到影片資訊: {video_code}")
+                return result
+        
+        self.stats['failed_searches'] += 1
+        return {
+            'video_code': video_code,
+            'actresses': [],
+            'source': 'none',
+            'message': '所有資料源都未找到結果'
+        }
+    
+    async def _get_cached_video(self, video_code: str, refresh_func: Callable, *args) -> Optional[Dict[str, Any]]:
+        """
+        查詢影片快取
+        
+        過期但仍在寬限期內的結果會立即回傳，同時排入背景更新，
+        讓已知番號的互動操作不必等待網路。離線模式下一律重新解析頁面快取。
+        """
+        if self.offline:
+            return None
+        
+        cache_key = f"video:{video_code}"
+        cached_result, status = await self.cache_manager.get_with_status_async(cache_key)
+        if not cached_result:
+            return None
+        
+        self.stats['cache_hits'] += 1
+        if status == CacheManager.STALE:
+            self.stats['stale_served'] += 1
+            logger.info(f"🕰️ 使用過期快取並於背景更新: {video_code}")
+            self._schedule_revalidation(cache_key, refresh_func, *args)
+        else:
+            logger.info(f"📋 從快取獲取影片資訊: {video_code}")
+        return cached_result
+    
+    def _schedule_revalidation(self, cache_key: str, refresh_func: Callable, *args):
+        """排入背景更新，同一鍵值同時只會有一個更新"""
+        if cache_key in self._revalidating:
+            return
+        task = asyncio.ensure_future(self._revalidate(cache_key, refresh_func, *args))
+        self._revalidating[cache_key] = task
+    
+    async def _revalidate(self, cache_key: str, refresh_func: Callable, *args):
+        """在低並行度下重新搜尋並更新快取（請求仍受限流器控制）"""
+        try:
+            async with self._revalidate_semaphore:
+                await refresh_func(*args)
+            self.stats['revalidations'] += 1
+            logger.debug(f"🔄 已於背景更新快取: {cache_key}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"背景更新快取失敗: {cache_key} - {e}")
+        finally:
+            self._revalidating.pop(cache_key, None)
+    
     async def get_actress_info(self, actress_name: str, sources: List[DataSource] = None) -> Dict[str, Any]:
         """
         從多個資料源獲取女優資訊
@@ -404,51 +571,71 @@ class UnifiedWebScraper:
         video_codes: List[str], 
         progress_callback: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
-        """批次搜尋多個影片"""
+        """
+        批次搜尋多個影片
+        
+        以固定寬度的滑動視窗處理：任一番號完成後立即由下一個番號補上，
+        不需等待同批次中最慢的番號。視窗寬度由 config.batch_concurrency 設定。
+        """
         
         if not video_codes:
             return {}
         
-        logger.info(f"📦 開始批次搜尋 {len(video_codes)} 個影片")
+        window = max(1, min(self.config.batch_concurrency, len(video_codes)))
+        logger.info(f"📦 開始批次搜尋 {len(video_codes)} 個影片 (視窗寬度: {window})")
+        
+        if progress_callback:
+            progress_callback(f"處理 {len(video_codes)} 個影片 (同時 {window} 個)...")
         
-        # 分批處理以控制併發
-        batch_size = 10
+        # 預先以單次批次查詢取回所有已快取的番號，只有未命中的番號進入搜尋佇列
         all_results = {}
+        cached = {} if self.offline else await self.cache_manager.get_many_async(
+            [f"video:{code}" for code in video_codes]
+        )
         
-        for i in range(0, len(video_codes), batch_size):
-            batch_codes = video_codes[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(video_codes) + batch_size - 1) // batch_size
-            
-            if progress_callback:
-                progress_callback(f"處理批次 {batch_num}/{total_batches} ({len(batch_codes)} 個影片)...")
-            
-            logger.info(f"📦 處理批次 {batch_num}/{total_batches}")
-            
-            # 並行處理當前批次
-            tasks = [self.search_video_info(code) for code in batch_codes]
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # 整理批次結果
-            for j, result in enumerate(batch_results):
-                code = batch_codes[j]
-                if isinstance(result, Exception):
-                    logger.error(f"❌ 搜尋 {code} 失敗: {result}")
+        queue: asyncio.Queue = asyncio.Queue()
+        for code in video_codes:
+            cached_result = cached.get(f"video:{code}")
+            if cached_result and code not in all_results:
+                all_results[code] = cached_result
+                self.stats['total_searches'] += 1
+                self.stats['cache_hits'] += 1
+                if progress_callback:
+                    progress_callback(f"{code}: ✅ 成功")
+            elif code not in all_results:
+                queue.put_nowait(code)
+        
+        if cached:
+            logger.info(f"📋 批次快取命中 {len(cached)} 個影片")
+        
+        async def worker():
+            while True:
+                try:
+                    code = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                
+                try:
+                    result = await self.search_video_info(code)
+                    all_results[code] = result
+                    status = "✅ 成功"
+                except Exception as e:
+                    # 單一番號失敗不影響其他番號
+                    logger.error(f"❌ 搜尋 {code} 失敗: {e}")
                     all_results[code] = {
                         'video_code': code,
                         'actresses': [],
-                        'error': str(result)
+                        'error': str(e)
                     }
-                else:
-                    all_results[code] = result
+                    status = "❌ 失敗"
                 
                 if progress_callback:
-                    status = "✅ 成功" if not isinstance(result, Exception) else "❌ 失敗"
                     progress_callback(f"{code}: {status}")
-            
-            # 批次間暫停
-            if i + batch_size < len(video_codes):
-                await asyncio.sleep(1.0)
+        
+        await asyncio.gather(*(worker() for _ in range(window)))
+        
+        # 依輸入順序整理結果
+        all_results = {code: all_results[code] for code in video_codes if code in all_results}
         
         successful = sum(1 for r in all_results.values() if r.get('actresses'))
         logger.info(f"🎉 批次搜尋完成: {successful}/{len(video_codes)} 成功")
@@ -470,7 +657,10 @@ class UnifiedWebScraper:
         return {
             'unified_scraper_stats': self.stats,
             'cache_stats': self.cache_manager.get_stats(),
+            'page_cache_stats': self.page_cache.get_stats() if self.page_cache else None,
             'rate_limiter_stats': self.rate_limiter.get_stats(),
+            'single_flight_stats': self._search_flight.get_stats(),
+            'circuit_breaker_stats': self.circuit_breaker.get_stats(),
             'individual_scrapers': {
                 source.value: scraper.get_comprehensive_stats()
                 for source, scraper in self.scrapers.items()
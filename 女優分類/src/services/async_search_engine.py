@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+非同步搜尋引擎模組 - 在背景執行緒的單一事件迴圈上執行統一爬蟲
+"""
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from models.config import ConfigManager
+from scrapers.unified_scraper import UnifiedWebScraper, UnifiedScraperConfig, DataSource
+from scrapers.session_manager import get_global_session_manager
+from scrapers.loop_runner import get_global_loop_runner
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSearchEngine:
+    """
+    非同步搜尋引擎
+
+    所有番號以 asyncio Task 的形式在同一個事件迴圈上執行，
+    並行數量由 Semaphore 控制，請求頻率由統一爬蟲的 RateLimiter 控制，
+    不需要每個請求佔用一個作業系統執行緒。
+    """
+
+    SOURCE_NAMES = {
+        DataSource.AVWIKI: 'AV-WIKI',
+        DataSource.CHIBAF: 'chiba-f.net',
+        DataSource.JAVDB: 'JAVDB'
+    }
+
+    # 檢查 stop_event 的間隔(秒)
+    STOP_POLL_INTERVAL = 0.1
+
+    def __init__(self, config: ConfigManager, page_cache_db: Optional[str] = None):
+        self.max_in_flight = config.getint('search', 'async_max_in_flight', fallback=50)
+        self.sources = self._parse_sources(
+            config.get('search', 'async_source_order', fallback='avwiki,chibaf,javdb')
+        )
+        # 設定後 GUI 與命令列批次等多個行程共用各域名的請求配額
+        self.shared_rate_limit_db = config.get('search', 'shared_rate_limit_db', fallback='') or None
+        # 與同步搜尋器共用同一個原始頁面快取檔案
+        self.page_cache_db = page_cache_db
+        self.page_cache_ttl = config.getint('search', 'page_cache_ttl', fallback=7 * 86400)
+
+        self._runner = get_global_loop_runner()
+        self._scraper: Optional[UnifiedWebScraper] = None
+        self._start_lock = threading.Lock()
+
+        logger.info(f"⚡ 非同步搜尋引擎已建立 - 最大並行: {self.max_in_flight}, "
+                    f"來源: {' -> '.join(s.value for s in self.sources)}")
+
+    @staticmethod
+    def _parse_sources(value: str) -> List[DataSource]:
+        """解析來源順序設定"""
+        sources = []
+        for name in value.split(','):
+            name = name.strip().lower()
+            try:
+                sources.append(DataSource(name))
+            except ValueError:
+                logger.warning(f"未知的搜尋來源設定: {name}")
+        return sources or [DataSource.AVWIKI, DataSource.CHIBAF, DataSource.JAVDB]
+
+    def _ensure_started(self):
+        """在背景事件迴圈內建立統一爬蟲（健康檢查等元件需要執行中的事件迴圈）"""
+        with self._start_lock:
+            if self._scraper is None:
+                self._scraper = self._runner.run(self._create_scraper())
+
+    async def _create_scraper(self) -> UnifiedWebScraper:
+        return UnifiedWebScraper(UnifiedScraperConfig(
+            source_priority=list(self.sources),
+            shared_rate_limit_db=self.shared_rate_limit_db,
+            page_cache_db=self.page_cache_db,
+            page_cache_ttl_seconds=self.page_cache_ttl
+        ))
+
+    def batch_search(self, codes: List[str], stop_event: threading.Event,
+                     progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        批次搜尋番號（同步介面，供 GUI 工作執行緒呼叫）
+
+        Returns:
+            {番號: WebSearcher 格式的結果或 None}
+        """
+        if not codes:
+            return {}
+        self._ensure_started()
+        return self._runner.run(self._batch_search(codes, stop_event, progress_callback))
+
+    async def _batch_search(self, codes: List[str], stop_event: threading.Event,
+                            progress_callback: Optional[Callable[[str], None]]) -> Dict[str, Optional[Dict]]:
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        tasks = {
+            asyncio.ensure_future(self._search_one(code, semaphore)): code
+            for code in codes
+        }
+        results: Dict[str, Optional[Dict]] = {}
+        pending = set(tasks)
+
+        if progress_callback:
+            progress_callback(f"⚡ 非同步搜尋 {len(codes)} 個番號 (最大並行 {self.max_in_flight})...\n")
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=self.STOP_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                code = tasks[task]
+                try:
+                    result = task.result()
+                    results[code] = result
+                    if progress_callback:
+                        if result and result.get('actresses'):
+                            progress_callback(f"✅ {code}: 找到資料\n")
+                        else:
+                            progress_callback(f"❌ {code}: 未找到結果\n")
+                except Exception as e:
+                    logger.error(f"非同步搜尋 {code} 時發生錯誤: {e}")
+                    if progress_callback:
+                        progress_callback(f"💥 {code}: 處理失敗 - {e}\n")
+
+            if stop_event.is_set() and pending:
+                logger.info("任務被使用者中止。")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+
+        return results
+
+    async def _search_one(self, code: str, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        async with semaphore:
+            result = await self._scraper.search_video_fallback(code, self.sources)
+        return self._to_search_result(result)
+
+    def _to_search_result(self, result: Optional[Dict]) -> Optional[Dict]:
+        """轉換為 WebSearcher.search_info 的統一格式"""
+        if not result or not result.get('actresses'):
+            return None
+        source_value = result.get('primary_source')
+        try:
+            source_name = self.SOURCE_NAMES[DataSource(source_value)]
+        except ValueError:
+            source_name = source_value or '未知'
+        return {
+            'source': f"{source_name} (非同步)",
+            'actresses': result['actresses'],
+            'studio': result.get('studio'),
+            'studio_code': result.get('studio_code'),
+            'release_date': result.get('release_date'),
+            'title': result.get('title'),
+            'duration': result.get('duration'),
+            'director': result.get('director'),
+            'series': result.get('series'),
+            'rating': result.get('rating'),
+            'categories': result.get('categories', [])
+        }
+
+    def get_stats(self) -> Dict:
+        """獲取統一爬蟲統計資訊"""
+        if self._scraper is None:
+            return {}
+        return self._scraper.get_comprehensive_stats()
+
+    def close(self):
+        """關閉共用連線會話；背景事件迴圈由其他同步呼叫端共用，不在此停止"""
+        with self._start_lock:
+            if self._scraper is None:
+                return
+            scraper, self._scraper = self._scraper, None
+
+        # 寫回快取的訪問統計並釋放資料庫連線
+        scraper.cache_manager.close()
+        if scraper.page_cache is not None:
+            scraper.page_cache.close()
+
+        try:
+            self._runner.run(get_global_session_manager().close(), timeout=5)
+        except Exception as e:
+            logger.warning(f"關閉非同步搜尋引擎時發生錯誤: {e}")
+        logger.info("⚡ 非同步搜尋引擎已關閉")
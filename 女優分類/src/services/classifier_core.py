@@ -17,6 +17,7 @@ from utils.scanner import UnifiedFileScanner
 from services.web_searcher import WebSearcher
 from services.studio_classifier import StudioClassificationCore
 from services.interactive_classifier import InteractiveClassifier
+from services.reparse_job import ReparseJob
 
 logger = logging.getLogger(__name__)
 
@@ -141,9 +142,8 @@ class UnifiedClassifierCore:
                     progress_callback("🎉 所有影片都已在資料庫中！\n")
                 return {'status': 'success', 'message': '所有番號都已存在於資料庫中'}
             
-            search_results = self.web_searcher.batch_search(
+            search_results = self.web_searcher.batch_search_info(
                 list(new_code_file_map.keys()), 
-                self.web_searcher.search_info, 
                 stop_event, 
                 progress_callback
             )
@@ -302,6 +302,20 @@ class UnifiedClassifierCore:
             self.logger.error(f"JAVDB 搜尋過程中發生錯誤: {e}", exc_info=True)
             return {'status': 'error', 'message': str(e)}
     
+    def reparse_from_page_cache(self, stop_event: threading.Event, progress_callback=None, max_workers: int = None):
+        """離線重新解析：以頁面快取中的原始頁面在多行程中重跑解析器，批次回填資料庫，不發出任何網路請求"""
+        try:
+            page_cache = self.web_searcher.page_cache
+            if page_cache is None:
+                return {'status': 'error', 'message': '未啟用頁面快取 (search.page_cache)'}
+            
+            workers = max_workers or self.config.getint('search', 'reparse_workers', fallback=0) or None
+            job = ReparseJob(page_cache, self.db_manager, max_workers=workers)
+            return job.run(stop_event, progress_callback)
+        except Exception as e:
+            self.logger.error(f"離線重新解析過程中發生錯誤: {e}", exc_info=True)
+            return {'status': 'error', 'message': str(e)}
+
     def interactive_move_files(self, folder_path_str: str, progress_callback=None):
         """互動式檔案移動 - 支援多女優共演的偏好選擇"""
         try:
@@ -8,6 +8,8 @@ from typing import Tuple, Optional
 from bs4 import BeautifulSoup
 import httpx
 
+from scrapers.encoding_memory import get_global_encoding_memory
+
 logger = logging.getLogger(__name__)
 
 class EncodingEnhancer:
@@ -38,6 +40,14 @@ class EncodingEnhancer:
         if not content_bytes:
             return "", "utf-8"
         
+        # 快速路徑：網域編碼記憶、宣告的字元集或樣本評分決定編碼，整份內容只解碼一次
+        memory = get_global_encoding_memory()
+        decoded, encoding = memory.decode(content_bytes, url, self.encoding_priority,
+                                          response.headers.get('content-type'))
+        if encoding:
+            logger.debug(f"[{url}] 使用編碼: {encoding}")
+            return decoded, encoding
+        
         # 嘗試各種編碼
         best_content = None
         best_encoding = 'utf-8'
@@ -57,6 +67,7 @@ class EncodingEnhancer:
                 # 如果替換字符比例很低，直接使用這個編碼
                 if replacement_ratio < 0.01:  # 少於 1% 的替換字符
                     logger.info(f"[{url}] 找到完美編碼: {encoding}")
+                    memory.record(url, encoding)
                     return decoded, encoding
                 
                 # 記錄最佳編碼
@@ -76,6 +87,7 @@ class EncodingEnhancer:
             best_encoding = 'utf-8'
         else:
             logger.info(f"[{url}] 使用最佳編碼: {best_encoding} (替換比例: {min_replacement_ratio:.3f})")
+            memory.record(url, best_encoding)
         
         return best_content, best_encoding
     
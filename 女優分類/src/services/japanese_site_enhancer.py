@@ -4,13 +4,18 @@
 修正版本，針對不同網站使用適當的編碼策略
 """
 
+import re
 import logging
 from typing import Tuple, Optional
 from bs4 import BeautifulSoup
 import httpx
 
+from scrapers.encoding_memory import get_global_encoding_memory
+
 logger = logging.getLogger(__name__)
 
+_JAPANESE_CHARS = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]')
+
 class JapaneseSiteEnhancer:
     """日文網站編碼增強器 - 專為 av-wiki.net 和 chiba-f.net 設計"""
     
@@ -37,10 +42,80 @@ class JapaneseSiteEnhancer:
         """檢查是否為支援的日文網站"""
         return any(domain in url for domain in self.supported_domains)
     
+    def _score_candidate(self, decoded: str) -> Tuple[int, float]:
+        """以解碼後的文字評估編碼品質，回傳 (HTML 品質分數, 替換字元比例)"""
+        replacement_ratio = decoded.count('\ufffd') / len(decoded) if decoded else 1.0
+        
+        # 檢查是否包含可讀的HTML標籤和常見日文字符
+        lowered = decoded.lower()
+        html_quality = 0
+        if '<html' in lowered and '</html>' in lowered:
+            html_quality += 1
+        if '<div' in lowered and '<li' in lowered:
+            html_quality += 1
+        if _JAPANESE_CHARS.search(decoded):
+            html_quality += 2
+        return html_quality, replacement_ratio
+    
+    def _decode_japanese(self, response: httpx.Response, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        決定日文網站回應的編碼並解碼，只比較文字，不建立 BeautifulSoup
+        
+        Returns:
+            (decoded_content, best_encoding)；所有編碼都失敗時皆為 None
+        """
+        content_bytes = response.content
+        
+        # 快速路徑：網域編碼記憶、宣告的字元集或樣本評分決定編碼，整份內容只解碼一次
+        memory = get_global_encoding_memory()
+        decoded, encoding = memory.decode(content_bytes, url, self._get_encoding_priority(url),
+                                          response.headers.get('content-type'))
+        if encoding:
+            logger.debug(f"[{url}] 日文網站使用編碼: {encoding}")
+            return decoded, encoding
+        
+        best_content = None
+        best_encoding = None
+        best_has_html = False
+        min_replacement_ratio = float('inf')
+        
+        # 根據 URL 選擇適當的編碼優先順序
+        for encoding in self._get_encoding_priority(url):
+            try:
+                decoded = content_bytes.decode(encoding, errors='replace')
+            except (UnicodeDecodeError, LookupError) as e:
+                logger.debug(f"編碼 {encoding} 解碼失敗: {e}")
+                continue
+            
+            html_quality, replacement_ratio = self._score_candidate(decoded)
+            
+            # 如果這個編碼提供了更好的HTML結構或更少的替換字符
+            quality_score = html_quality - replacement_ratio
+            current_best_score = (2 if best_has_html else 0) - min_replacement_ratio
+            
+            if quality_score > current_best_score or replacement_ratio < min_replacement_ratio:
+                min_replacement_ratio = replacement_ratio
+                best_encoding = encoding
+                best_content = decoded
+                best_has_html = '<' in decoded and '>' in decoded
+                
+                # 如果HTML品質很好且替換字符很少，就使用這個編碼
+                if html_quality >= 3 and replacement_ratio < 0.02:  # 2% 以下
+                    break
+        
+        if best_content is None:
+            return None, None
+        
+        logger.info(f"[{url}] 日文網站使用最佳編碼: {best_encoding} (替換比例: {min_replacement_ratio:.3f})")
+        memory.record(url, best_encoding)
+        return best_content, best_encoding
+    
     def create_enhanced_soup(self, response: httpx.Response, url: str = "") -> BeautifulSoup:
         """
         為日文網站創建經過編碼優化的 BeautifulSoup 物件
         
+        編碼選擇只比較解碼後的文字，每個回應只建立一次 BeautifulSoup。
+        
         Args:
             response: httpx.Response 物件
             url: 來源 URL
@@ -52,61 +127,15 @@ class JapaneseSiteEnhancer:
             # 如果不是日文網站，使用標準處理
             return BeautifulSoup(response.content, "html.parser")
         
-        content_bytes = response.content
-        if not content_bytes:
+        if not response.content:
             return BeautifulSoup("", "html.parser")
         
-        best_soup = None
-        best_encoding = 'utf-8'
-        min_replacement_ratio = float('inf')
-        
-        # 根據 URL 選擇適當的編碼優先順序
-        encoding_priority = self._get_encoding_priority(url)
-        
-        for encoding in encoding_priority:
-            try:
-                decoded = content_bytes.decode(encoding, errors='replace')
-                
-                # 計算替換字符比例
-                replacement_count = decoded.count('\ufffd')
-                replacement_ratio = replacement_count / len(decoded) if decoded else 1.0
-                
-                # 改進的編碼品質檢測
-                # 檢查是否包含可讀的HTML標籤和常見日文字符
-                html_quality = 0
-                if '<html' in decoded.lower() and '</html>' in decoded.lower():
-                    html_quality += 1
-                if '<div' in decoded.lower() and '<li' in decoded.lower():
-                    html_quality += 1
-                # 檢查日文字符
-                import re
-                if re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', decoded):
-                    html_quality += 2
-                
-                # 如果這個編碼提供了更好的HTML結構或更少的替換字符
-                quality_score = html_quality - replacement_ratio
-                current_best_score = (2 if best_soup and best_soup.find() else 0) - min_replacement_ratio
-                
-                if quality_score > current_best_score or replacement_ratio < min_replacement_ratio:
-                    min_replacement_ratio = replacement_ratio
-                    best_encoding = encoding
-                    best_soup = BeautifulSoup(decoded, "html.parser")
-                    
-                    # 如果HTML品質很好且替換字符很少，就使用這個編碼
-                    if html_quality >= 3 and replacement_ratio < 0.02:  # 2% 以下
-                        break
-                        
-            except (UnicodeDecodeError, LookupError) as e:
-                logger.debug(f"編碼 {encoding} 解碼失敗: {e}")
-                continue
-        
-        if best_soup is None:
+        decoded, _ = self._decode_japanese(response, url)
+        if decoded is None:
             # 如果所有編碼都失敗，使用標準處理
             logger.warning(f"所有編碼嘗試都失敗，使用標準處理: {url}")
             return BeautifulSoup(response.content, "html.parser")
-        
-        logger.info(f"[{url}] 日文網站使用最佳編碼: {best_encoding} (替換比例: {min_replacement_ratio:.3f})")
-        return best_soup
+        return BeautifulSoup(decoded, "html.parser")
     
     def smart_decode_response(self, response: httpx.Response, url: str = "") -> Tuple[str, str]:
         """
@@ -123,60 +152,15 @@ class JapaneseSiteEnhancer:
             # 如果不是日文網站，使用標準處理
             return response.text, response.encoding or 'utf-8'
         
-        content_bytes = response.content
-        if not content_bytes:
+        if not response.content:
             return "", "utf-8"
         
-        best_content = ""
-        best_encoding = 'utf-8'
-        min_replacement_ratio = float('inf')
-        
-        # 根據 URL 選擇適當的編碼優先順序
-        encoding_priority = self._get_encoding_priority(url)
-        
-        for encoding in encoding_priority:
-            try:
-                decoded = content_bytes.decode(encoding, errors='replace')
-                
-                # 計算替換字符比例
-                replacement_count = decoded.count('\ufffd')
-                replacement_ratio = replacement_count / len(decoded) if decoded else 1.0
-                
-                # 改進的編碼品質檢測 (同樣的邏輯)
-                html_quality = 0
-                if '<html' in decoded.lower() and '</html>' in decoded.lower():
-                    html_quality += 1
-                if '<div' in decoded.lower() and '<li' in decoded.lower():
-                    html_quality += 1
-                # 檢查日文字符
-                import re
-                if re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', decoded):
-                    html_quality += 2
-                
-                # 綜合品質評分
-                quality_score = html_quality - replacement_ratio
-                current_best_score = (2 if best_content and '<html' in best_content.lower() else 0) - min_replacement_ratio
-                
-                if quality_score > current_best_score or replacement_ratio < min_replacement_ratio:
-                    min_replacement_ratio = replacement_ratio
-                    best_encoding = encoding
-                    best_content = decoded
-                    
-                    # 如果HTML品質很好且替換字符很少，就使用這個編碼
-                    if html_quality >= 3 and replacement_ratio < 0.02:  # 2% 以下
-                        break
-                        
-            except (UnicodeDecodeError, LookupError) as e:
-                logger.debug(f"編碼 {encoding} 解碼失敗: {e}")
-                continue
-        
-        if not best_content:
+        decoded, encoding = self._decode_japanese(response, url)
+        if decoded is None:
             # 如果所有編碼都失敗，使用標準處理
             logger.warning(f"所有編碼嘗試都失敗，使用標準處理: {url}")
             return response.text, response.encoding or 'utf-8'
-        
-        logger.info(f"[{url}] 日文網站使用最佳編碼: {best_encoding} (替換比例: {min_replacement_ratio:.3f})")
-        return best_content, best_encoding
+        return decoded, encoding
 
 
 def create_japanese_soup(url: str, timeout: int = 10, max_retries: int = 3) -> Optional[BeautifulSoup]:
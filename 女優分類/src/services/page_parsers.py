@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+"""
+頁面解析器模組
+AV-WIKI、chiba-f.net、JAVDB 頁面的解析函式，線上搜尋與離線重新解析共用同一份解析邏輯；
+皆為模組層級函式，可在行程池中執行
+"""
+import re
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+
+def is_actress_name(text: str) -> bool:
+    """判斷文字是否可能是女優名稱"""
+    if not text or len(text) < 2 or len(text) > 20: 
+        return False
+    exclude_keywords = [
+        'SOD', 'STARS', 'FANZA', 'MGS', 'MIDV', 'SSIS', 'IPX', 'IPZZ', 
+        '続きを読む', '検索', '件', '特典', '映像', '付き', 'star', 'SOKMIL', 
+        'Menu', 'セール', '限定', '最大'
+    ]
+    if any(keyword in text for keyword in exclude_keywords): 
+        return False
+    if re.match(r'^\d+$', text) or len(re.findall(r'\d', text)) > len(text) // 2: 
+        return False
+    if re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', text): 
+        return True
+    return False
+
+
+def extract_studio_code_from_number(code: str) -> Optional[str]:
+    """從番號中提取片商代碼"""
+    if not code:
+        return None
+        
+    # 提取字母部分作為片商代碼
+    match = re.match(r'^([A-Z]+)', code.upper())
+    if match:
+        return match.group(1)
+    return None
+
+
+@lru_cache(maxsize=1)
+def _load_studios() -> Dict[str, List[str]]:
+    """載入 studios.json（每個行程只讀取一次）"""
+    studios_file = Path(__file__).parent.parent.parent / 'studios.json'
+    if not studios_file.exists():
+        return {}
+    with open(studios_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_studio_name_by_code(studio_code: str) -> Optional[str]:
+    """根據片商代碼獲取片商名稱（從 studios.json 載入）"""
+    try:
+        # 反向查找：從代碼找到片商
+        studio_code_upper = studio_code.upper()
+        for studio_name, codes in _load_studios().items():
+            if studio_code_upper in [code.upper() for code in codes]:
+                return studio_name
+    except Exception as e:
+        logger.warning(f"載入 studios.json 失敗: {e}")
+    
+    # 回退到內建對應表
+    studio_mapping = {
+        'STAR': 'SOD',
+        'STARS': 'SOD', 
+        'SDJS': 'SOD',
+        'SSIS': 'S1',
+        'SSNI': 'S1',
+        'IPX': 'IdeaPocket',
+        'IPZZ': 'IdeaPocket',
+        'MIDV': 'MOODYZ',
+        'MIAA': 'MOODYZ',
+        'WANZ': 'WANZ FACTORY',
+        'FSDSS': 'FALENO',
+        'PRED': 'PREMIUM',
+        'ABW': 'Prestige',
+        'BF': 'BeFree',
+        'CAWD': 'kawaii',
+        'JUFD': 'Fitch',
+        'JUL': 'MADONNA',
+        'JUY': 'MADONNA',
+    }
+    
+    return studio_mapping.get(studio_code.upper(), studio_code)
+
+
+def extract_studio_info(soup: BeautifulSoup, code: str) -> Dict:
+    """從網頁中提取片商資訊"""
+    studio_info = {
+        'studio': None,
+        'studio_code': None,
+        'release_date': None
+    }
+    
+    try:
+        # 先取得網頁文字內容，後續方法都可能用到
+        page_text = soup.get_text()
+        
+        # 方法1: 從 AV-WIKI HTML 結構中直接提取片商資訊
+        # 查找包含 fa-clone 圖標的 li 元素
+        studio_elements = soup.find_all("li")
+        for li in studio_elements:
+            icon = li.find("i", class_="fa-clone")
+            if icon:
+                link = li.find("a")
+                if link and link.text.strip():
+                    studio_text = link.text.strip()
+                    # 解析片商名稱，例如 "エスワン - SONE" -> studio="エスワン", code="SONE"
+                    if " - " in studio_text:
+                        parts = studio_text.split(" - ")
+                        studio_info['studio'] = parts[0].strip()
+                        studio_info['studio_code'] = parts[1].strip()
+                    else:
+                        studio_info['studio'] = studio_text
+                    break
+        
+        # 方法2: 如果方法1失敗，嘗試從番號中提取片商代碼
+        if not studio_info['studio']:
+            studio_code = extract_studio_code_from_number(code)
+            if studio_code:
+                studio_info['studio_code'] = studio_code
+                studio_info['studio'] = get_studio_name_by_code(studio_code)
+        
+        # 方法3: 從網頁內容中搜尋片商資訊（最後手段）
+        if not studio_info['studio']:
+            # 搜尋常見的片商名稱和模式
+            studio_patterns = [
+            # 直接片商名稱匹配
+            (r'(S1|SOD|MOODYZ|PREMIUM|WANZ|FALENO|ATTACKERS|E-BODY|KAWAII|FITCH|MADONNA|PRESTIGE)', r'\1'),
+            # 製作公司/發行商模式
+            (r'製作[：:]\s*([^\n\r]+)', r'\1'),
+            (r'發行[：:]\s*([^\n\r]+)', r'\1'),
+            (r'メーカー[：:]\s*([^\n\r]+)', r'\1'),
+            # 番號前綴模式 
+            (r'品番[：:]\s*([A-Z]+)-?\d+', r'\1'),
+        ]
+        
+            for pattern, replacement in studio_patterns:
+                match = re.search(pattern, page_text, re.IGNORECASE)
+                if match:
+                    extracted_studio = match.group(1).strip()
+                    if extracted_studio and len(extracted_studio) < 50:  # 合理長度限制
+                        if not studio_info['studio']:
+                            studio_info['studio'] = extracted_studio
+                        if not studio_info['studio_code'] and len(extracted_studio) <= 10:
+                            studio_info['studio_code'] = extracted_studio
+                        break
+        
+        # 方法4: 嘗試提取發行日期（總是執行）
+        date_patterns = [
+            r'發售日[：:]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+            r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+            r'(\d{4}\.\d{1,2}\.\d{1,2})'
+        ]
+        
+        for pattern in date_patterns:
+            match = re.search(pattern, page_text)
+            if match:
+                studio_info['release_date'] = match.group(1)
+                break                    
+    except Exception as e:
+        logger.warning(f"提取片商資訊時發生錯誤: {e}")
+    
+    return studio_info
+
+
+def extract_chiba_product_info(product_div, code: str) -> Dict:
+    """從 chiba-f.net 產品區塊提取資訊"""
+    result = {
+        'source': 'chiba-f.net (安全增強版)',
+        'actresses': [],
+        'studio': None,
+        'studio_code': None,
+        'release_date': None
+    }
+    
+    try:
+        # 提取女優名稱
+        actress_span = product_div.find('span', class_='fw-bold')
+        if actress_span:
+            result['actresses'] = [actress_span.text.strip()]
+        
+        # 提取系列/片商資訊
+        series_link = product_div.find('a', href=re.compile(r'../series/'))
+        if series_link:
+            result['studio'] = series_link.text.strip()
+            # 從 href 提取片商代碼
+            href = series_link.get('href', '')
+            if '../series/' in href:
+                result['studio_code'] = href.replace('../series/', '').strip()
+        
+        # 提取發行日期
+        date_span = product_div.find('span', class_='start_date')
+        if date_span:
+            result['release_date'] = date_span.text.strip()
+        
+        # 如果沒有找到片商，嘗試從番號推測
+        if not result['studio_code']:
+            result['studio_code'] = extract_studio_code_from_number(code)
+        
+        if result['actresses']:
+            logger.info(f"番號 {code} 透過 {result['source']} 找到: {', '.join(result['actresses'])}, 片商: {result.get('studio', '未知')}")
+            
+    except Exception as e:
+        logger.warning(f"提取 {code} 從 chiba-f.net 資訊時發生部分錯誤: {str(e)}")
+    
+    return result if result.get('actresses') else None
+
+
+def parse_avwiki_page(soup: BeautifulSoup, code: str) -> Optional[Dict]:
+    """解析 AV-WIKI 搜尋結果頁面"""
+    # 先檢查是否有搜尋結果
+    search_results = soup.find_all("div", class_="column-flex")
+    logger.info(f"AV-WIKI 搜尋 {code}: 找到 {len(search_results)} 個搜尋結果")
+    
+    if not search_results:
+        # 檢查是否是 "沒有找到結果" 的頁面
+        no_results_indicators = ["該当なし", "見つかりませんでした", "検索結果：0", "0件"]
+        page_text = soup.get_text()
+        for indicator in no_results_indicators:
+            if indicator in page_text:
+                logger.info(f"AV-WIKI 明確顯示沒有找到 {code} 的結果")
+                return None
+                
+    # 正確解析女優名稱：<li class="actress-name"><a>女優名稱</a></li>
+    actress_elements = soup.find_all("li", class_="actress-name")
+    actresses = []
+    logger.info(f"AV-WIKI 解析: 找到 {len(actress_elements)} 個 actress-name 元素")
+    for li in actress_elements:
+        link = li.find("a")
+        if link and link.text.strip():
+            actress_name = link.text.strip()
+            actresses.append(actress_name)
+            logger.info(f"AV-WIKI 提取到女優名稱: {actress_name}")
+    
+    if not actresses:
+        logger.warning(f"AV-WIKI 未找到女優名稱，HTML開頭: {str(soup)[:200]}...")
+    
+    # 搜尋片商資訊
+    studio_info = extract_studio_info(soup, code)
+    
+    if not actresses:
+        page_text = soup.get_text()
+        lines = [line.strip() for line in page_text.split('\n') if line.strip()]
+        for i, line in enumerate(lines):
+            if code in line:
+                for j in range(max(0, i-3), min(len(lines), i+1)):
+                    potential_name = lines[j].strip()
+                    if potential_name and is_actress_name(potential_name):
+                        if potential_name not in actresses: 
+                            actresses.append(potential_name)
+    if actresses:
+        result = {
+            'source': 'AV-WIKI (安全增強版)', 
+            'actresses': actresses,
+            'studio': studio_info.get('studio'),
+            'studio_code': studio_info.get('studio_code'),
+            'release_date': studio_info.get('release_date')
+        }
+        logger.info(f"番號 {code} 透過 {result['source']} 找到: {', '.join(result['actresses'])}, 片商: {result.get('studio', '未知')}")
+        return result
+    
+    return None
+
+
+def parse_chiba_page(soup: BeautifulSoup, code: str) -> Optional[Dict]:
+    """解析 chiba-f.net 搜尋結果頁面"""
+    # 查找產品區塊
+    product_divs = soup.find_all('div', class_='product-div')
+    logger.info(f"chiba-f.net 解析: 找到 {len(product_divs)} 個 product-div 元素")
+        
+    for product_div in product_divs:
+        # 檢查番號是否匹配
+        pno_element = product_div.find('div', class_='pno')
+        if pno_element and code.upper() in pno_element.text.upper():
+            logger.info(f"chiba-f.net 找到匹配番號: {code}")
+            return extract_chiba_product_info(product_div, code)
+    
+    # 如果沒有找到完全匹配，嘗試模糊匹配
+    for product_div in product_divs:
+        product_text = product_div.get_text()
+        if code.upper() in product_text.upper():
+            logger.info(f"chiba-f.net 模糊匹配找到番號: {code}")
+            return extract_chiba_product_info(product_div, code)
+    
+    if not product_divs:
+        logger.warning(f"chiba-f.net 未找到任何產品區塊，HTML開頭: {str(soup)[:200]}...")
+    
+    return None
+
+
+def find_javdb_detail_link(soup: BeautifulSoup, video_id: str) -> Optional[str]:
+    """從 JAVDB 搜尋結果頁面找出最匹配番號的詳情頁連結"""
+    # 尋找影片連結 - 使用實際的JAVDB結構
+    video_links = soup.select('a[href*="/v/"]')
+    
+    if not video_links:
+        logger.info(f"🔍 JAVDB 未找到番號 {video_id} 的結果")
+        return None
+    
+    logger.debug(f"🎬 找到 {len(video_links)} 個影片連結")
+    
+    # 檢查每個連結對應的影片，看是否匹配番號
+    for link in video_links:
+        href = link.get('href')
+        if not href:
+            continue
+        
+        # 檢查連結周圍的文字或標題是否包含番號
+        link_text = link.get_text(strip=True)
+        title_attr = link.get('title', '')
+        
+        # 檢查是否匹配
+        text_to_check = f"{link_text} {title_attr}".upper()
+        if video_id.upper() in text_to_check:
+            logger.debug(f"🎯 找到匹配的影片連結: {href} (文字: {link_text})")
+            return href
+    
+    # 如果沒有找到完全匹配的，使用第一個結果
+    best_match_url = video_links[0].get('href')
+    logger.debug(f"🎲 使用第一個搜尋結果: {best_match_url}")
+    return best_match_url
+
+
+def parse_javdb_detail(soup: BeautifulSoup, video_id: str) -> Optional[Dict[str, Any]]:
+    """解析 JAVDB 詳情頁面"""
+    try:
+        info = {
+            'code': video_id.upper(),
+            'source': 'JAVDB (安全增強版)',
+            'actresses': [],
+            'studio': None,
+            'studio_code': None,
+            'release_date': None,
+            'title': None,
+            'duration': None,
+            'director': None,
+            'series': None,
+            'rating': None,
+            'categories': []
+        }
+        
+        # 提取標題
+        title_element = soup.select_one('h2.title')
+        if title_element:
+            info['title'] = title_element.text.strip()
+          # 提取詳細資訊 - 適配新的 HTML 結構
+        info_panels = soup.select('.panel-block')
+        
+        for panel in info_panels:
+            strong_element = panel.select_one('strong')
+            if not strong_element:
+                continue
+                
+            label = strong_element.text.strip().rstrip(':：')
+            
+            # 對於演員資訊，直接在同一個 panel 中尋找
+            if label == '演員':
+                # 提取女優名稱（只取女性演員）
+                actresses = []
+                # 尋找演員連結和性別符號
+                actress_links = panel.select('a[href*="/actors/"]')
+                for link in actress_links:
+                    # 檢查緊跟著的性別符號
+                    next_element = link.find_next_sibling()
+                    if (next_element and 
+                        next_element.name == 'strong' and 
+                        next_element.get('class') and 
+                        'symbol' in next_element.get('class') and 
+                        'female' in next_element.get('class')):
+                        actress_name = link.text.strip()
+                        if actress_name:
+                            actresses.append(actress_name)
+                    # 備用檢查：如果沒有 class，檢查文字內容
+                    elif (next_element and next_element.name == 'strong' and '♀' in next_element.text):
+                        actress_name = link.text.strip()
+                        if actress_name:
+                            actresses.append(actress_name)
+                info['actresses'] = actresses
+                continue
+            
+            # 取得值容器（非演員欄位）
+            value_element = panel.select_one('.value')
+            if not value_element:
+                continue
+            
+            elif label == '片商':
+                # 提取片商
+                maker_link = value_element.select_one('a[href*="/makers/"]')
+                if maker_link:
+                    info['studio'] = maker_link.text.strip()
+            
+            elif label == '日期':
+                # 提取發行日期
+                date_text = value_element.text.strip()
+                if date_text:
+                    info['release_date'] = date_text
+            
+            elif label == '時長':
+                # 提取時長
+                duration_text = value_element.text.strip()
+                if duration_text:
+                    info['duration'] = duration_text
+            
+            elif label == '導演':
+                # 提取導演
+                director_link = value_element.select_one('a')
+                if director_link:
+                    info['director'] = director_link.text.strip()
+            
+            elif label == '系列':
+                # 提取系列
+                series_link = value_element.select_one('a')
+                if series_link:
+                    info['series'] = series_link.text.strip()
+            
+            elif label == '評分':
+                # 提取評分
+                rating_text = value_element.text.strip()
+                # 提取數字評分 (如 "4.26分, 由564人評價")
+                rating_match = re.search(r'(\d+\.?\d*)分', rating_text)
+                if rating_match:
+                    info['rating'] = float(rating_match.group(1))
+            
+            elif label == '類別':
+                # 提取類別
+                category_links = value_element.select('a')
+                info['categories'] = [link.text.strip() for link in category_links]
+        
+        # 嘗試從番號推測片商代碼
+        if not info['studio_code'] and video_id:
+            info['studio_code'] = extract_studio_code_from_number(video_id)
+        
+        # 確保至少有女優資訊才返回結果
+        if info['actresses']:
+            return info
+        else:
+            logger.warning(f"⚠️ JAVDB 頁面中未找到 {video_id} 的女優資訊")
+            return None
+            
+    except Exception as e:
+        logger.error(f"❌ 解析 JAVDB 詳情頁面時出錯: {e}")
+        return None
+
+
+def parse_page(html: str, source: str, code: str, url: str = '') -> Optional[Dict]:
+    """
+    依來源選擇解析器解析頁面 HTML
+
+    JAVDB 搜尋頁只含詳情頁連結，沒有影片資訊，回傳 None。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    if source == 'AV-WIKI':
+        return parse_avwiki_page(soup, code)
+    if source == 'chiba-f.net':
+        return parse_chiba_page(soup, code)
+    if source == 'JAVDB' and '/v/' in url:
+        return parse_javdb_detail(soup, code)
+    return None
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+離線重新解析模組 - 以頁面快取中的原始頁面在多行程中重跑各來源解析器，批次回填資料庫
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scrapers.page_cache import CachedPage, PageCache
+from models.database import SQLiteDBManager
+from .page_parsers import parse_page
+
+logger = logging.getLogger(__name__)
+
+# 子行程回傳的解析結果：(番號, 來源, 影片資訊)
+ParseResult = Tuple[str, str, Dict[str, Any]]
+
+# 需要合併的欄位（女優另外處理）
+_MERGE_FIELDS = ('studio', 'studio_code', 'release_date', 'title', 'series', 'categories')
+
+
+def _parse_batch(pages: List[CachedPage]) -> List[ParseResult]:
+    """子行程工作函式：解析一批頁面，略過沒有結果或解析失敗的頁面"""
+    results = []
+    for page in pages:
+        try:
+            info = parse_page(page.text(), page.source, page.code, page.url)
+        except Exception as e:
+            logger.debug(f"重新解析失敗: {page.url} ({e})")
+            continue
+        if info:
+            results.append((page.code, page.source, info))
+    return results
+
+
+class ReparseJob:
+    """
+    頁面快取重新解析工作
+
+    - 只處理資料庫中已存在的番號，依 rowid 分批讀取頁面並送進行程池解析
+    - 同時在途的批次數限制為工作行程數的兩倍，避免整個快取堆在記憶體中
+    - 同一番號的多個來源依 SOURCE_ORDER 合併：女優取第一個有結果的來源，
+      其他欄位取第一個非空值，最後以單一交易批次寫回資料庫
+    """
+
+    SOURCE_ORDER = ('AV-WIKI', 'chiba-f.net', 'JAVDB')
+
+    def __init__(self, page_cache: PageCache, db_manager: SQLiteDBManager,
+                 max_workers: Optional[int] = None, batch_size: int = 50):
+        self.page_cache = page_cache
+        self.db_manager = db_manager
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+    def _iter_batches(self, known_codes: Dict[str, str]):
+        """只保留資料庫中存在的番號頁面，回傳 (批次, 讀取的頁面數)"""
+        for pages in self.page_cache.iter_pages(self.batch_size):
+            selected = [page for page in pages if page.code and page.code.upper() in known_codes]
+            yield selected, len(pages)
+
+    def _parse_all(self, known_codes: Dict[str, str], stop_event: Optional[threading.Event],
+                   progress_callback: Optional[Callable[[str], None]]) -> Tuple[List[ParseResult], int]:
+        """解析所有頁面，回傳 (解析結果, 處理的頁面數)"""
+        results: List[ParseResult] = []
+        total = self.page_cache.count()
+        processed = 0
+
+        def report():
+            if progress_callback:
+                progress_callback(f"♻️ 已解析 {processed}/{total} 個快取頁面\n")
+
+        if self.max_workers <= 1:
+            for batch, read in self._iter_batches(known_codes):
+                if stop_event and stop_event.is_set():
+                    break
+                results.extend(_parse_batch(batch))
+                processed += read
+                report()
+            return results, processed
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            batches = self._iter_batches(known_codes)
+            exhausted = False
+            while True:
+                # 補充在途批次
+                while not exhausted and len(pending) < self.max_workers * 2:
+                    if stop_event and stop_event.is_set():
+                        exhausted = True
+                        break
+                    try:
+                        batch, read = next(batches)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if batch:
+                        pending[executor.submit(_parse_batch, batch)] = read
+                    else:
+                        processed += read
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    processed += pending.pop(future)
+                    try:
+                        results.extend(future.result())
+                    except Exception as e:
+                        logger.warning(f"重新解析批次失敗: {e}")
+                report()
+
+                if stop_event and stop_event.is_set():
+                    for future in pending:
+                        future.cancel()
+                    break
+        return results, processed
+
+    def _merge(self, results: List[ParseResult], known_codes: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """依來源優先順序合併同一番號的解析結果，鍵為資料庫中的番號"""
+        by_code: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for code, source, info in results:
+            sources = by_code.setdefault(known_codes[code.upper()], {})
+            sources.setdefault(source, info)
+
+        def priority(source: str) -> int:
+            return self.SOURCE_ORDER.index(source) if source in self.SOURCE_ORDER else len(self.SOURCE_ORDER)
+
+        merged = {}
+        for code, sources in by_code.items():
+            update: Dict[str, Any] = {}
+            for source in sorted(sources, key=priority):
+                info = sources[source]
+                if not update.get('actresses') and info.get('actresses'):
+                    update['actresses'] = info['actresses']
+                    update['search_method'] = info.get('source') or source
+                for field in _MERGE_FIELDS:
+                    value = info.get(field)
+                    if not update.get(field) and value and value != 'UNKNOWN':
+                        update[field] = value
+            merged[code] = update
+        return merged
+
+    def run(self, stop_event: Optional[threading.Event] = None,
+            progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """執行重新解析並寫回資料庫"""
+        start = time.perf_counter()
+        known_codes = {video['code'].upper(): video['code']
+                       for video in self.db_manager.get_all_videos() if video.get('code')}
+        if progress_callback:
+            progress_callback(f"📴 離線重新解析：{self.page_cache.count()} 個快取頁面，"
+                              f"{self.max_workers} 個工作行程\n\n")
+
+        results, processed = self._parse_all(known_codes, stop_event, progress_callback)
+        if stop_event and stop_event.is_set():
+            return {'status': 'stopped', 'pages': processed, 'parsed': len(results)}
+
+        updates = self._merge(results, known_codes)
+        updated = self.db_manager.bulk_update_video_metadata(updates)
+        elapsed = time.perf_counter() - start
+
+        logger.info(f"♻️ 重新解析完成 - 頁面: {processed}, 解析結果: {len(results)}, "
+                    f"更新影片: {updated}, 耗時: {elapsed:.1f}秒")
+        return {
+            'status': 'success',
+            'pages': processed,
+            'parsed': len(results),
+            'updated': updated,
+            'elapsed': round(elapsed, 2)
+        }
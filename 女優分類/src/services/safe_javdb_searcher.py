@@ -14,6 +14,9 @@ from typing import Dict, List, Optional, Any
 import threading
 from urllib.parse import quote, urljoin
 
+from scrapers.retry_budget import get_global_retry_budget
+from .page_parsers import find_javdb_detail_link, parse_javdb_detail
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,7 +44,12 @@ class SafeJAVDBSearcher:
         self._check_daily_reset()
         
         # 線程鎖保護共享資源
-        self._lock = threading.Lock()
+        # safe_request 在持有鎖時遞迴重試，需要可重入鎖
+        self._lock = threading.RLock()
+        self.retry_budget = get_global_retry_budget()
+        
+        # 原始頁面快取（由 WebSearcher 設定，None 表示不保存原始頁面）
+        self.page_cache = None
         
         # 初始化會話
         self.create_session()
@@ -154,8 +162,9 @@ class SafeJAVDBSearcher:
         self.request_count = 0
         logger.debug(f"🔄 已建立新的會話 - User-Agent: {headers['User-Agent'][:50]}...")
 
-    def safe_request(self, url: str, retry_count: int = 0) -> Optional[httpx.Response]:
-        """安全的 HTTP 請求方法"""
+    def safe_request(self, url: str, retry_count: int = 0,
+                     headers: Optional[Dict[str, str]] = None) -> Optional[httpx.Response]:
+        """安全的 HTTP 請求方法（headers 為額外的請求標頭，例如條件式請求標頭）"""
         with self._lock:
             # 檢查每日限制
             self._check_daily_reset()
@@ -178,34 +187,40 @@ class SafeJAVDBSearcher:
                 logger.debug(f"⏱️ 等待 {base_delay:.1f} 秒...")
                 time.sleep(base_delay)
                 
-                # 執行請求
-                response = self.session.get(url)
+                # 執行請求（首次請求計入重試預算的基數）
+                if retry_count == 0:
+                    self.retry_budget.record_attempt(self.retry_budget.key_for_url(url))
+                response = self.session.get(url, headers=headers)
                 self.request_count += 1
                 self.stats['today_count'] += 1
                 self.stats['total_requests'] += 1
                 
                 # 處理不同的 HTTP 狀態碼
                 if response.status_code == 429:  # Too Many Requests
-                    if retry_count < 3:
+                    if retry_count < 3 and self._acquire_retry(url):
                         wait_time = 60 + random.uniform(30, 90)  # 1-2.5分鐘
                         logger.warning(f"⚠️ 收到 429 錯誤，等待 {wait_time:.1f} 秒後重試...")
                         time.sleep(wait_time)
-                        return self.safe_request(url, retry_count + 1)
+                        return self.safe_request(url, retry_count + 1, headers)
                     else:
                         logger.error("❌ 重試次數過多，放棄請求")
                         return None
                 
                 elif response.status_code == 403:  # Forbidden
                     logger.warning("⚠️ 收到 403 錯誤，可能被暫時封鎖")
-                    if retry_count < 2:
+                    if retry_count < 2 and self._acquire_retry(url):
                         # 重新建立 session 並等待更長時間
                         self.create_session()
                         wait_time = 120 + random.uniform(60, 180)  # 2-5分鐘
                         logger.info(f"⏳ 等待 {wait_time:.1f} 秒後重試...")
                         time.sleep(wait_time)
-                        return self.safe_request(url, retry_count + 1)
+                        return self.safe_request(url, retry_count + 1, headers)
                     return None
                 
+                elif response.status_code == 304:  # Not Modified（條件式請求）
+                    logger.debug("📄 JAVDB 頁面未變更，沿用頁面快取")
+                    return response
+                
                 elif response.status_code != 200:
                     logger.warning(f"⚠️ JAVDB 請求失敗: {response.status_code}")
                     return None
@@ -215,31 +230,52 @@ class SafeJAVDBSearcher:
                 
             except httpx.TimeoutException:
                 logger.warning("⏰ JAVDB 請求超時")
-                if retry_count < 2:
-                    return self.safe_request(url, retry_count + 1)
+                if retry_count < 2 and self._acquire_retry(url):
+                    return self.safe_request(url, retry_count + 1, headers)
                 return None
                 
             except httpx.ConnectError:
                 logger.warning("🔌 JAVDB 連線失敗")
-                if retry_count < 2:
+                if retry_count < 2 and self._acquire_retry(url):
                     time.sleep(10 + retry_count * 5)
-                    return self.safe_request(url, retry_count + 1)
+                    return self.safe_request(url, retry_count + 1, headers)
                 return None
                 
             except Exception as e:
                 logger.error(f"❌ JAVDB 請求過程中出錯: {e}")
-                if retry_count < 1:
+                if retry_count < 1 and self._acquire_retry(url):
                     time.sleep(5)
-                    return self.safe_request(url, retry_count + 1)
+                    return self.safe_request(url, retry_count + 1, headers)
                 return None
 
+    def _acquire_retry(self, url: str) -> bool:
+        """向共用的重試預算申請一次重試"""
+        return self.retry_budget.try_acquire_retry(self.retry_budget.key_for_url(url))
+
+    def _fetch_page(self, url: str, video_id: str) -> Optional[str]:
+        """取得頁面 HTML；啟用頁面快取時優先使用快取，過期則送出條件式請求"""
+        if self.page_cache is None:
+            response = self.safe_request(url)
+            return response.text if response else None
+        
+        def request(conditional_headers):
+            response = self.safe_request(url, headers=conditional_headers)
+            if response is None:
+                return None
+            return response.status_code, response.headers, response.content
+        
+        # 頁面快取命中時不會發出請求，也不佔用每日請求額度
+        page = self.page_cache.fetch(url, request, code=video_id.upper(), source='JAVDB')
+        return page.text() if page else None
+
     def search_javdb(self, video_id: str) -> Optional[Dict[str, Any]]:
         """在 JAVDB 搜尋影片資訊"""
         if not video_id:
             return None
               # 檢查快取
         cache_key = f"javdb_{video_id.upper()}"
-        if cache_key in self.cache:
+        offline = self.page_cache is not None and self.page_cache.offline
+        if cache_key in self.cache and not offline:
             logger.debug(f"📋 從快取取得 {video_id} 的 JAVDB 資料")
             return self.cache[cache_key]
         
@@ -247,45 +283,15 @@ class SafeJAVDBSearcher:
             # 構建搜尋 URL
             search_url = f"https://javdb.com/search?q={quote(video_id)}&f=all"
               # 執行搜尋
-            response = self.safe_request(search_url)
-            if not response:
+            html = self._fetch_page(search_url, video_id)
+            if not html:
                 return None
             
             # JAVDB 使用標準 UTF-8 編碼，不需要特殊處理
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 尋找影片連結 - 使用實際的JAVDB結構
-            video_links = soup.select('a[href*="/v/"]')
-            
-            if not video_links:
-                logger.info(f"🔍 JAVDB 未找到番號 {video_id} 的結果")
-                return None
-            
-            logger.debug(f"🎬 找到 {len(video_links)} 個影片連結")
+            soup = BeautifulSoup(html, 'html.parser')
             
             # 尋找最匹配的結果
-            best_match_url = None
-            
-            # 檢查每個連結對應的影片，看是否匹配番號
-            for link in video_links:
-                href = link.get('href')
-                if not href:
-                    continue
-                
-                # 檢查連結周圍的文字或標題是否包含番號
-                link_text = link.get_text(strip=True)
-                title_attr = link.get('title', '')
-                
-                # 檢查是否匹配
-                text_to_check = f"{link_text} {title_attr}".upper()
-                if video_id.upper() in text_to_check:
-                    best_match_url = href
-                    logger.debug(f"🎯 找到匹配的影片連結: {href} (文字: {link_text})")
-                    break
-              # 如果沒有找到完全匹配的，使用第一個結果
-            if not best_match_url:
-                best_match_url = video_links[0].get('href')
-                logger.debug(f"🎲 使用第一個搜尋結果: {best_match_url}")
+            best_match_url = find_javdb_detail_link(soup, video_id)
             
             if not best_match_url:
                 logger.warning(f"⚠️ 無法獲取 {video_id} 的詳情頁面連結")
@@ -294,12 +300,12 @@ class SafeJAVDBSearcher:
             detail_url = urljoin('https://javdb.com', best_match_url)
             
             # 訪問詳情頁面
-            detail_response = self.safe_request(detail_url)
-            if not detail_response:
+            detail_html = self._fetch_page(detail_url, video_id)
+            if not detail_html:
                 return None
             
-            # 解析詳情頁面 - 使用編碼增強器
-            info = self._parse_detail_page(detail_response, video_id, detail_url)
+            # 解析詳情頁面
+            info = parse_javdb_detail(BeautifulSoup(detail_html, 'html.parser'), video_id)
             
             if info:
                 # 儲存到快取
@@ -317,146 +323,6 @@ class SafeJAVDBSearcher:
             logger.error(f"❌ 搜尋 {video_id} 時出錯: {e}")
             return None
 
-    def _parse_detail_page(self, response: httpx.Response, video_id: str, url: str) -> Optional[Dict[str, Any]]:
-        """解析 JAVDB 詳情頁面"""
-        try:
-            # JAVDB 使用標準 UTF-8 編碼，不需要特殊處理
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            if soup is None:
-                logger.warning(f"無法解析 JAVDB 詳情頁面: {url}")
-                return None
-            
-            info = {
-                'code': video_id.upper(),
-                'source': 'JAVDB (安全增強版)',
-                'actresses': [],
-                'studio': None,
-                'studio_code': None,
-                'release_date': None,
-                'title': None,
-                'duration': None,
-                'director': None,
-                'series': None,
-                'rating': None,
-                'categories': []
-            }
-            
-            # 提取標題
-            title_element = soup.select_one('h2.title')
-            if title_element:
-                info['title'] = title_element.text.strip()
-              # 提取詳細資訊 - 適配新的 HTML 結構
-            info_panels = soup.select('.panel-block')
-            
-            for panel in info_panels:
-                strong_element = panel.select_one('strong')
-                if not strong_element:
-                    continue
-                    
-                label = strong_element.text.strip().rstrip(':：')
-                
-                # 對於演員資訊，直接在同一個 panel 中尋找
-                if label == '演員':
-                    # 提取女優名稱（只取女性演員）
-                    actresses = []
-                    # 尋找演員連結和性別符號
-                    actress_links = panel.select('a[href*="/actors/"]')
-                    for link in actress_links:
-                        # 檢查緊跟著的性別符號
-                        next_element = link.find_next_sibling()
-                        if (next_element and 
-                            next_element.name == 'strong' and 
-                            next_element.get('class') and 
-                            'symbol' in next_element.get('class') and 
-                            'female' in next_element.get('class')):
-                            actress_name = link.text.strip()
-                            if actress_name:
-                                actresses.append(actress_name)
-                        # 備用檢查：如果沒有 class，檢查文字內容
-                        elif (next_element and next_element.name == 'strong' and '♀' in next_element.text):
-                            actress_name = link.text.strip()
-                            if actress_name:
-                                actresses.append(actress_name)
-                    info['actresses'] = actresses
-                    continue
-                
-                # 取得值容器（非演員欄位）
-                value_element = panel.select_one('.value')
-                if not value_element:
-                    continue
-                
-                elif label == '片商':
-                    # 提取片商
-                    maker_link = value_element.select_one('a[href*="/makers/"]')
-                    if maker_link:
-                        info['studio'] = maker_link.text.strip()
-                
-                elif label == '日期':
-                    # 提取發行日期
-                    date_text = value_element.text.strip()
-                    if date_text:
-                        info['release_date'] = date_text
-                
-                elif label == '時長':
-                    # 提取時長
-                    duration_text = value_element.text.strip()
-                    if duration_text:
-                        info['duration'] = duration_text
-                
-                elif label == '導演':
-                    # 提取導演
-                    director_link = value_element.select_one('a')
-                    if director_link:
-                        info['director'] = director_link.text.strip()
-                
-                elif label == '系列':
-                    # 提取系列
-                    series_link = value_element.select_one('a')
-                    if series_link:
-                        info['series'] = series_link.text.strip()
-                
-                elif label == '評分':
-                    # 提取評分
-                    rating_text = value_element.text.strip()
-                    # 提取數字評分 (如 "4.26分, 由564人評價")
-                    import re
-                    rating_match = re.search(r'(\d+\.?\d*)分', rating_text)
-                    if rating_match:
-                        info['rating'] = float(rating_match.group(1))
-                
-                elif label == '類別':
-                    # 提取類別
-                    category_links = value_element.select('a')
-                    info['categories'] = [link.text.strip() for link in category_links]
-            
-            # 嘗試從番號推測片商代碼
-            if not info['studio_code'] and video_id:
-                info['studio_code'] = self._extract_studio_code_from_number(video_id)
-            
-            # 確保至少有女優資訊才返回結果
-            if info['actresses']:
-                return info
-            else:
-                logger.warning(f"⚠️ JAVDB 頁面中未找到 {video_id} 的女優資訊")
-                return None
-                
-        except Exception as e:
-            logger.error(f"❌ 解析 JAVDB 詳情頁面時出錯: {e}")
-            return None
-
-    def _extract_studio_code_from_number(self, code: str) -> Optional[str]:
-        """從番號中提取片商代碼"""
-        import re
-        if not code:
-            return None
-        
-        # 提取字母部分作為片商代碼
-        match = re.match(r'^([A-Z]+)', code.upper())
-        if match:
-            return match.group(1)
-        return None
-
     def get_stats(self) -> Dict[str, Any]:
         """獲取搜尋統計資訊"""
         self._check_daily_reset()
@@ -13,6 +13,9 @@ import json
 import threading
 from dataclasses import dataclass, asdict
 
+from scrapers.single_flight import SingleFlight
+from scrapers.retry_budget import RetryBudget, get_global_retry_budget
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,10 +43,14 @@ class CacheEntry:
 class SafeSearcher:
     """安全搜尋器 - 防止IP被封鎖的智能搜尋器"""
     
-    def __init__(self, config: RequestConfig = None, cache_file: str = None):
+    def __init__(self, config: RequestConfig = None, cache_file: str = None, retry_budget: RetryBudget = None):
         self.config = config or RequestConfig()
+        # 與其他搜尋器共用的每域名重試預算
+        self.retry_budget = retry_budget or get_global_retry_budget()
         self.last_request_time = 0.0
         self._request_lock = threading.Lock()
+        # 相同 URL 的並行請求共用同一次網路請求
+        self._request_flight = SingleFlight('safe-request')
         
         # 初始化快取系統
         self.cache_file = cache_file or str(Path(__file__).parent.parent.parent / 'cache' / 'search_cache.json')
@@ -309,6 +316,14 @@ class SafeSearcher:
         if cached_result is not None:
             return cached_result
         
+        flight_key = (getattr(request_func, '__qualname__', repr(request_func)),
+                      self._generate_cache_key(url, params))
+        return self._request_flight.do(flight_key, self._execute_request, request_func, url, *args, **kwargs)
+
+    def _execute_request(self, request_func: Callable, url: str, *args, **kwargs) -> Optional[Any]:
+        """執行請求 - 間隔控制與重試"""
+        params = kwargs.get('params', {})
+        
         # 控制請求間隔
         self._wait_for_next_request()
         
@@ -316,7 +331,9 @@ class SafeSearcher:
         if 'headers' not in kwargs:
             kwargs['headers'] = self.get_headers()
         
-        # 實施重試機制
+        # 實施重試機制（重試次數受共用的重試預算限制）
+        budget_key = self.retry_budget.key_for_url(url)
+        self.retry_budget.record_attempt(budget_key)
         last_exception = None
         for attempt in range(self.config.max_retries + 1):
             try:
@@ -335,6 +352,9 @@ class SafeSearcher:
                 logger.warning(f"⚠️ 請求失敗 (嘗試 {attempt + 1}): {e}")
                 
                 if attempt < self.config.max_retries:
+                    if not self.retry_budget.try_acquire_retry(budget_key):
+                        break
+                    
                     # 指數退避延遲
                     wait_time = self.config.backoff_factor ** attempt
                     logger.info(f"⏳ 等待 {wait_time:.1f} 秒後重試...")
@@ -369,6 +389,7 @@ class SafeSearcher:
                 'expired_entries': len(self.cache) - valid_cache_count,
                 'cache_file': self.cache_file
             },
+            'single_flight': self._request_flight.get_stats(),
             'browser_headers_count': len(self.browser_headers),
             'current_header_index': self.current_header_index
         }
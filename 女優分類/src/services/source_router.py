@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+搜尋來源路由模組 - 依片商前綴的歷史命中率與延遲決定來源搜尋順序
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+class SourceRouter:
+    """
+    自適應來源路由器
+
+    依序搜尋多個來源時，以「命中率 / 平均延遲」由高到低排序可使期望成本最低。
+    每個片商前綴（例如 FSDSS、SSIS）各自累積統計，樣本不足時向該來源的全域統計收斂。
+    """
+
+    # 前綴統計向全域統計收斂的權重（相當於虛擬樣本數）
+    PRIOR_WEIGHT = 5.0
+    # 未知延遲時使用的預設值(秒)
+    DEFAULT_LATENCY = 1.0
+    # 低於此值的延遲視為快取命中，不列入延遲平均
+    MIN_NETWORK_LATENCY = 0.05
+    # 每累積多少筆紀錄自動寫回檔案
+    SAVE_EVERY = 20
+
+    def __init__(self, stats_file: str, default_order: List[str],
+                 prior_latency: Optional[Dict[str, float]] = None,
+                 pinned_last: Optional[List[str]] = None):
+        self.stats_file = Path(stats_file)
+        self.default_order = list(default_order)
+        # 尚無樣本時各來源的預估延遲(秒)，例如 JAVDB 每次查詢需兩個請求且間隔較長
+        self.prior_latency = dict(prior_latency or {})
+        # 固定排在最後、不參與排序的來源（例如有配額限制的 JAVDB）
+        self.pinned_last = list(pinned_last or [])
+        self._lock = threading.Lock()
+        # 序列化檔案寫入，避免多執行緒同時覆寫同一檔案
+        self._save_lock = threading.Lock()
+        self._dirty_count = 0
+
+        # 結構: {prefix: {source: {'attempts', 'hits', 'latency_total', 'latency_samples'}}}
+        self.prefix_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.global_stats: Dict[str, Dict[str, float]] = {}
+        self._load_stats()
+
+        logger.info(f"🧭 來源路由器已初始化 - 已知前綴: {len(self.prefix_stats)}")
+
+    @staticmethod
+    def extract_prefix(code: str) -> str:
+        """從番號取得片商前綴"""
+        match = re.match(r'^([A-Z]+)', (code or '').upper())
+        return match.group(1) if match else ''
+
+    @staticmethod
+    def _new_entry() -> Dict[str, float]:
+        return {'attempts': 0, 'hits': 0, 'latency_total': 0.0, 'latency_samples': 0}
+
+    def _load_stats(self):
+        """載入歷史統計"""
+        if not self.stats_file.exists():
+            return
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.prefix_stats = data.get('prefix_stats', {})
+            self.global_stats = data.get('global_stats', {})
+        except Exception as e:
+            logger.warning(f"載入來源路由統計失敗: {e}")
+            self.prefix_stats = {}
+            self.global_stats = {}
+
+    def save(self):
+        """儲存統計資料（在鎖內序列化快照，寫入暫存檔後原子替換）"""
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps({
+                    'prefix_stats': self.prefix_stats,
+                    'global_stats': self.global_stats,
+                    'updated_at': time.time()
+                }, ensure_ascii=False, indent=2)
+                self._dirty_count = 0
+            temp_file = self.stats_file.with_name(self.stats_file.name + '.tmp')
+            try:
+                self.stats_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(temp_file, self.stats_file)
+            except Exception as e:
+                logger.warning(f"儲存來源路由統計失敗: {e}")
+
+    def record(self, code: str, source: str, hit: bool, latency: float):
+        """記錄一次來源查詢結果"""
+        prefix = self.extract_prefix(code)
+        with self._lock:
+            entries = [self.global_stats.setdefault(source, self._new_entry())]
+            if prefix:
+                entries.append(self.prefix_stats.setdefault(prefix, {}).setdefault(source, self._new_entry()))
+
+            for entry in entries:
+                entry['attempts'] += 1
+                if hit:
+                    entry['hits'] += 1
+                if latency >= self.MIN_NETWORK_LATENCY:
+                    entry['latency_total'] += latency
+                    entry['latency_samples'] += 1
+
+            self._dirty_count += 1
+            should_save = self._dirty_count >= self.SAVE_EVERY
+
+        if should_save:
+            self.save()
+
+    def _hit_rate(self, entry: Optional[Dict[str, float]], prior: float) -> float:
+        """以先驗值平滑的命中率"""
+        if not entry:
+            return prior
+        return (entry['hits'] + self.PRIOR_WEIGHT * prior) / (entry['attempts'] + self.PRIOR_WEIGHT)
+
+    def _latency(self, entry: Optional[Dict[str, float]], prior: float) -> float:
+        """以先驗值平滑的平均延遲"""
+        if not entry or not entry['latency_samples']:
+            return prior
+        return (entry['latency_total'] + self.PRIOR_WEIGHT * prior) / (entry['latency_samples'] + self.PRIOR_WEIGHT)
+
+    def _score(self, prefix: str, source: str) -> float:
+        """來源分數 - 命中率 / 平均延遲"""
+        global_entry = self.global_stats.get(source)
+        # 全域統計以 Laplace 平滑作為前綴統計的先驗
+        global_hit_rate = ((global_entry['hits'] + 1) / (global_entry['attempts'] + 2)) if global_entry else 0.5
+        global_latency = self._latency(global_entry, self.prior_latency.get(source, self.DEFAULT_LATENCY))
+
+        prefix_entry = self.prefix_stats.get(prefix, {}).get(source) if prefix else None
+        hit_rate = self._hit_rate(prefix_entry, global_hit_rate)
+        latency = self._latency(prefix_entry, global_latency)
+        return hit_rate / max(latency, self.MIN_NETWORK_LATENCY)
+
+    def order_sources(self, code: str, sources: Optional[List[str]] = None) -> List[str]:
+        """依期望成本排序搜尋來源，分數相同時保留預設順序"""
+        sources = list(sources or self.default_order)
+        pinned = [source for source in sources if source in self.pinned_last]
+        sources = [source for source in sources if source not in self.pinned_last]
+        prefix = self.extract_prefix(code)
+
+        def default_rank(source: str) -> int:
+            return self.default_order.index(source) if source in self.default_order else len(self.default_order)
+
+        with self._lock:
+            scores = {source: self._score(prefix, source) for source in sources}
+
+        ordered = sorted(sources, key=lambda s: (-round(scores[s], 6), default_rank(s)))
+        if ordered != sources:
+            logger.debug(f"🧭 番號 {code} 的來源順序調整為: {' -> '.join(ordered + pinned)}")
+        return ordered + pinned
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取路由統計資訊"""
+        with self._lock:
+            global_summary = {}
+            for source, entry in self.global_stats.items():
+                attempts = entry['attempts']
+                global_summary[source] = {
+                    'attempts': attempts,
+                    'hits': entry['hits'],
+                    'hit_rate': f"{(entry['hits'] / attempts * 100) if attempts else 0:.1f}%",
+                    'average_latency': f"{(entry['latency_total'] / entry['latency_samples']) if entry['latency_samples'] else 0:.2f}s"
+                }
+            return {
+                'stats_file': str(self.stats_file),
+                'known_prefixes': len(self.prefix_stats),
+                'sources': global_summary
+            }
+
+    def reset(self):
+        """清除所有路由統計"""
+        with self._lock:
+            self.prefix_stats.clear()
+            self.global_stats.clear()
+        self.save()
+        logger.info("🧹 已重置來源路由統計")
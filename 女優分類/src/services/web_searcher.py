@@ -2,12 +2,13 @@
 """
 網路搜尋器模組
 """
-import re
 import time
 import logging
 import threading
 import concurrent.futures
-from typing import Dict, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
 import httpx
 from bs4 import BeautifulSoup
 from urllib.parse import quote
@@ -15,6 +16,10 @@ from urllib.parse import quote
 from models.config import ConfigManager
 from .safe_searcher import SafeSearcher, RequestConfig
 from .safe_javdb_searcher import SafeJAVDBSearcher
+from .source_router import SourceRouter
+from scrapers.single_flight import SingleFlight, normalize_code
+from scrapers.page_cache import PageCache, CachedPage
+from .page_parsers import parse_avwiki_page, parse_chiba_page
 # 移除不必要的 create_japanese_soup 匯入，直接使用 JapaneseSiteEnhancer 類別
 
 logger = logging.getLogger(__name__)
@@ -23,6 +28,16 @@ logger = logging.getLogger(__name__)
 class WebSearcher:
     """增強版搜尋器 - 支援搜尋結果頁面"""
     
+    # 每個來源保留的延遲樣本數，用於估算 p95
+    LATENCY_WINDOW = 50
+    # 延遲樣本少於此數量時改用固定的對沖延遲
+    MIN_LATENCY_SAMPLES = 10
+    # 預設來源順序，以及可參與對沖的來源（JAVDB 每日額度有限，不參與對沖）
+    DEFAULT_SOURCE_ORDER = ['AV-WIKI', 'chiba-f.net', 'JAVDB']
+    HEDGEABLE_SOURCES = ('AV-WIKI', 'chiba-f.net')
+    # JAVDB 每次查詢需搜尋頁與詳情頁兩個請求，每個請求間隔 3-7 秒
+    JAVDB_PRIOR_LATENCY = 10.0
+
     def __init__(self, config: ConfigManager):
         # 初始化安全搜尋器配置
         safe_config = RequestConfig(
@@ -64,6 +79,16 @@ class WebSearcher:
         # 初始化 JAVDB 安全搜尋器
         cache_dir = config.get('search', 'cache_dir', fallback=None)
         self.javdb_searcher = SafeJAVDBSearcher(cache_dir)
+        
+        # 原始頁面快取：保存下載的 HTML，解析器修改後可離線重新解析
+        self.page_cache = None
+        if config.getboolean('search', 'page_cache', fallback=True):
+            self.page_cache = PageCache(
+                config.get('search', 'page_cache_db', fallback='') or
+                str(self.javdb_searcher.cache_dir / 'page_cache.db'),
+                ttl_seconds=config.getint('search', 'page_cache_ttl', fallback=7 * 86400)
+            )
+            self.javdb_searcher.page_cache = self.page_cache
           # 保留原有配置以向下相容
         self.headers = self.safe_searcher.get_headers()
         
@@ -82,170 +107,322 @@ class WebSearcher:
         self.thread_count = config.getint('search', 'thread_count', fallback=5)
         self.batch_delay = config.getfloat('search', 'batch_delay', fallback=2.0)
         self.timeout = config.getint('search', 'request_timeout', fallback=20)
+        
+        # 對沖搜尋設定：第一個來源在延遲內未回應時，提前啟動下一個來源
+        self.hedged_search = config.getboolean('search', 'hedged_search', fallback=False)
+        self.hedge_delay = config.getfloat('search', 'hedge_delay', fallback=1.5)
+        self.hedge_use_p95 = config.getboolean('search', 'hedge_use_p95', fallback=True)
+        self._source_latency = {
+            'AV-WIKI': deque(maxlen=self.LATENCY_WINDOW),
+            'chiba-f.net': deque(maxlen=self.LATENCY_WINDOW)
+        }
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+
+        # 請求合併：同一番號的並行搜尋共用同一次查詢
+        self._search_flight = SingleFlight('search-info')
+
+        # 非同步搜尋引擎：以單一事件迴圈執行 aiohttp 爬蟲取代每請求一個執行緒
+        self.async_engine = None
+        if config.getboolean('search', 'async_engine', fallback=False):
+            from .async_search_engine import AsyncSearchEngine
+            self.async_engine = AsyncSearchEngine(
+                config, page_cache_db=str(self.page_cache.db_path) if self.page_cache else None
+            )
+
+        # 自適應來源排序：依片商前綴的命中率與延遲調整搜尋順序
+        self.source_router = None
+        if config.getboolean('search', 'adaptive_source_order', fallback=False):
+            self.source_router = SourceRouter(
+                self.javdb_searcher.cache_dir / 'source_router_stats.json',
+                self.DEFAULT_SOURCE_ORDER,
+                prior_latency={'JAVDB': self.JAVDB_PRIOR_LATENCY},
+                pinned_last=['JAVDB']
+            )
+
         logger.info("🛡️ 已啟用安全搜尋器功能")
         logger.info("🇯🇵 已啟用日文網站快速搜尋功能")
         logger.info("🎬 已啟用 JAVDB 安全搜尋功能")
+        if self.hedged_search:
+            logger.info(f"⚡ 已啟用對沖搜尋模式 - 延遲: {self.hedge_delay}s (p95: {self.hedge_use_p95})")
+
+    @property
+    def offline(self) -> bool:
+        """是否為離線重新解析模式"""
+        return self.page_cache is not None and self.page_cache.offline
+
+    @contextmanager
+    def offline_mode(self):
+        """
+        離線重新解析模式：只讀取頁面快取，不發出任何網路請求
+
+        進入時清空解析結果快取，讓所有番號都以目前的解析器重新解析。
+        """
+        if self.page_cache is None:
+            raise RuntimeError("未啟用頁面快取，無法離線重新解析")
+        previous = self.page_cache.offline
+        self.page_cache.offline = True
+        self.search_cache.clear()
+        logger.info("📴 已進入離線重新解析模式")
+        try:
+            yield self
+        finally:
+            self.page_cache.offline = previous
+            logger.info("📶 已離開離線重新解析模式")
 
     def search_info(self, code: str, stop_event: threading.Event) -> Optional[Dict]:
-        """多層級搜尋策略 - AV-WIKI -> chiba-f.net -> JAVDB"""
+        """多層級搜尋策略 - 預設 AV-WIKI -> chiba-f.net -> JAVDB，啟用自適應排序時依片商前綴調整"""
         if stop_event.is_set(): 
             return None
         if code in self.search_cache: 
             return self.search_cache[code]
         
-        try:
-            # 第一層：原有的 AV-WIKI 搜尋
-            logger.debug(f"🔍 第一層搜尋 - AV-WIKI: {code}")
-            result = self._search_av_wiki(code, stop_event)
-            if result and result.get('actresses'):
+        # 同一番號出現在多個檔案或搜尋重疊時，只發出一次查詢
+        return self._search_flight.do(normalize_code(code), self._search_info_uncached, code, stop_event,
+                                      stop_event=stop_event)
+
+    def batch_search_info(self, codes: List[str], stop_event: threading.Event, progress_callback=None) -> Dict:
+        """批次搜尋番號 - 啟用非同步引擎時於事件迴圈執行，否則使用執行緒批次搜尋"""
+        if self.async_engine is None or self.offline:
+            return self.batch_search(codes, self.search_info, stop_event, progress_callback)
+
+        # 已在本地快取的番號不需再送出請求
+        results = {code: self.search_cache[code] for code in codes if code in self.search_cache}
+        remaining = [code for code in codes if code not in results]
+        for code, result in self.async_engine.batch_search(remaining, stop_event, progress_callback).items():
+            if result:
                 self.search_cache[code] = result
-                return result
-            
-            # 第二層：chiba-f.net 搜尋  
-            if not stop_event.is_set():
-                logger.debug(f"🔍 第二層搜尋 - chiba-f.net: {code}")
-                result = self._search_chiba_f_net(code, stop_event)
+            results[code] = result
+        return results
+
+    def _search_info_uncached(self, code: str, stop_event: threading.Event) -> Optional[Dict]:
+        """實際執行多層級搜尋"""
+        if code in self.search_cache:
+            return self.search_cache[code]
+
+        try:
+            ordered_sources = self._get_source_order(code)
+
+            if self.hedged_search:
+                # 對沖模式：日文網站並行競速，取第一個有女優資料的結果
+                hedge_sources = [s for s in ordered_sources if s[0] in self.HEDGEABLE_SOURCES]
+                result = self._hedged_search(code, hedge_sources, stop_event)
                 if result and result.get('actresses'):
                     self.search_cache[code] = result
                     return result
-            
-            # 第三層：使用安全的 JAVDB 搜尋
-            if not stop_event.is_set():
-                logger.debug(f"🔍 第三層搜尋 - JAVDB: {code}")
-                javdb_result = self.javdb_searcher.search_javdb(code)
-                if javdb_result and javdb_result.get('actresses'):
-                    # 轉換為統一格式
-                    result = {
-                        'source': javdb_result['source'],
-                        'actresses': javdb_result['actresses'],
-                        'studio': javdb_result.get('studio'),
-                        'studio_code': javdb_result.get('studio_code'),
-                        'release_date': javdb_result.get('release_date'),
-                        'title': javdb_result.get('title'),
-                        'duration': javdb_result.get('duration'),
-                        'director': javdb_result.get('director'),
-                        'series': javdb_result.get('series'),
-                        'rating': javdb_result.get('rating'),
-                        'categories': javdb_result.get('categories', [])
-                    }
+                # JAVDB 每日額度有限，不參與對沖，最後依序搜尋
+                ordered_sources = [s for s in ordered_sources if s[0] not in self.HEDGEABLE_SOURCES]
+
+            for level, (source_name, search_func) in enumerate(ordered_sources, start=1):
+                if stop_event.is_set():
+                    break
+                logger.debug(f"🔍 第{level}層搜尋 - {source_name}: {code}")
+                result = self._timed_source_call(source_name, search_func, code, stop_event)
+                if result and result.get('actresses'):
                     self.search_cache[code] = result
-                    
-                    # 豐富的日誌輸出
-                    log_parts = [f"番號 {code} 透過 {result['source']} 找到:"]
-                    log_parts.append(f"女優: {', '.join(result['actresses'])}")
-                    log_parts.append(f"片商: {result.get('studio', '未知')}")
-                    
-                    if result.get('rating'):
-                        log_parts.append(f"評分: {result['rating']}")
-                    if result.get('categories'):
-                        categories_str = ', '.join(result['categories'][:3])  # 只顯示前3個類別
-                        if len(result['categories']) > 3:
-                            categories_str += f" 等{len(result['categories'])}個類別"
-                        log_parts.append(f"類別: {categories_str}")
-                    
-                    logger.info(" | ".join(log_parts))
                     return result
-            
+
             logger.warning(f"番號 {code} 未在所有搜尋源中找到女優資訊。")
-            return None            
+            return None
         except Exception as e:
             logger.error(f"搜尋番號 {code} 時發生錯誤: {e}", exc_info=True)
             return None
 
+    def _get_source_order(self, code: str) -> List[Tuple[str, Callable]]:
+        """取得番號的來源搜尋順序 - 預設 AV-WIKI -> chiba-f.net -> JAVDB"""
+        sources = {
+            'AV-WIKI': self._search_av_wiki,
+            'chiba-f.net': self._search_chiba_f_net,
+            'JAVDB': self._search_javdb_source
+        }
+        order = self.DEFAULT_SOURCE_ORDER
+        if self.source_router is not None:
+            order = self.source_router.order_sources(code, order)
+        return [(name, sources[name]) for name in order]
+
+    def _search_javdb_source(self, code: str, stop_event: threading.Event) -> Optional[Dict]:
+        """JAVDB 來源搜尋 - 與其他來源一致的呼叫介面"""
+        if stop_event.is_set():
+            return None
+        result = self._search_javdb(code)
+        if result:
+            # 豐富的日誌輸出
+            log_parts = [f"番號 {code} 透過 {result['source']} 找到:"]
+            log_parts.append(f"女優: {', '.join(result['actresses'])}")
+            log_parts.append(f"片商: {result.get('studio', '未知')}")
+
+            if result.get('rating'):
+                log_parts.append(f"評分: {result['rating']}")
+            if result.get('categories'):
+                categories_str = ', '.join(result['categories'][:3])  # 只顯示前3個類別
+                if len(result['categories']) > 3:
+                    categories_str += f" 等{len(result['categories'])}個類別"
+                log_parts.append(f"類別: {categories_str}")
+
+            logger.info(" | ".join(log_parts))
+        return result
+
+    def _search_javdb(self, code: str) -> Optional[Dict]:
+        """JAVDB 搜尋並轉換為統一格式"""
+        javdb_result = self.javdb_searcher.search_javdb(code)
+        if not javdb_result or not javdb_result.get('actresses'):
+            return None
+        return {
+            'source': javdb_result['source'],
+            'actresses': javdb_result['actresses'],
+            'studio': javdb_result.get('studio'),
+            'studio_code': javdb_result.get('studio_code'),
+            'release_date': javdb_result.get('release_date'),
+            'title': javdb_result.get('title'),
+            'duration': javdb_result.get('duration'),
+            'director': javdb_result.get('director'),
+            'series': javdb_result.get('series'),
+            'rating': javdb_result.get('rating'),
+            'categories': javdb_result.get('categories', [])
+        }
+
+    def _timed_source_call(self, source_name: str, search_func: Callable, code: str,
+                           stop_event: threading.Event) -> Optional[Dict]:
+        """執行單一來源搜尋並記錄延遲"""
+        start_time = time.monotonic()
+        result = search_func(code, stop_event)
+        latency = time.monotonic() - start_time
+        # 被取消、中止或離線重新解析的查詢不代表來源的真實命中率與延遲
+        if stop_event.is_set() or self.offline:
+            return result
+        latency_samples = self._source_latency.get(source_name)
+        if latency_samples is not None:
+            latency_samples.append(latency)
+        if self.source_router is not None:
+            self.source_router.record(code, source_name, bool(result and result.get('actresses')), latency)
+        return result
+
+    def _get_hedge_delay(self, source_name: str) -> float:
+        """取得對沖延遲 - 樣本足夠時使用該來源的 p95 延遲"""
+        if self.hedge_use_p95:
+            samples = sorted(self._source_latency.get(source_name, ()))
+            if len(samples) >= self.MIN_LATENCY_SAMPLES:
+                p95_index = min(len(samples) - 1, int(len(samples) * 0.95))
+                return samples[p95_index]
+        return self.hedge_delay
+
+    def _get_hedge_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """延遲建立對沖搜尋專用的執行緒池"""
+        with self._hedge_executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(2, self.thread_count * 2),
+                    thread_name_prefix='hedged-search'
+                )
+            return self._hedge_executor
+
+    def _hedged_search(self, code: str, sources: List[Tuple[str, Callable]],
+                       stop_event: threading.Event) -> Optional[Dict]:
+        """
+        對沖搜尋 - 前一個來源在對沖延遲內未回應時啟動下一個來源
+        
+        各來源仍透過原本的 SafeSearcher 發送請求，請求間隔限制不受影響；
+        取得第一個有女優資料的結果後，其餘來源會收到取消訊號。
+        """
+        executor = self._get_hedge_executor()
+        cancel_event = threading.Event()
+        pending_sources = list(sources)
+        running: Dict[concurrent.futures.Future, str] = {}
+        next_launch_at = 0.0
+        
+        try:
+            while pending_sources or running:
+                if stop_event.is_set():
+                    return None
+                
+                now = time.monotonic()
+                if pending_sources and (not running or now >= next_launch_at):
+                    source_name, search_func = pending_sources.pop(0)
+                    if running:
+                        logger.debug(f"⚡ 對沖啟動 {source_name}: {code} (等待中: {', '.join(running.values())})")
+                    else:
+                        logger.debug(f"🔍 對沖搜尋 - {source_name}: {code}")
+                    future = executor.submit(self._timed_source_call, source_name, search_func, code, cancel_event)
+                    running[future] = source_name
+                    next_launch_at = now + self._get_hedge_delay(source_name)
+                    continue
+                
+                # 定期醒來檢查 stop_event，並在對沖時間點啟動下一個來源
+                timeout = 0.2
+                if pending_sources:
+                    timeout = min(timeout, max(next_launch_at - now, 0.0))
+                done, _ = concurrent.futures.wait(
+                    running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                
+                for future in done:
+                    source_name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"對沖搜尋 {source_name} 查詢 {code} 失敗: {e}")
+                        result = None
+                    
+                    if result and result.get('actresses'):
+                        if running:
+                            logger.debug(f"🏁 {source_name} 先回應 {code}，取消: {', '.join(running.values())}")
+                        return result
+                    
+                    # 來源已確定沒有結果，立即啟動下一個來源
+                    next_launch_at = 0.0
+            
+            return None
+        finally:
+            cancel_event.set()
+            for future in running:
+                future.cancel()
+
     def _search_av_wiki(self, code: str, stop_event: threading.Event) -> Optional[Dict]:
         """AV-WIKI 搜尋方法"""
         if stop_event.is_set():
             return None
             
         search_url = f"https://av-wiki.net/?s={quote(code)}&post_type=product"
-          # 使用日文網站專用標頭（解決 Brotli 壓縮問題）
-        def make_request(url, **kwargs):
-            with httpx.Client(timeout=self.timeout, **kwargs) as client:
-                # 🔧 使用不支援壓縮的標頭，避免 Brotli 問題
-                response = client.get(url, headers=self.japanese_headers)
-                response.raise_for_status()
-                # 直接使用 response.text，因為我們已經禁用了壓縮
-                return BeautifulSoup(response.text, 'html.parser')
         
         try:
-            soup = self.safe_searcher.safe_request(make_request, search_url)
+            soup = self._fetch_japanese_soup(search_url, code, 'AV-WIKI')
             
             if soup is None:
                 logger.warning(f"無法獲取 {code} 的 AV-WIKI 搜尋頁面")
                 return None
             
-            # 先檢查是否有搜尋結果
-            search_results = soup.find_all("div", class_="column-flex")
-            logger.info(f"AV-WIKI 搜尋 {code}: 找到 {len(search_results)} 個搜尋結果")
-            
-            if not search_results:
-                # 檢查是否是 "沒有找到結果" 的頁面
-                no_results_indicators = ["該当なし", "見つかりませんでした", "検索結果：0", "0件"]
-                page_text = soup.get_text()
-                for indicator in no_results_indicators:
-                    if indicator in page_text:
-                        logger.info(f"AV-WIKI 明確顯示沒有找到 {code} 的結果")
-                        return None
-                        
-            # 正確解析女優名稱：<li class="actress-name"><a>女優名稱</a></li>
-            actress_elements = soup.find_all("li", class_="actress-name")
-            actresses = []
-            logger.info(f"AV-WIKI 解析: 找到 {len(actress_elements)} 個 actress-name 元素")
-            for li in actress_elements:
-                link = li.find("a")
-                if link and link.text.strip():
-                    actress_name = link.text.strip()
-                    actresses.append(actress_name)
-                    logger.info(f"AV-WIKI 提取到女優名稱: {actress_name}")
-            
-            if not actresses:
-                logger.warning(f"AV-WIKI 未找到女優名稱，HTML開頭: {str(soup)[:200]}...")
-            
-            # 搜尋片商資訊
-            studio_info = self._extract_studio_info(soup, code)
-            
-            if not actresses:
-                page_text = soup.get_text()
-                lines = [line.strip() for line in page_text.split('\n') if line.strip()]
-                for i, line in enumerate(lines):
-                    if code in line:
-                        for j in range(max(0, i-3), min(len(lines), i+1)):
-                            potential_name = lines[j].strip()
-                            if potential_name and self._is_actress_name(potential_name):
-                                if potential_name not in actresses: 
-                                    actresses.append(potential_name)                
-            if actresses:
-                result = {
-                    'source': 'AV-WIKI (安全增強版)', 
-                    'actresses': actresses,
-                    'studio': studio_info.get('studio'),
-                    'studio_code': studio_info.get('studio_code'),
-                    'release_date': studio_info.get('release_date')
-                }
-                logger.info(f"番號 {code} 透過 {result['source']} 找到: {', '.join(result['actresses'])}, 片商: {result.get('studio', '未知')}")
-                return result
+            return parse_avwiki_page(soup, code)
 
         except Exception as e:
             logger.error(f"AV-WIKI 搜尋 {code} 時發生錯誤: {e}", exc_info=True)
         
         return None
 
-    def _is_actress_name(self, text: str) -> bool:
-        """判斷文字是否可能是女優名稱"""
-        if not text or len(text) < 2 or len(text) > 20: 
-            return False
-        exclude_keywords = [
-            'SOD', 'STARS', 'FANZA', 'MGS', 'MIDV', 'SSIS', 'IPX', 'IPZZ', 
-            '続きを読む', '検索', '件', '特典', '映像', '付き', 'star', 'SOKMIL', 
-            'Menu', 'セール', '限定', '最大'
-        ]
-        if any(keyword in text for keyword in exclude_keywords): 
-            return False
-        if re.match(r'^\d+$', text) or len(re.findall(r'\d', text)) > len(text) // 2: 
-            return False
-        if re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', text): 
-            return True
-        return False
+    def _fetch_japanese_soup(self, url: str, code: str, source: str) -> Optional[BeautifulSoup]:
+        """取得日文網站頁面並解析；啟用頁面快取時優先使用快取，過期則經 SafeSearcher 送出條件式請求"""
+        # 使用日文網站專用標頭（解決 Brotli 壓縮問題）
+        def make_request(url, conditional_headers=None, **kwargs):
+            with httpx.Client(timeout=self.timeout, **kwargs) as client:
+                # 🔧 使用不支援壓縮的標頭，避免 Brotli 問題
+                response = client.get(url, headers={**self.japanese_headers, **(conditional_headers or {})})
+                if response.status_code == 304:
+                    return response.status_code, response.headers, b''
+                response.raise_for_status()
+                return response.status_code, response.headers, response.content
+        
+        if self.page_cache is None:
+            response = self.safe_searcher.safe_request(make_request, url)
+            page = CachedPage(url, response[2], content_type=response[1].get('Content-Type')) if response else None
+        else:
+            page = self.page_cache.fetch(
+                url,
+                lambda conditional_headers: self.safe_searcher.safe_request(
+                    make_request, url, conditional_headers=conditional_headers
+                ),
+                code=code, source=source
+            )
+        # 我們已經禁用了壓縮，依回應宣告的字元集解碼
+        return BeautifulSoup(page.text(), 'html.parser') if page else None
 
     def batch_search(self, items: List, task_func, stop_event: threading.Event, progress_callback=None) -> Dict:
         results = {}
@@ -276,7 +453,10 @@ class WebSearcher:
                         logger.error(f"批次處理 {item} 時發生錯誤: {e}")
                         if progress_callback: 
                             progress_callback(f"💥 {item}: 處理失敗 - {e}\n")
-            if i + self.batch_size < len(items) and total_batches > 1:                time.sleep(self.batch_delay)
+            if i + self.batch_size < len(items) and total_batches > 1 and not self.offline:
+                time.sleep(self.batch_delay)
+        if self.source_router is not None:
+            self.source_router.save()
         return results
     
     def _search_chiba_f_net(self, code: str, stop_event: threading.Event) -> Optional[Dict]:
@@ -285,42 +465,18 @@ class WebSearcher:
             return None
             
         search_url = f"https://chiba-f.net/search/?keyword={quote(code)}"
-          # 使用日文網站專用標頭（解決 Brotli 壓縮問題）
-        def make_request(url, **kwargs):
-            with httpx.Client(timeout=self.timeout, **kwargs) as client:
-                # 🔧 使用不支援壓縮的標頭，避免 Brotli 問題
-                response = client.get(url, headers=self.japanese_headers)
-                response.raise_for_status()
-                # 直接使用 response.text，因為我們已經禁用了壓縮
-                return BeautifulSoup(response.text, 'html.parser')
         
         try:
-            soup = self.safe_searcher.safe_request(make_request, search_url)
+            soup = self._fetch_japanese_soup(search_url, code, 'chiba-f.net')
             
             if soup is None:
                 logger.warning(f"無法獲取 {code} 的 chiba-f.net 搜尋頁面")
                 return None
                 
-            # 查找產品區塊
-            product_divs = soup.find_all('div', class_='product-div')
-            logger.info(f"chiba-f.net 解析: 找到 {len(product_divs)} 個 product-div 元素")
-                
-            for product_div in product_divs:
-                # 檢查番號是否匹配
-                pno_element = product_div.find('div', class_='pno')
-                if pno_element and code.upper() in pno_element.text.upper():
-                    logger.info(f"chiba-f.net 找到匹配番號: {code}")
-                    return self._extract_chiba_product_info(product_div, code)
-            
-            # 如果沒有找到完全匹配，嘗試模糊匹配
-            for product_div in product_divs:
-                product_text = product_div.get_text()
-                if code.upper() in product_text.upper():
-                    logger.info(f"chiba-f.net 模糊匹配找到番號: {code}")
-                    return self._extract_chiba_product_info(product_div, code)
-            
-            if not product_divs:
-                logger.warning(f"chiba-f.net 未找到任何產品區塊，HTML開頭: {str(soup)[:200]}...")
+            result = parse_chiba_page(soup, code)
+            if result:
+                self.search_cache[code] = result
+                return result
                         
         except Exception as e:
             logger.error(f"chiba-f.net 搜尋 {code} 時發生錯誤: {e}", exc_info=True)
@@ -328,183 +484,19 @@ class WebSearcher:
         logger.debug(f"番號 {code} 未在 chiba-f.net 中找到女優資訊。")
         return None
     
-    def _extract_chiba_product_info(self, product_div, code: str) -> Dict:
-        """從 chiba-f.net 產品區塊提取資訊"""
-        result = {
-            'source': 'chiba-f.net (安全增強版)',
-            'actresses': [],
-            'studio': None,
-            'studio_code': None,
-            'release_date': None
-        }
-        
-        try:
-            # 提取女優名稱
-            actress_span = product_div.find('span', class_='fw-bold')
-            if actress_span:
-                result['actresses'] = [actress_span.text.strip()]
-            
-            # 提取系列/片商資訊
-            series_link = product_div.find('a', href=re.compile(r'../series/'))
-            if series_link:
-                result['studio'] = series_link.text.strip()
-                # 從 href 提取片商代碼
-                href = series_link.get('href', '')
-                if '../series/' in href:
-                    result['studio_code'] = href.replace('../series/', '').strip()
-            
-            # 提取發行日期
-            date_span = product_div.find('span', class_='start_date')
-            if date_span:
-                result['release_date'] = date_span.text.strip()
-            
-            # 如果沒有找到片商，嘗試從番號推測
-            if not result['studio_code']:
-                result['studio_code'] = self._extract_studio_code_from_number(code)
-            
-            if result['actresses']:
-                self.search_cache[code] = result
-                logger.info(f"番號 {code} 透過 {result['source']} 找到: {', '.join(result['actresses'])}, 片商: {result.get('studio', '未知')}")
-                
-        except Exception as e:
-            logger.warning(f"提取 {code} 從 chiba-f.net 資訊時發生部分錯誤: {str(e)}")
-        
-        return result if result.get('actresses') else None
-    
-    def _extract_studio_info(self, soup: BeautifulSoup, code: str) -> Dict:
-        """從網頁中提取片商資訊"""
-        studio_info = {
-            'studio': None,
-            'studio_code': None,
-            'release_date': None
-        }
-        
-        try:
-            # 先取得網頁文字內容，後續方法都可能用到
-            page_text = soup.get_text()
-            
-            # 方法1: 從 AV-WIKI HTML 結構中直接提取片商資訊
-            # 查找包含 fa-clone 圖標的 li 元素
-            studio_elements = soup.find_all("li")
-            for li in studio_elements:
-                icon = li.find("i", class_="fa-clone")
-                if icon:
-                    link = li.find("a")
-                    if link and link.text.strip():
-                        studio_text = link.text.strip()
-                        # 解析片商名稱，例如 "エスワン - SONE" -> studio="エスワン", code="SONE"
-                        if " - " in studio_text:
-                            parts = studio_text.split(" - ")
-                            studio_info['studio'] = parts[0].strip()
-                            studio_info['studio_code'] = parts[1].strip()
-                        else:
-                            studio_info['studio'] = studio_text
-                        break
-            
-            # 方法2: 如果方法1失敗，嘗試從番號中提取片商代碼
-            if not studio_info['studio']:
-                studio_code = self._extract_studio_code_from_number(code)
-                if studio_code:
-                    studio_info['studio_code'] = studio_code
-                    studio_info['studio'] = self._get_studio_name_by_code(studio_code)
-            
-            # 方法3: 從網頁內容中搜尋片商資訊（最後手段）
-            if not studio_info['studio']:
-                # 搜尋常見的片商名稱和模式
-                studio_patterns = [
-                # 直接片商名稱匹配
-                (r'(S1|SOD|MOODYZ|PREMIUM|WANZ|FALENO|ATTACKERS|E-BODY|KAWAII|FITCH|MADONNA|PRESTIGE)', r'\1'),
-                # 製作公司/發行商模式
-                (r'製作[：:]\s*([^\n\r]+)', r'\1'),
-                (r'發行[：:]\s*([^\n\r]+)', r'\1'),
-                (r'メーカー[：:]\s*([^\n\r]+)', r'\1'),
-                # 番號前綴模式 
-                (r'品番[：:]\s*([A-Z]+)-?\d+', r'\1'),
-            ]
-            
-                for pattern, replacement in studio_patterns:
-                    match = re.search(pattern, page_text, re.IGNORECASE)
-                    if match:
-                        extracted_studio = match.group(1).strip()
-                        if extracted_studio and len(extracted_studio) < 50:  # 合理長度限制
-                            if not studio_info['studio']:
-                                studio_info['studio'] = extracted_studio
-                            if not studio_info['studio_code'] and len(extracted_studio) <= 10:
-                                studio_info['studio_code'] = extracted_studio
-                            break
-            
-            # 方法4: 嘗試提取發行日期（總是執行）
-            date_patterns = [
-                r'發售日[：:]\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-                r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-                r'(\d{4}\.\d{1,2}\.\d{1,2})'
-            ]
-            
-            for pattern in date_patterns:
-                match = re.search(pattern, page_text)
-                if match:
-                    studio_info['release_date'] = match.group(1)
-                    break                    
-        except Exception as e:
-            logger.warning(f"提取片商資訊時發生錯誤: {e}")
-        
-        return studio_info
-    
-    def _extract_studio_code_from_number(self, code: str) -> Optional[str]:
-        """從番號中提取片商代碼"""
-        if not code:
-            return None
-            
-        # 提取字母部分作為片商代碼
-        match = re.match(r'^([A-Z]+)', code.upper())
-        if match:
-            return match.group(1)
-        return None
-    
-    def _get_studio_name_by_code(self, studio_code: str) -> Optional[str]:
-        """根據片商代碼獲取片商名稱（從 studios.json 載入）"""
-        try:
-            import json
-            from pathlib import Path
-            
-            # 載入 studios.json 檔案
-            studios_file = Path(__file__).parent.parent.parent / 'studios.json'
-            if studios_file.exists():
-                with open(studios_file, 'r', encoding='utf-8') as f:
-                    studios_data = json.load(f)
-                
-                # 反向查找：從代碼找到片商
-                studio_code_upper = studio_code.upper()
-                for studio_name, codes in studios_data.items():
-                    if studio_code_upper in [code.upper() for code in codes]:
-                        return studio_name
-        except Exception as e:
-            logger.warning(f"載入 studios.json 失敗: {e}")
-        
-        # 回退到內建對應表
-        studio_mapping = {
-            'STAR': 'SOD',
-            'STARS': 'SOD', 
-            'SDJS': 'SOD',
-            'SSIS': 'S1',
-            'SSNI': 'S1',
-            'IPX': 'IdeaPocket',
-            'IPZZ': 'IdeaPocket',
-            'MIDV': 'MOODYZ',
-            'MIAA': 'MOODYZ',
-            'WANZ': 'WANZ FACTORY',
-            'FSDSS': 'FALENO',
-            'PRED': 'PREMIUM',
-            'ABW': 'Prestige',
-            'BF': 'BeFree',
-            'CAWD': 'kawaii',
-            'JUFD': 'Fitch',
-            'JUL': 'MADONNA',
-            'JUY': 'MADONNA',
-        }
-        
-        return studio_mapping.get(studio_code.upper(), studio_code)
-    
+    def close(self):
+        """釋放背景資源 - 非同步引擎的連線會話與對沖搜尋執行緒池"""
+        if self.async_engine is not None:
+            self.async_engine.close()
+        with self._hedge_executor_lock:
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
+        if self.source_router is not None:
+            self.source_router.save()
+        if self.page_cache is not None:
+            self.page_cache.close()
+
     def get_safe_searcher_stats(self) -> Dict:
         """獲取安全搜尋器統計資訊"""
         return self.safe_searcher.get_stats()
@@ -530,6 +522,10 @@ class WebSearcher:
         return {
             'safe_searcher': self.get_safe_searcher_stats(),
             'javdb_searcher': self.get_javdb_stats(),
+            'source_router': self.source_router.get_stats() if self.source_router else None,
+            'single_flight': self._search_flight.get_stats(),
+            'retry_budget': self.safe_searcher.retry_budget.get_stats(),
+            'page_cache': self.page_cache.get_stats() if self.page_cache else None,
             'local_cache_entries': len(self.search_cache)
         }
     
@@ -579,22 +575,8 @@ class WebSearcher:
         
         try:
             logger.debug(f"📊 JAVDB 搜尋: {code}")
-            javdb_result = self.javdb_searcher.search_javdb(code)
-            if javdb_result and javdb_result.get('actresses'):
-                # 轉換為統一格式
-                result = {
-                    'source': javdb_result['source'],
-                    'actresses': javdb_result['actresses'],
-                    'studio': javdb_result.get('studio'),
-                    'studio_code': javdb_result.get('studio_code'),
-                    'release_date': javdb_result.get('release_date'),
-                    'title': javdb_result.get('title'),
-                    'duration': javdb_result.get('duration'),
-                    'director': javdb_result.get('director'),
-                    'series': javdb_result.get('series'),
-                    'rating': javdb_result.get('rating'),
-                    'categories': javdb_result.get('categories', [])
-                }
+            result = self._search_javdb(code)
+            if result:
                 self.search_cache[code] = result
                 return result
             
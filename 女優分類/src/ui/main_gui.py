@@ -64,7 +64,7 @@ class UnifiedActressClassifierGUI:
           # 第一排按鈕 - 分離的搜尋按鈕
         row1_frame = ttk.Frame(button_frame)
         row1_frame.pack(fill="x", pady=(0, 5))
-        row1_frame.columnconfigure((0, 1, 2), weight=1)
+        row1_frame.columnconfigure((0, 1, 2, 3), weight=1)
         
         self.search_japanese_btn = ttk.Button(row1_frame, text="🇯🇵 日文網站搜尋", command=self.start_japanese_search)
         self.search_japanese_btn.grid(row=0, column=0, padx=(0, 2), sticky="ew", ipady=5)
@@ -72,8 +72,11 @@ class UnifiedActressClassifierGUI:
         self.search_javdb_btn = ttk.Button(row1_frame, text="📊 JAVDB 搜尋", command=self.start_javdb_search)
         self.search_javdb_btn.grid(row=0, column=1, padx=2, sticky="ew", ipady=5)
         
+        self.reparse_btn = ttk.Button(row1_frame, text="♻️ 快取重新解析", command=self.start_reparse_cache)
+        self.reparse_btn.grid(row=0, column=2, padx=2, sticky="ew", ipady=5)
+        
         self.settings_btn = ttk.Button(row1_frame, text="⚙️ 偏好設定", command=self.show_preferences)
-        self.settings_btn.grid(row=0, column=2, padx=(2, 0), sticky="ew", ipady=5)
+        self.settings_btn.grid(row=0, column=3, padx=(2, 0), sticky="ew", ipady=5)
         
         # 第二排按鈕 - 包含片商分類按鈕
         row2_frame = ttk.Frame(button_frame)
@@ -144,6 +147,7 @@ class UnifiedActressClassifierGUI:
     def on_closing(self):
         self.is_running = False
         self.stop_event.set()
+        self.core.web_searcher.close()
         self.root.destroy()
 
     def browse_folder(self):
@@ -177,7 +181,7 @@ class UnifiedActressClassifierGUI:
         
         # 更新按鈕列表，包含分離搜尋按鈕和片商分類按鈕
         buttons = [
-            self.browse_btn, self.search_japanese_btn, self.search_javdb_btn,
+            self.browse_btn, self.search_japanese_btn, self.search_javdb_btn, self.reparse_btn,
             self.interactive_move_btn, self.standard_move_btn, self.studio_classify_btn, self.settings_btn
         ]
         
@@ -280,6 +284,29 @@ class UnifiedActressClassifierGUI:
                 self.update_progress(f"\n💥 錯誤: {result['message']}\n")
                 self.status_var.set(f"錯誤: {result.get('message', '未知錯誤')}")
 
+    def start_reparse_cache(self):
+        """以頁面快取離線重新解析並回填資料庫"""
+        self.clear_results()
+        self.update_progress(f"♻️ 快取重新解析模式（不連網）\n{'='*60}\n")
+        self.stop_event.clear()
+        threading.Thread(target=self._run_task, args=(self._reparse_cache_worker,), daemon=True).start()
+
+    def _reparse_cache_worker(self):
+        """快取重新解析工作者"""
+        self.status_var.set("執行中：快取重新解析...")
+        result = self.core.reparse_from_page_cache(self.stop_event, self.update_progress)
+        if self.is_running:
+            if self.stop_event.is_set():
+                self.update_progress(f"\n🛑 任務已由使用者中止。\n")
+                self.status_var.set("任務已中止")
+            elif result['status'] == 'success':
+                self.update_progress(f"\n{'='*60}\n🎉 重新解析完成！共 {result['pages']} 個頁面，"
+                                     f"更新 {result['updated']} 部影片，耗時 {result['elapsed']} 秒\n")
+                self.status_var.set("就緒")
+            else:
+                self.update_progress(f"\n💥 錯誤: {result['message']}\n")
+                self.status_var.set(f"錯誤: {result.get('message', '未知錯誤')}")
+
     def start_interactive_move(self):
         path = self.selected_path.get()
         if not Path(path).is_dir(): 